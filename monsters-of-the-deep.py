@@ -1,5 +1,8 @@
-import pygame, random, math, time, json, os
-from collections import deque
+import time
+_STARTUP_T0 = time.perf_counter()
+import pygame, random, math, json, os, sys, glob, queue, threading, struct, itertools, heapq, gc, tracemalloc
+from collections import deque, namedtuple
+from array import array
 
 # ----------------------------
 # Config (grid/world constants)
@@ -14,6 +17,7 @@ GREEN=(80,210,120); RED=(220,70,70); YELLOW=(240,210,90); BLUE=(80,160,240); PUR
 ORANGE=(240,140,60); CYAN=(120,210,230)
 
 FPS = 60
+IDLE_WAIT_MS = 500   # longest sleep between wake-ups on menus/pause/shop when no input arrives
 
 # ----------------------------
 # Settings (persisted to settings.json)
@@ -26,6 +30,12 @@ SETTINGS = {
     "darkness": 1.0,        # 0.5 – 1.5
     "fullscreen": False,
     "window_size": [1024, 640],
+    "telemetry": True,
+    "dirty_rects": False,   # push only changed regions instead of flipping the whole window
+    "sim_process": False,   # run World.update in a worker process (see SimProcess)
+    "lod": True,            # step far-away entities at a reduced rate (see LodScheduler)
+    "render_scale": 1.0,    # world/lighting buffer size relative to the window (see update_view)
+    "gc_policy": True,      # freeze after world build, defer full collections to between waves (see GcPolicy)
 }
 
 def load_settings():
@@ -45,6 +55,48 @@ def save_settings():
     except Exception as e:
         print("Failed to save settings:", e)
 
+# ----------------------------
+# Fonts (resolved once, cached on disk)
+# ----------------------------
+FONT_NAME = "consolas"
+FONT_CACHE_FILE = "font_cache.json"
+_font_paths = None
+_fonts = {}
+
+# (regular, bold) font paths; SysFont lookups are slow on a cold start, so they are cached in FONT_CACHE_FILE
+def resolve_font_paths():
+    global _font_paths
+    if _font_paths is not None:
+        return _font_paths
+    if os.path.exists(FONT_CACHE_FILE):
+        try:
+            with open(FONT_CACHE_FILE, "r") as f:
+                data = json.load(f)
+            paths = (data.get("regular"), data.get("bold"))
+            if data.get("name") == FONT_NAME and all(p is None or os.path.exists(p) for p in paths):
+                _font_paths = paths
+                return _font_paths
+        except Exception as e:
+            print("Failed to load font cache:", e)
+    _font_paths = (pygame.font.match_font(FONT_NAME), pygame.font.match_font(FONT_NAME, bold=True))
+    try:
+        with open(FONT_CACHE_FILE, "w") as f:
+            json.dump({"name": FONT_NAME, "regular": _font_paths[0], "bold": _font_paths[1]}, f, indent=2)
+    except Exception as e:
+        print("Failed to save font cache:", e)
+    return _font_paths
+
+def get_font(size, bold=False):
+    font = _fonts.get((size, bold))
+    if font is None:
+        regular, bold_path = resolve_font_paths()
+        path = bold_path if bold else regular
+        font = pygame.font.Font(path, size)
+        if bold and (bold_path is None or bold_path == regular):
+            font.set_bold(True)
+        _fonts[(size, bold)] = font
+    return font
+
 # ----------------------------
 # Helper math
 # ----------------------------
@@ -52,9 +104,9 @@ def clamp(v, a, b): return max(a, min(b, v))
 def dist(a,b): return math.hypot(a[0]-b[0], a[1]-b[1])
 
 # ----------------------------
-# Maze generation (DFS)
+# Maze generation (DFS; streamed Eller for huge maps)
 # ----------------------------
-def generate_maze(w, h):
+def generate_maze(w, h, rng=random):
     grid = [[1 for _ in range(h)] for _ in range(w)]
     start = (1,1)
     stack=[start]
@@ -62,7 +114,7 @@ def generate_maze(w, h):
     dirs=[(2,0),(-2,0),(0,2),(0,-2)]
     while stack:
         cx,cy = stack[-1]
-        random.shuffle(dirs)
+        rng.shuffle(dirs)
         carved=False
         for dx,dy in dirs:
             nx,ny = cx+dx, cy+dy
@@ -75,11 +127,107 @@ def generate_maze(w, h):
         if not carved:
             stack.pop()
     for _ in range((w*h)//40):
-        x = random.randrange(1,w-1)
-        y = random.randrange(1,h-1)
+        x = rng.randrange(1,w-1)
+        y = rng.randrange(1,h-1)
         grid[x][y]=0
     return grid
 
+# Huge maps: Eller's algorithm, one column at a time into a bytearray, outward from the base.
+MAZE_STREAM_MIN_CELLS = 1 << 18     # maps with at least this many tiles are streamed
+MAZE_CHUNK = 16                     # columns per span yielded by MazeStream.chunks()
+
+# each sweep's last column joins all remaining sets and openings only extend open tiles, so every open
+# tile is reachable from the base without ensure_full_connectivity
+class MazeStream:
+    def __init__(self, w, h, rng=random, base=None, clearing=2):
+        self.w, self.h, self.rng = w, h, rng
+        self.cells = bytearray(b"\x01") * (w*h)
+        self.base = base or (w//2, h//2)
+        self.clearing = clearing
+        self.rows = (h - 1) // 2            # cells per column (y = 2j + 1)
+        self.last = w - 3 + w % 2           # rightmost cell column
+        self.labels = itertools.count()
+        self.lo = self.hi = 0
+
+    # yields the span (lo, hi) of final columns every `size` columns and at the end
+    def chunks(self, size=MAZE_CHUNK):
+        w, n = self.w, self.rows
+        if n == 0 or self.last < 1:         # no room for maze cells
+            for x in range(w): self._finish(x, x - 1 if x else None)
+            self.lo, self.hi = 0, w
+            yield self.lo, self.hi
+            return
+        x0 = clamp(self.base[0] - 1 + self.base[0] % 2, 1, self.last)
+        labels = [next(self.labels) for _ in range(n)]
+        for j in range(n): self.cells[x0*self.h + 2*j + 1] = 0
+        groups = {label: [j] for j, label in enumerate(labels)}
+        self._join(x0, labels, groups, final=x0 == 1 and x0 == self.last)
+        self._finish(x0, None)
+        self.lo, self.hi = x0, x0 + 1
+        sweeps = [self._sweep(x0, 1, labels, groups),
+                  self._sweep(x0, -1, list(labels), {k: list(v) for k, v in groups.items()})]
+        done = 0
+        while sweeps:
+            for s in list(sweeps):
+                x = next(s, None)
+                if x is None:
+                    sweeps.remove(s)
+                    continue
+                self.lo, self.hi = min(self.lo, x), max(self.hi, x + 1)
+                done += 1
+                if done % size == 0:
+                    yield self.lo, self.hi
+        yield self.lo, self.hi
+
+    def _sweep(self, x, d, labels, groups):
+        cells, h, rng, n = self.cells, self.h, self.rng, self.rows
+        end = self.last if d > 0 else 1
+        while x != end:
+            nx = x + 2*d
+            carried = [None] * n
+            for label, rows in groups.items():      # every set continues through at least one passage
+                for j in [j for j in rows if rng.random() < 0.5] or [rng.choice(rows)]:
+                    cells[(x + d)*h + 2*j + 1] = 0
+                    carried[j] = label
+            self._finish(x + d, x)
+            yield x + d
+            groups = {}
+            for j in range(n):
+                if carried[j] is None: carried[j] = next(self.labels)
+                cells[nx*h + 2*j + 1] = 0
+                groups.setdefault(carried[j], []).append(j)
+            self._join(nx, carried, groups, final=nx == end)
+            self._finish(nx, x + d)
+            yield nx
+            x = nx
+        for px in range(x + d, self.w if d > 0 else -1, d):    # trailing wall column and border
+            self._finish(px, px - d)
+            yield px
+
+    def _join(self, x, labels, groups, final):
+        cells, h, rng = self.cells, self.h, self.rng
+        for j in range(self.rows - 1):
+            a, b = labels[j], labels[j+1]
+            if a != b and (final or rng.random() < 0.5):
+                cells[x*h + 2*j + 2] = 0
+                if len(groups[a]) < len(groups[b]): a, b = b, a
+                moved = groups.pop(b)
+                for k in moved: labels[k] = a
+                groups[a] += moved
+
+    # base clearing and random openings; prev is the finished neighbour column
+    def _finish(self, x, prev):
+        cells, w, h, rng = self.cells, self.w, self.h, self.rng
+        col = x*h
+        (bx, by), c = self.base, self.clearing
+        if 0 < x < w - 1 and abs(x - bx) <= c:
+            for y in range(max(1, by - c), min(h - 1, by + c + 1)): cells[col + y] = 0
+        if 0 < x < w - 1 and h > 2:
+            for _ in range(h // 40 + (rng.random() < h % 40 / 40)):     # ~(w*h)//40 as in generate_maze
+                y = rng.randrange(1, h - 1)
+                if not (cells[col + y - 1] and cells[col + y + 1] and (prev is None or cells[prev*h + y])):
+                    cells[col + y] = 0
+
 # ----------------------------
 # Connectivity fixes (guarantee all open tiles reachable from base)
 # ----------------------------
@@ -153,36 +301,1094 @@ def ensure_full_connectivity(grid, start):
         remaining = list(all_open - main)
 
 # ----------------------------
-# Pathfinding on grid (BFS for next step)
+# Map building + background pre-generation
+# ----------------------------
+# -> (grid, base_cell, base_dist); huge maps are built as a whole MapStream
+def build_map(rng=None):
+    rng = rng or random.Random()
+    if GRID_W*GRID_H >= MAZE_STREAM_MIN_CELLS:
+        stream = MapStream(GRID_W, GRID_H, rng)
+        stream.run()
+        return stream.result()
+    grid = generate_maze(GRID_W, GRID_H, rng)
+    base_cell=(GRID_W//2, GRID_H//2)
+    for x in range(base_cell[0]-2, base_cell[0]+3):
+        for y in range(base_cell[1]-2, base_cell[1]+3):
+            if 0<=x<GRID_W and 0<=y<GRID_H: grid[x][y]=0
+    ensure_full_connectivity(grid, base_cell)
+    return grid, base_cell, distance_field(grid, base_cell)
+
+# ----------------------------
+# Seeded map cache (maps/<seed>_<w>x<h>_v<version>.map)
 # ----------------------------
-def bfs_next_step(grid, start, goal):
+MAPGEN_VERSION = 1                  # bump whenever generate_maze/build_map output changes
+MAP_CACHE_DIR = "maps"
+MAP_CACHE_MAX_BYTES = 8 << 20
+MAP_CACHE_MAX_AGE = 30 * 24 * 3600  # seconds since last use
+MAP_MAGIC = b"MOTD"
+MAP_HEADER = struct.Struct("<4sHHHHH")  # magic, version, w, h, base x, base y
+UNREACHABLE = 0xFFFF                    # also the cell count from which distances are stored as int32
+
+# header, one bit per cell (1 = wall, column-major), base distances as uint16 (int32 on huge maps)
+def pack_map(grid, base_cell, base_dist):
+    w, h = len(grid), len(grid[0])
+    bits = bytearray((w*h + 7) // 8)
+    i = 0
+    for col in grid:
+        for y in range(h):
+            if col[y]:
+                bits[i >> 3] |= 1 << (i & 7)
+            i += 1
+    if w*h < UNREACHABLE:
+        dists = array("H", (UNREACHABLE if d < 0 else d for col in base_dist for d in col))
+    else:
+        dists = array("i", (d for col in base_dist for d in col))
+    if sys.byteorder == "big": dists.byteswap()
+    return MAP_HEADER.pack(MAP_MAGIC, MAPGEN_VERSION, w, h, base_cell[0], base_cell[1]) + bytes(bits) + dists.tobytes()
+
+def unpack_map(data):
+    magic, version, w, h, bx, by = MAP_HEADER.unpack_from(data, 0)
+    nbits = (w*h + 7) // 8
+    dists = array("H" if w*h < UNREACHABLE else "i")
+    if magic != MAP_MAGIC or version != MAPGEN_VERSION or len(data) != MAP_HEADER.size + nbits + dists.itemsize*w*h:
+        raise ValueError("bad or stale map file")
+    bits = data[MAP_HEADER.size:MAP_HEADER.size + nbits]
+    dists.frombytes(data[MAP_HEADER.size + nbits:])
+    if sys.byteorder == "big": dists.byteswap()
+    if w*h >= MAZE_STREAM_MIN_CELLS:
+        cells = bytes(bits[i >> 3] >> (i & 7) & 1 for i in range(w*h))
+        view = memoryview(dists)
+        return [cells[x*h:(x+1)*h] for x in range(w)], (bx, by), [view[x*h:(x+1)*h] for x in range(w)]
+    grid = [[(bits[(x*h+y) >> 3] >> ((x*h+y) & 7)) & 1 for y in range(h)] for x in range(w)]
+    base_dist = [[-1 if d == UNREACHABLE else d for d in dists[x*h:(x+1)*h]] for x in range(w)]
+    return grid, (bx, by), base_dist
+
+class MapStore:
+    def __init__(self, directory=MAP_CACHE_DIR, max_bytes=MAP_CACHE_MAX_BYTES, max_age=MAP_CACHE_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def path_for(self, seed, w, h):
+        return os.path.join(self.directory, f"{seed}_{w}x{h}_v{MAPGEN_VERSION}.map")
+
+    def load(self, seed, w, h):
+        path = self.path_for(seed, w, h)
+        try:
+            with open(path, "rb") as f:
+                data = unpack_map(f.read())
+            os.utime(path)  # last use drives age eviction
+            return data
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print("Discarding cached map", path, "-", e)
+            try: os.remove(path)
+            except OSError: pass
+            return None
+
+    def save(self, seed, map_data):
+        grid = map_data[0]
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path_for(seed, len(grid), len(grid[0]))
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(pack_map(*map_data))
+            os.replace(tmp, path)
+        except Exception as e:
+            print("Failed to save map cache:", e)
+        self.evict()
+
+    def evict(self):
+        try:
+            entries = []
+            for path in glob.glob(os.path.join(self.directory, "*.map")):
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+        except OSError:
+            return
+        entries.sort()
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:  # oldest first
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path); total -= size
+            except OSError:
+                pass
+
+def load_or_build_map(seed, store=None):
+    store = store or MapStore()
+    data = store.load(seed, GRID_W, GRID_H)
+    if data is None:
+        data = build_map(random.Random(seed))
+        store.save(seed, data)
+    return data
+
+MAP_STREAM_FIRST = 64      # columns around the base published before a streamed map is playable
+WALL_COLUMN = {}            # h -> an all-wall column standing in for unpublished ones
+
+# A huge map generated on the mapgen thread and played while it grows. latest = (version, grid,
+# base_cell, base_dist, span, done), republished whenever the finished column span has doubled.
+class MapStream:
+    def __init__(self, w, h, rng=None, seed=None, store=None):
+        self.w, self.h = w, h
+        self.rng = rng or random.Random(seed)
+        self.seed = seed
+        self.store = store or MapStore()
+        self.base_cell = (w//2, h//2)
+        self.latest = None
+        self.playable = threading.Event()
+        self.done = threading.Event()
+        self.cancelled = False
+        self.error = None
+
+    def run(self):
+        try:
+            self._run()
+        except BaseException as e:
+            self.error = e
+            raise
+        finally:
+            self.playable.set(); self.done.set()
+
+    def _run(self):
+        w, h, base = self.w, self.h, self.base_cell
+        if self.seed is not None:
+            data = self.store.load(self.seed, w, h)
+            if data is not None:
+                self.publish(data[0], data[2], (0, w), True)
+                return
+        maze = MazeStream(w, h, self.rng, base=base)
+        view = memoryview(maze.cells)
+        wall = WALL_COLUMN.setdefault(h, b"\x01" * h)
+        grid = [wall] * w
+        lo = hi = base[0]; field_w = 0
+        for new_lo, new_hi in maze.chunks():
+            if self.cancelled: return
+            for x in itertools.chain(range(new_lo, lo), range(hi, new_hi)):
+                grid[x] = view[x*h:(x+1)*h]
+            lo, hi = new_lo, new_hi
+            if hi - lo >= max(MAP_STREAM_FIRST, 2*field_w) and hi - lo < w:
+                self.publish(list(grid), span_distance_field(maze.cells, h, lo, hi, base), (lo, hi), False)
+                field_w = hi - lo
+        base_dist = span_distance_field(maze.cells, h, 0, w, base)
+        self.publish(grid, base_dist, (0, w), True)
+        if self.seed is not None:
+            self.store.save(self.seed, (grid, base, base_dist))
+
+    def publish(self, grid, base_dist, span, done):
+        version = self.latest[0] + 1 if self.latest else 1
+        self.latest = (version, grid, self.base_cell, base_dist, span, done)
+        self.playable.set()
+
+    def wait(self, event):
+        event.wait()
+        if self.error is not None:
+            raise RuntimeError("map generation failed") from self.error
+
+    def result(self):
+        self.wait(self.done)
+        return self.latest[1:4]
+
+# next map built on a background thread; huge maps are handed over once playable
+class MapPregenerator:
+    def __init__(self, seed=None):
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mapgen")
+        self.seed = seed
+        self.future = None
+        self.stream = None
+        self.prefetch()
+
+    def prefetch(self):
+        if self.future is None:
+            if GRID_W*GRID_H >= MAZE_STREAM_MIN_CELLS:
+                self.stream = MapStream(GRID_W, GRID_H, seed=self.seed)
+                self.future = self.executor.submit(self.stream.run)
+            elif self.seed is None:
+                self.future = self.executor.submit(build_map)
+            else:
+                self.future = self.executor.submit(load_or_build_map, self.seed)
+
+    def ready(self):
+        if self.stream is not None:
+            return self.stream.playable.is_set()
+        return self.future is not None and self.future.done()
+
+    def take(self):
+        self.prefetch()
+        if self.stream is not None:
+            data = self.stream
+            data.wait(data.playable)
+        else:
+            data = self.future.result()
+        self.future = self.stream = None
+        self.prefetch()
+        return data
+
+    def shutdown(self):
+        if self.stream is not None:
+            self.stream.cancelled = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+# the main loop builds the new World on a frame of its own once its map is ready (see GcPolicy)
+def start_world(sim=None):
+    if sim is not None:
+        sim.restart()
+    return None, "loading"
+
+# ----------------------------
+# Pathfinding on grid (BFS distance fields)
+# ----------------------------
+# BFS steps to goal; -1 for walls and unreachable cells
+def distance_field(grid, goal):
     w,h=len(grid),len(grid[0])
-    sx,sy=start; gx,gy=goal
-    if (sx,sy)==(gx,gy): return (sx,sy)
-    q=deque([(sx,sy)])
-    came={ (sx,sy): None }
-    neigh=[(1,0),(-1,0),(0,1),(0,-1)]
+    d=[[-1]*h for _ in range(w)]
+    gx,gy=goal
+    d[gx][gy]=0
+    q=deque([goal])
     while q:
         x,y=q.popleft()
-        if (x,y)==(gx,gy): break
-        for dx,dy in neigh:
-            nx,ny=x+dx,y+dy
-            if 0<=nx<w and 0<=ny<h and grid[nx][ny]==0 and (nx,ny) not in came:
-                came[(nx,ny)]=(x,y)
+        nd=d[x][y]+1
+        for nx,ny in ((x+1,y),(x-1,y),(x,y+1),(x,y-1)):
+            if 0<=nx<w and 0<=ny<h and grid[nx][ny]==0 and d[nx][ny]<0:
+                d[nx][ny]=nd
                 q.append((nx,ny))
-    if (gx,gy) not in came:
-        return start
-    cur=(gx,gy)
-    while came[cur] and came[cur]!=start:
-        cur=came[cur]
-    return cur
+    return d
+
+# distance_field over a column-major bytearray with only columns lo..hi-1 open
+def span_distance_field(cells, h, lo, hi, goal):
+    d = array("i", [-1]) * len(cells)
+    start, end = lo*h, hi*h
+    g = goal[0]*h + goal[1]
+    d[g] = 0
+    q = deque([g])
+    while q:
+        i = q.popleft()
+        nd = d[i] + 1
+        for j in (i+1, i-1, i+h, i-h):
+            if start <= j < end and not cells[j] and d[j] < 0:
+                d[j] = nd
+                q.append(j)
+    view = memoryview(d)
+    return [view[x*h:(x+1)*h] for x in range(len(cells) // h)]
+
+def downhill_step(field, cell):
+    x,y=cell
+    w,h=len(field),len(field[0])
+    if not (0<=x<w and 0<=y<h): return cell
+    cur=field[x][y]
+    if cur<=0: return cell
+    for nx,ny in ((x+1,y),(x-1,y),(x,y+1),(x,y-1)):
+        if 0<=nx<w and 0<=ny<h and field[nx][ny]==cur-1:
+            return (nx,ny)
+    return cell
+
+# Chasers' field: steps to the player within CHASE_RADIUS (flat, x*h + y). A one-cell move only
+# touches cells whose distance changes by one; jumps (respawn) rebuild with a truncated BFS.
+CHASE_RADIUS = 16
+
+# ChaseField.adj for huge maps: computed per lookup instead of a tuple per cell
+class GridAdjacency:
+    def __init__(self, grid):
+        self.grid, self.w, self.h = grid, len(grid), len(grid[0])
+
+    def __len__(self): return self.w*self.h
+
+    def __getitem__(self, i):
+        w, h, grid = self.w, self.h, self.grid
+        x, y = divmod(i, h)
+        if grid[x][y]: return ()
+        return tuple(nx*h + ny for nx, ny in ((x+1, y), (x-1, y), (x, y+1), (x, y-1))
+                     if 0 <= nx < w and 0 <= ny < h and grid[nx][ny] == 0)
+
+class ChaseField:
+    def __init__(self, grid, radius=CHASE_RADIUS):
+        w, h = len(grid), len(grid[0])
+        self.h = h
+        self.radius = radius
+        if w*h >= MAZE_STREAM_MIN_CELLS:
+            self.adj = GridAdjacency(grid)
+        else:
+            self.adj = [() if grid[x][y] else tuple(nx*h + ny for nx, ny in ((x+1, y), (x-1, y), (x, y+1), (x, y-1))
+                                                     if 0 <= nx < w and 0 <= ny < h and grid[nx][ny] == 0)
+                        for x in range(w) for y in range(h)]
+        self.d = [UNREACHABLE] * (w*h)
+        self.source = None
+        self.moves = self.rebuilds = self.touched = 0
+        self.seconds = 0.0
+
+    def follow(self, cell):
+        t = cell[0]*self.h + cell[1]
+        s = self.source
+        if t == s or not 0 <= t < len(self.adj) or not self.adj[t]: return
+        t0 = time.perf_counter()
+        if s is not None and t in self.adj[s]:
+            self._step(s, t)
+        else:
+            mid = None
+            if s is not None:
+                mid = next((m for m in self.adj[s] if m in self.adj[t]), None)   # diagonal: via a shared neighbour
+            if mid is not None:
+                self._step(s, mid); self._step(mid, t)
+            else:
+                self._rebuild(t); self.rebuilds += 1
+        self.source = t
+        self.moves += 1
+        self.seconds += time.perf_counter() - t0
+
+    def _rebuild(self, t):
+        d = self.d = [UNREACHABLE] * len(self.adj)
+        adj, r = self.adj, self.radius
+        d[t] = 0
+        q = deque([t]); seen = 1
+        while q:
+            u = q.popleft()
+            nd = d[u] + 1
+            if nd > r: continue
+            for v in adj[u]:
+                if d[v] == UNREACHABLE:
+                    d[v] = nd; q.append(v); seen += 1
+        self.touched += seen
+
+    def _step(self, s, t):
+        d, adj, r = self.d, self.adj, self.radius
+        touched = 0
+        d[t] = 0
+        q = deque([t])
+        while q:
+            u = q.popleft()
+            nd = d[u] + 1
+            if nd > r: continue
+            for v in adj[u]:
+                if d[v] > nd:
+                    d[v] = nd; q.append(v); touched += 1
+        affected = {s}
+        level = [s]
+        while level:
+            nxt = []
+            for u in level:
+                du = d[u] + 1
+                for v in adj[u]:
+                    if d[v] != du or v in affected: continue
+                    if any(d[w] == du - 1 and w not in affected for w in adj[v]): continue
+                    affected.add(v); nxt.append(v)
+            level = nxt
+        for v in affected:
+            d[v] = d[v] + 1 if d[v] < r else UNREACHABLE
+        self.touched += touched + len(affected)
+
+    def step(self, cell):
+        i = cell[0]*self.h + cell[1]
+        if not 0 <= i < len(self.d): return None
+        cur = self.d[i]
+        if cur == UNREACHABLE: return None
+        for v in self.adj[i]:
+            if self.d[v] < cur:
+                return divmod(v, self.h)
+        return cell
+
+    def report(self):
+        if self.moves:
+            PERF["chase"] = (f"chase field {1e6*self.seconds/self.moves:.0f} us/move, "
+                             f"{self.touched/self.moves:.0f} cells, {self.rebuilds} rebuilds")
+        self.moves = self.rebuilds = self.touched = 0
+        self.seconds = 0.0
+
+# ----------------------------
+# Swept collision (grid DDA for walls, broadphase + segment/circle for enemies)
+# ----------------------------
+# fraction t where the segment enters a solid tile (start tile skipped), else None
+def first_solid_on_segment(is_solid, x0, y0, x1, y1):
+    gx, gy = int(x0//TILE), int(y0//TILE)
+    ex, ey = int(x1//TILE), int(y1//TILE)
+    dx, dy = x1-x0, y1-y0
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    t_max_x = ((gx + (dx > 0))*TILE - x0) / dx if dx else math.inf
+    t_max_y = ((gy + (dy > 0))*TILE - y0) / dy if dy else math.inf
+    t_delta_x = TILE / abs(dx) if dx else math.inf
+    t_delta_y = TILE / abs(dy) if dy else math.inf
+    while (gx, gy) != (ex, ey):
+        if t_max_x < t_max_y:
+            t = t_max_x; gx += step_x; t_max_x += t_delta_x
+        else:
+            t = t_max_y; gy += step_y; t_max_y += t_delta_y
+        if t > 1: break
+        if is_solid(gx, gy):
+            return max(0.0, t)
+    return None
+
+def segment_circle_t(x0, y0, dx, dy, cx, cy, r):
+    fx, fy = x0-cx, y0-cy
+    c = fx*fx + fy*fy - r*r
+    if c < 0: return 0.0
+    a = dx*dx + dy*dy
+    b = fx*dx + fy*dy
+    if a == 0 or b >= 0: return None
+    disc = b*b - a*c
+    if disc < 0: return None
+    t = (-b - math.sqrt(disc)) / a
+    return t if t <= 1 else None
+
+def sweep_axis(world, pos, delta, fixed, horizontal):
+    cell, end = int(pos//TILE), int((pos+delta)//TILE)
+    step = 1 if delta > 0 else -1
+    while cell != end:
+        cell += step
+        if world.is_solid(cell, fixed) if horizontal else world.is_solid(fixed, cell):
+            return cell*TILE - 1e-6 if step > 0 else (cell+1)*TILE
+    return pos + delta
+
+class Broadphase:
+    def __init__(self, cell=64):
+        self.cell = cell
+        self.buckets = {}
+        self.max_radius = 0
+
+    def rebuild(self, entities, radius):
+        buckets = self.buckets
+        buckets.clear()
+        cell = self.cell; r_max = 0
+        for e in entities:
+            key = (int(e.x//cell), int(e.y//cell))
+            bucket = buckets.get(key)
+            if bucket is None: buckets[key] = [e]
+            else: bucket.append(e)
+            r_max = max(r_max, radius(e))
+        self.max_radius = r_max
+
+    def query_segment(self, x0, y0, x1, y1):
+        if not self.buckets: return
+        cell, pad = self.cell, self.max_radius
+        cx0, cx1 = int((min(x0, x1) - pad)//cell), int((max(x0, x1) + pad)//cell)
+        cy0, cy1 = int((min(y0, y1) - pad)//cell), int((max(y0, y1) + pad)//cell)
+        buckets = self.buckets
+        for cx in range(cx0, cx1+1):
+            for cy in range(cy0, cy1+1):
+                bucket = buckets.get((cx, cy))
+                if bucket: yield from bucket
+
+def hit_radius(e): return 12 + e.tier
+
+# ----------------------------
+# Turret line of sight (per-cell bitsets) + coverage
+# ----------------------------
+LOS_CACHE_MAX_BYTES = 8 << 20       # World.los_cache is dropped past this (bitsets grow with the map)
+
+def bit_test(bits, i): return bits[i >> 3] >> (i & 7) & 1
+
+def bit_indices(bits):
+    for byte_i, byte in enumerate(bits):
+        while byte:
+            low = byte & -byte
+            yield byte_i*8 + low.bit_length() - 1
+            byte ^= low
+
+# open cells within radius px and visible centre to centre, as a bitset over x*h + y
+def los_bitset(grid, cell, radius):
+    w, h = len(grid), len(grid[0])
+    def solid(gx, gy): return not (0 <= gx < w and 0 <= gy < h) or grid[gx][gy] == 1
+    bits = bytearray((w*h + 7) // 8)
+    cx, cy = cell
+    ox, oy = cx*TILE + TILE/2, cy*TILE + TILE/2
+    reach = int(radius // TILE) + 1
+    for x in range(max(0, cx-reach), min(w, cx+reach+1)):
+        for y in range(max(0, cy-reach), min(h, cy+reach+1)):
+            if grid[x][y] != 0: continue
+            tx, ty = x*TILE + TILE/2, y*TILE + TILE/2
+            if math.hypot(tx-ox, ty-oy) > radius: continue
+            if first_solid_on_segment(solid, ox, oy, tx, ty) is None:
+                i = x*h + y
+                bits[i >> 3] |= 1 << (i & 7)
+    return bits
+
+def cell_window(area, h):
+    x0, y0, x1, y1 = area
+    return (x*h + y for x in range(x0, x1) for y in range(y0, y1))
+
+def render_cells(indices, h, area, color, counts=None):
+    x0, y0, x1, y1 = area
+    surf = pygame.Surface(((x1-x0)*TILE, (y1-y0)*TILE), pygame.SRCALPHA)
+    r, g, b, a = color
+    for i in indices:
+        alpha = a if counts is None else min(200, a*counts[i])
+        surf.fill((r, g, b, alpha), ((i//h - x0)*TILE + 1, (i%h - y0)*TILE + 1, TILE-2, TILE-2))
+    return surf
+
+# ----------------------------
+# Run telemetry (buffered JSONL event log)
+# ----------------------------
+TELEMETRY_DIR = "telemetry"
+TELEMETRY_ROTATE_BYTES = 1 << 20   # start a new file after ~1 MB
+TELEMETRY_KEEP_FILES = 32          # oldest files beyond this are deleted
+TELEMETRY_FLUSH_INTERVAL = 1.0     # seconds of game time between hand-offs
+
+# encoding and disk I/O happen here; the game thread only hands over whole lists
+class TelemetryWriter:
+    def __init__(self, directory=TELEMETRY_DIR, rotate_bytes=TELEMETRY_ROTATE_BYTES, keep_files=TELEMETRY_KEEP_FILES):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes
+        self.keep_files = keep_files
+        self.queue = queue.SimpleQueue()
+        self.file = None
+        self.file_bytes = 0
+        self.thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, batch):
+        if batch:
+            self.queue.put(batch)
+
+    def close(self, timeout=2.0):
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        name = time.strftime("run-%Y%m%d-%H%M%S") + f"-{os.getpid()}-{int(time.time()*1000)%1000:03d}.jsonl"
+        self.file = open(os.path.join(self.directory, name), "a", encoding="utf-8")
+        self.file_bytes = 0
+        old = sorted(glob.glob(os.path.join(self.directory, "run-*.jsonl")))
+        for path in old[:-self.keep_files]:
+            try: os.remove(path)
+            except OSError: pass
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            try:
+                if self.file is None or self.file_bytes >= self.rotate_bytes:
+                    if self.file: self.file.close()
+                    self._open()
+                data = "".join(json.dumps(ev, separators=(",", ":")) + "\n" for ev in batch)
+                self.file.write(data)
+                self.file.flush()
+                self.file_bytes += len(data)
+            except Exception as e:
+                print("Telemetry write failed:", e)
+        if self.file:
+            self.file.close()
+
+_telemetry_writer = None
+
+def telemetry_writer():
+    global _telemetry_writer
+    if _telemetry_writer is None:
+        _telemetry_writer = TelemetryWriter()
+    return _telemetry_writer
+
+def shutdown_telemetry():
+    global _telemetry_writer
+    if _telemetry_writer is not None:
+        _telemetry_writer.close()
+        _telemetry_writer = None
+
+# rare events as dicts; damage by source and base damage are summed per wave
+class Telemetry:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.run = f"{int(time.time()*1000):x}-{os.getpid()}"
+        self.t = 0.0
+        self.wave = 0
+        self.pending = []
+        self.flush_acc = 0.0
+        self.dmg = {}
+        self.base_dmg = 0.0
+        self.ended = False
+        self.event("run_start")
+
+    def event(self, kind, **data):
+        if not self.enabled: return
+        data["ev"] = kind; data["run"] = self.run; data["t"] = round(self.t, 3); data["wave"] = self.wave
+        self.pending.append(data)
+
+    def tick(self, dt):
+        if not self.enabled: return
+        self.t += dt
+        self.flush_acc += dt
+        if self.flush_acc >= TELEMETRY_FLUSH_INTERVAL:
+            self.flush_acc = 0.0
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            telemetry_writer().submit(self.pending)
+            self.pending = []
+
+    def damage(self, source, amount):
+        self.dmg[source] = self.dmg.get(source, 0.0) + amount
+
+    def base_damage(self, amount):
+        self.base_dmg += amount
+
+    def _emit_wave_totals(self):
+        for source, amount in self.dmg.items():
+            self.event("damage", source=source, amount=round(amount, 2))
+        if self.base_dmg > 0:
+            self.event("base_damage", amount=round(self.base_dmg, 2))
+        self.dmg = {}
+        self.base_dmg = 0.0
+
+    def wave_start(self, wave, enemies, boss=False):
+        self._emit_wave_totals()
+        self.wave = wave
+        self.event("wave_start", enemies=enemies, boss=boss)
+
+    def wave_clear(self, base_hp):
+        self._emit_wave_totals()
+        self.event("wave_clear", base_hp=round(base_hp, 1))
+
+    def kill(self, tier, boss=False):
+        self.event("kill", tier=tier, boss=boss)
+
+    def purchase(self, item, scrap=0, cores=0):
+        self.event("purchase", item=item, scrap=scrap, cores=cores)
+
+    def death(self, lost):
+        self.event("death", lost=lost)
+
+    def end(self, reason):
+        if self.ended: return
+        self.ended = True
+        self._emit_wave_totals()
+        self.event("run_end", reason=reason)
+        self.flush()
+
+def iter_telemetry_events(paths):
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files.extend(sorted(glob.glob(os.path.join(p, "*.jsonl"))))
+        else:
+            files.extend(sorted(glob.glob(p)) or [p])
+    for path in files:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line: continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue    # torn last line of a crashed run
+        except OSError as e:
+            print("Skipping", path, "-", e, file=sys.stderr)
+
+def aggregate_telemetry(events):
+    waves = {}
+    runs = set()
+    starts = {}
+    def entry(w):
+        if w not in waves:
+            waves[w] = {"runs": set(), "cleared": 0, "clear_time": 0.0, "kills": {}, "damage": {},
+                        "base_damage": 0.0, "purchases": {}, "deaths": 0, "ended_here": 0}
+        return waves[w]
+    for ev in events:
+        kind = ev.get("ev"); run = ev.get("run"); w = ev.get("wave", 0)
+        runs.add(run)
+        if kind == "wave_start":
+            entry(w)["runs"].add(run); starts[(run, w)] = ev.get("t", 0.0)
+        elif kind == "wave_clear":
+            s = entry(w); s["cleared"] += 1
+            s["clear_time"] += ev.get("t", 0.0) - starts.get((run, w), ev.get("t", 0.0))
+        elif kind == "kill":
+            k = entry(w)["kills"]; tier = "boss" if ev.get("boss") else str(ev.get("tier"))
+            k[tier] = k.get(tier, 0) + 1
+        elif kind == "damage":
+            d = entry(w)["damage"]; d[ev["source"]] = d.get(ev["source"], 0.0) + ev.get("amount", 0.0)
+        elif kind == "base_damage":
+            entry(w)["base_damage"] += ev.get("amount", 0.0)
+        elif kind == "purchase":
+            pch = entry(w)["purchases"]; pch[ev["item"]] = pch.get(ev["item"], 0) + 1
+        elif kind == "death":
+            entry(w)["deaths"] += 1
+        elif kind == "run_end":
+            entry(w)["ended_here"] += 1
+    return len(runs - {None}), waves
+
+def print_telemetry_report(paths):
+    n_runs, waves = aggregate_telemetry(iter_telemetry_events(paths))
+    print(f"{n_runs} run(s)")
+    for w in sorted(waves):
+        s = waves[w]
+        started = len(s["runs"])
+        label = f"Wave {w}" if w else "Pre-wave"
+        line = f"{label:>9}: started {started:4d}  cleared {s['cleared']:4d}"
+        if s["cleared"]:
+            line += f"  avg clear {s['clear_time']/s['cleared']:6.1f}s"
+        print(line + f"  deaths {s['deaths']}  base dmg {s['base_damage']:.1f}  runs ended {s['ended_here']}")
+        if s["kills"]:
+            print("           kills:", ", ".join(f"{k}={v}" for k, v in sorted(s["kills"].items())))
+        if s["damage"]:
+            total = sum(s["damage"].values()) or 1.0
+            print("           damage:", ", ".join(f"{k}={v:.0f} ({100*v/total:.0f}%)"
+                                                   for k, v in sorted(s["damage"].items(), key=lambda kv: -kv[1])))
+        if s["purchases"]:
+            print("           bought:", ", ".join(f"{k}={v}" for k, v in sorted(s["purchases"].items())))
+
+# ----------------------------
+# Sprite cache (pre-rendered entity images for batched blits)
+# ----------------------------
+# Sprites are (surface, anchor) pairs: blit at (px - anchor, py - anchor) to centre on (px, py).
+_sprite_cache = {}
+TRAIL_ALPHA_STEP = 12   # trail alpha is quantized to this many levels of 0..255
+
+def _sprite_surface(radius):
+    return pygame.Surface((2*radius + 3, 2*radius + 3), pygame.SRCALPHA), radius + 1
+
+def _finish_sprite(surf, alpha=True):
+    if pygame.display.get_surface() is None:
+        return surf
+    return surf.convert_alpha() if alpha else surf.convert()
+
+def enemy_sprite(tier, hit, slowed, chaser=False):
+    key = ("enemy", tier, hit, slowed, chaser)
+    spr = _sprite_cache.get(key)
+    if spr is None:
+        s, c = _sprite_surface(12 + tier)
+        body = (230,120,40) if chaser else (200,60,60)
+        pygame.draw.circle(s, (255,200,200) if hit else body, (c, c), 10+tier)
+        if slowed:
+            pygame.draw.circle(s, CYAN, (c, c), 12+tier, 1)
+        spr = _sprite_cache[key] = (_finish_sprite(s), c)
+    return spr
+
+def boss_sprite(tier, hit, size, aura_radius):
+    key = ("boss", tier, hit, size, aura_radius)
+    spr = _sprite_cache.get(key)
+    if spr is None:
+        s, c = _sprite_surface(max(aura_radius, size + tier + 2))
+        pygame.draw.circle(s, (240, 200, 255) if hit else (190, 80, 220), (c, c), size + tier)
+        pygame.draw.circle(s, (255, 220, 90), (c, c), size + tier + 2, 2)
+        pygame.draw.circle(s, (180, 80, 80), (c, c), aura_radius, 1)
+        spr = _sprite_cache[key] = (_finish_sprite(s), c)
+    return spr
+
+def health_bar(w, h, filled, empty_col, fill_col):
+    key = ("bar", w, h, filled, empty_col, fill_col)
+    img = _sprite_cache.get(key)
+    if img is None:
+        img = pygame.Surface((w+2, h+2))
+        img.fill((30,30,30))
+        img.fill(empty_col, pygame.Rect(1, 1, w, h))
+        if filled > 0:
+            img.fill(fill_col, pygame.Rect(1, 1, filled, h))
+        img = _sprite_cache[key] = _finish_sprite(img, alpha=False)
+    return img
+
+def pickup_sprite(kind, r):
+    key = ("pickup", kind, r)
+    spr = _sprite_cache.get(key)
+    if spr is None:
+        s, c = _sprite_surface(r)
+        pygame.draw.circle(s, BLUE if kind=="core" else GREEN, (c, c), r)
+        pygame.draw.circle(s, WHITE, (c, c), r, 1)
+        spr = _sprite_cache[key] = (_finish_sprite(s), c)
+    return spr
+
+def turret_sprite(color, pips):
+    key = ("turret", color, pips)
+    spr = _sprite_cache.get(key)
+    if spr is None:
+        s, c = _sprite_surface(22)
+        pygame.draw.circle(s, color, (c, c), 10)
+        pygame.draw.circle(s, WHITE, (c, c), 10, 1)
+        for i, lvl in enumerate(pips):
+            if lvl > 0:
+                pygame.draw.rect(s, WHITE, pygame.Rect(c-12+i*8, c+12, 6, 4))
+                if lvl > 1:
+                    pygame.draw.rect(s, WHITE, pygame.Rect(c-12+i*8, c+17, 6, 4))
+        spr = _sprite_cache[key] = (_finish_sprite(s), c)
+    return spr
+
+def bullet_sprite(color, crit):
+    key = ("bullet", color, crit)
+    spr = _sprite_cache.get(key)
+    if spr is None:
+        s, c = _sprite_surface(5)
+        pygame.draw.circle(s, color, (c, c), 3)
+        if crit:
+            pygame.draw.circle(s, (255, 90, 220), (c, c), 5, 1)
+        spr = _sprite_cache[key] = (_finish_sprite(s), c)
+    return spr
+
+def trail_sprite(color, r, alpha):
+    alpha = alpha // TRAIL_ALPHA_STEP * TRAIL_ALPHA_STEP
+    key = ("trail", color, r, alpha)
+    img = _sprite_cache.get(key)
+    if img is None:
+        ts = r*2 + 2
+        img = pygame.Surface((ts, ts), pygame.SRCALPHA)
+        pygame.draw.circle(img, (*color, alpha), (ts//2, ts//2), r)
+        img = _sprite_cache[key] = _finish_sprite(img)
+    return img
+
+def dot_sprite(color, r):
+    key = ("dot", color, r)
+    spr = _sprite_cache.get(key)
+    if spr is None:
+        s, c = _sprite_surface(r)
+        pygame.draw.circle(s, color, (c, c), r)
+        spr = _sprite_cache[key] = (_finish_sprite(s), c)
+    return spr
+
+# ----------------------------
+# Simulation level of detail
+# ----------------------------
+LOD_FAR_INTERVAL = 8            # far entities are stepped every Nth tick with the accumulated dt
+LOD_SCREEN_MARGIN = 96          # px around the visible area that still counts as near
+LOD_PLAYER_RADIUS = 360
+LOD_BASE_RADIUS = 6 * TILE
+LOD_TURRET_MARGIN = 64          # px beyond a turret's range
+_lod_slots = itertools.count()  # staggers far updates so they don't all land on the same tick
+
+# near (on screen, by the player or base, in turret reach) ticks every frame, far every `interval` ticks
+class LodScheduler:
+    def __init__(self, enabled=True, interval=LOD_FAR_INTERVAL):
+        self.enabled = enabled
+        self.interval = interval
+        self.tick = 0
+        self.view = (0, 0, 0, 0)
+        self.zones = []
+
+    def begin(self, world):
+        self.tick += 1
+        cx, cy = world.camera
+        m = LOD_SCREEN_MARGIN
+        self.view = (cx - m, cy - m, cx + WIDTH + m, cy + HEIGHT + m)
+        bx, by = world.base_cell
+        zones = [(world.player.x, world.player.y, LOD_PLAYER_RADIUS),
+                 (bx*TILE + TILE/2, by*TILE + TILE/2, LOD_BASE_RADIUS)]
+        zones += [(t.x, t.y, t.stats()["range"] + LOD_TURRET_MARGIN) for t in world.turrets]
+        self.zones = [(x, y, r*r) for x, y, r in zones]
+
+    def near(self, x, y):
+        if not self.enabled: return True
+        x0, y0, x1, y1 = self.view
+        if x0 <= x <= x1 and y0 <= y <= y1: return True
+        for zx, zy, r2 in self.zones:
+            if (x-zx)*(x-zx) + (y-zy)*(y-zy) <= r2: return True
+        return False
+
+    def due(self, entity):
+        return (self.tick + entity.lod_slot) % self.interval == 0
+
+# ----------------------------
+# Entity registry (dense lists + generational handles)
+# ----------------------------
+# Dense list with O(1) remove(); compact() drops unlinked entities in one pass, order kept.
+# Handles (slot, generation) resolve to None once their entity is gone, even if the slot is reused.
+class Registry:
+    def __init__(self, items=()):
+        self.items = []
+        self._owner = []        # slot -> entity, None when free
+        self._gen = []          # slot -> generation, bumped on removal
+        self._free = []
+        self._removed = 0       # unlinked entities still sitting in `items`
+        self.extend(items)
+
+    def append(self, e):
+        if self._free:
+            slot = self._free.pop()
+            self._owner[slot] = e
+        else:
+            slot = len(self._owner)
+            self._owner.append(e); self._gen.append(0)
+        e.reg_slot = slot
+        self.items.append(e)
+
+    def extend(self, entities):
+        for e in entities: self.append(e)
+
+    def remove(self, e):
+        if e not in self:
+            raise ValueError("entity is not registered")
+        slot = e.reg_slot
+        self._owner[slot] = None
+        self._gen[slot] += 1
+        self._free.append(slot)
+        e.reg_slot = -1
+        self._removed += 1
+
+    def compact(self):
+        items = self.items
+        if self._removed:
+            j = 0
+            for e in items:
+                if e.reg_slot >= 0:
+                    items[j] = e; j += 1
+            del items[j:]
+            self._removed = 0
+        return items
+
+    def clear(self):
+        for e in self.items:
+            if e.reg_slot >= 0: self.remove(e)
+        self.items.clear()
+        self._removed = 0
+
+    def trim(self, keep):
+        items = self.compact()
+        for e in items[:max(0, len(items) - keep)]:
+            self.remove(e)
+        self.compact()
+
+    def handle(self, e):
+        return (e.reg_slot, self._gen[e.reg_slot]) if e in self else None
+
+    def get(self, handle):
+        if handle is None: return None
+        slot, gen = handle
+        return self._owner[slot] if self._gen[slot] == gen else None
+
+    def index(self, e): return self.compact().index(e)
+    def __contains__(self, e):
+        slot = getattr(e, "reg_slot", -1)
+        return 0 <= slot < len(self._owner) and self._owner[slot] is e
+    def __len__(self): return len(self.items) - self._removed
+    def __bool__(self): return len(self.items) > self._removed
+    def __getitem__(self, i): return self.compact()[i]
+    def __iter__(self):
+        if not self._removed: return iter(self.items)
+        return (e for e in self.items if e.reg_slot >= 0)
+
+# ----------------------------
+# Job scheduler (recurring gameplay work under a per-tick budget)
+# ----------------------------
+JOB_PRIORITIES = ("critical", "normal", "background")  # critical jobs always run once due
+JOB_TICK_BUDGET = 24            # cost units of normal/background jobs per World.update (see every())
+JOB_REPORT_INTERVAL = 1.0       # game seconds between perf-overlay updates
+
+class Job:
+    __slots__ = ("name", "period", "fn", "registry", "handle", "priority", "due", "cost")
+
+    def __init__(self, name, period, fn, registry, handle, priority, due, cost):
+        self.name, self.period, self.fn = name, period, fn
+        self.registry, self.handle = registry, handle
+        self.priority, self.due, self.cost = priority, due, cost
+
+# Recurring per-entity jobs. Due ones run by priority within a budget of fixed cost units per tick
+# (critical ones regardless), so what runs on a tick never depends on the host.
+class JobScheduler:
+    def __init__(self, budget=JOB_TICK_BUDGET):
+        self.budget = budget
+        self.now = 0.0
+        self.queues = [[] for _ in JOB_PRIORITIES]    # heaps of (due, seq, job)
+        self.seq = itertools.count()
+        self.stats = {}         # name -> [runs, seconds, worst seconds, deferrals, worst lateness]
+        self.report_at = JOB_REPORT_INTERVAL
+
+    # cost: the job's share of JOB_TICK_BUDGET (1 for a grid lookup, more for scans)
+    def every(self, name, period, fn, registry, owner, priority="normal", first=0.0, cost=1):
+        job = Job(name, period, fn, registry, registry.handle(owner), JOB_PRIORITIES.index(priority),
+                  self.now + first, cost)
+        heapq.heappush(self.queues[job.priority], (job.due, next(self.seq), job))
+        return job
+
+    def wake(self, job):
+        if job is not None and job.due > self.now:
+            job.due = self.now
+            heapq.heappush(self.queues[job.priority], (job.due, next(self.seq), job))
+
+    def _stat(self, name):
+        st = self.stats.get(name)
+        if st is None:
+            st = self.stats[name] = [0, 0.0, 0.0, 0, 0.0]
+        return st
+
+    def run(self, world, dt):
+        self.now = now = self.now + dt
+        clock = time.perf_counter
+        left = self.budget
+        over = False
+        for level, q in enumerate(self.queues):
+            while q and q[0][0] <= now:
+                if level and left <= 0:
+                    over = True
+                    break
+                due, _, job = heapq.heappop(q)
+                if due != job.due: continue             # superseded by wake()
+                owner = job.registry.get(job.handle)
+                if owner is None: continue              # entity gone: the job ends with it
+                left -= job.cost
+                t0 = clock()
+                job.fn(owner, world)
+                t1 = clock()
+                st = self._stat(job.name)
+                st[0] += 1; st[1] += t1 - t0
+                st[2] = max(st[2], t1 - t0); st[4] = max(st[4], now - due)
+                job.due = now + job.period
+                heapq.heappush(q, (job.due, next(self.seq), job))
+            if over:
+                for q2 in self.queues[level:]:
+                    for due, _, job in q2:
+                        if due <= now and due == job.due:
+                            self._stat(job.name)[3] += 1
+                break
+        if now >= self.report_at:
+            self.report_at = now + JOB_REPORT_INTERVAL
+            self.report()
+
+    def report(self):
+        parts = [f"{name} {st[0]/JOB_REPORT_INTERVAL:.0f}/s {1e6*st[1]/max(1, st[0]):.0f}us"
+                 + (f" ({st[3]} deferred, {1000*st[4]:.0f}ms late)" if st[3] else "")
+                 for name, st in sorted(self.stats.items())]
+        if parts:
+            PERF["jobs"] = "jobs " + ", ".join(parts)
+        self.stats = {}
+
+# ----------------------------
+# Combat statistics (flat per-source counters)
+# ----------------------------
+# One array('d') of COMBAT_FIELDS per source: the player at 0, then a block per turret (`stat`).
+COMBAT_FIELDS = ("shots", "hits", "damage", "dot", "slow", "crits")
+SHOTS, HITS, DAMAGE, DOT, SLOW, CRITS = range(len(COMBAT_FIELDS))
+COMBAT_STRIDE = len(COMBAT_FIELDS)
+PLAYER_STAT = 0
+COMBAT_SUMMARY_ROWS = 5
+
+# `mark` is a copy taken at wave start; data - mark is the wave's share
+class CombatStats:
+    def __init__(self):
+        self.data = array("d", (0.0,) * COMBAT_STRIDE)
+        self.mark = array("d", self.data)
+
+    def add_source(self):
+        off = len(self.data)
+        self.data.extend((0.0,) * COMBAT_STRIDE)
+        self.mark.extend((0.0,) * COMBAT_STRIDE)
+        return off
+
+    def wave_start(self):
+        self.mark = array("d", self.data)
+
+    def get(self, off, wave=False):
+        vals = self.data[off:off + COMBAT_STRIDE]
+        if wave:
+            vals = [v - m for v, m in zip(vals, self.mark[off:off + COMBAT_STRIDE])]
+        return dict(zip(COMBAT_FIELDS, vals))
+
+def describe_combat(st):
+    parts = [f"{st['shots']:.0f} shots"]
+    if st["shots"]: parts.append(f"{100 * st['hits'] / st['shots']:.0f}% hit")
+    parts.append(f"{st['damage']:.0f} dmg")
+    if st["dot"] >= 0.5: parts.append(f"+{st['dot']:.0f} DoT")
+    if st["slow"] >= 0.5: parts.append(f"{st['slow']:.0f}s slowed")
+    if st["crits"]: parts.append(f"{st['crits']:.0f} crits")
+    return ", ".join(parts)
 
 # ----------------------------
 # Entities
 # ----------------------------
 class Bullet:
     def __init__(self, pos, vel, damage=1, life=1.5, dot_dps=0, dot_dur=0,
-                 slow_factor=1.0, slow_dur=0, color=YELLOW, playerBullet=False, is_crit=False):
+                 slow_factor=1.0, slow_dur=0, color=YELLOW, playerBullet=False, is_crit=False, source=None, stat=PLAYER_STAT):
         self.x,self.y = pos
         self.vx,self.vy = vel
         self.damage=damage
@@ -195,12 +1401,15 @@ class Bullet:
         self.color = color
         self.playerBullet=playerBullet
         self.is_crit = is_crit
+        self.source = source or ("player" if playerBullet else "turret")
+        self.stat = stat        # CombatStats offset of the shooter
         self.radius = 3
 
         self.trail = []
         self.trail_maxlife = 0.25
         self.trail_interval = 0.02
         self.trail_acc = 0.0
+        self.trail_lag = 0.0
 
     def update(self, dt, world):
         if not self.alive: return
@@ -209,27 +1418,33 @@ class Bullet:
 
         self.trail_acc += dt
         if SETTINGS.get("bullet_trails", True):
+            if not world.cosmetic:      # hidden fast-forward substep: age the trail on the next drawn one
+                self.trail_lag += dt
+                self._expire(dt)
+                return
+            age = dt + self.trail_lag
+            self.trail_lag = 0.0
+            if self.trail_acc >= 2*self.trail_interval:     # thinned: one point for the skipped span
+                self.trail.append((self.x, self.y, self.trail_maxlife))
+                self.trail_acc = 0.0
             while self.trail_acc >= self.trail_interval:
                 self.trail.append((self.x, self.y, self.trail_maxlife))
                 self.trail_acc -= self.trail_interval
-            self.trail = [(tx, ty, tlife - dt) for (tx, ty, tlife) in self.trail if tlife - dt > 0]
+            self.trail = [(tx, ty, tlife - age) for (tx, ty, tlife) in self.trail if tlife - age > 0]
             if len(self.trail) > 64:
                 self.trail = self.trail[-64:]
         else:
             if self.trail:
                 self.trail.clear()
             self.trail_acc = 0.0
+        self._expire(dt)
 
+    def _expire(self, dt):
         self.life -= dt
         if self.life <= 0:
             self.alive = False
 
-        if self.alive and self.playerBullet:
-            gx,gy=int(self.x//TILE), int(self.y//TILE)
-            if world.is_solid(gx,gy):
-                self.alive=False
-
-    def draw(self, surf, cam=(0,0)):
+    def add_sprites(self, out, cam=(0,0)):
         if not self.alive: return
         px = int(self.x - cam[0]); py = int(self.y - cam[1])
         if SETTINGS.get("bullet_trails", True):
@@ -237,14 +1452,9 @@ class Bullet:
             for (tx, ty, tlife) in self.trail:
                 alpha = int(180 * max(0.0, tlife / self.trail_maxlife))
                 r = max(1, int(self.radius * (0.6 + 0.4 * (tlife / self.trail_maxlife))))
-                ts = r*2 + 2
-                s = pygame.Surface((ts, ts), pygame.SRCALPHA)
-                pygame.draw.circle(s, (*trail_col, alpha), (ts//2, ts//2), r)
-                surf.blit(s, (int(tx - cam[0]) - r, int(ty - cam[1]) - r))
-        core_col = (255, 255, 255) if self.is_crit else self.color
-        pygame.draw.circle(surf, core_col, (px, py), self.radius)
-        if self.is_crit:
-            pygame.draw.circle(surf, (255, 90, 220), (px, py), self.radius+2, 1)
+                out.append((trail_sprite(trail_col, r, alpha), (int(tx - cam[0]) - r, int(ty - cam[1]) - r)))
+        img, c = bullet_sprite((255, 255, 255) if self.is_crit else self.color, self.is_crit)
+        out.append((img, (px - c, py - c)))
 
 class DamageText:
     def __init__(self, x, y, amount, color=YELLOW, crit=False):
@@ -254,6 +1464,7 @@ class DamageText:
         self.vy = -28 if not crit else -34
         self.color = color if not crit else (255, 90, 220)
         self.crit = crit
+        self.lod_dt = 0.0; self.lod_slot = next(_lod_slots)
 
     def update(self, dt):
         self.y += self.vy * dt
@@ -266,9 +1477,13 @@ class DamageText:
         img = font.render(txt, True, self.color)
         img.set_alpha(alpha)
         px = int(self.x - cam[0]); py = int(self.y - cam[1])
-        surf.blit(img, (px - img.get_width()//2, py - img.get_height()//2))
+        return surf.blit(img, (px - img.get_width()//2, py - img.get_height()//2))
 
 class Enemy:
+    full_rate = False   # always updated every tick regardless of LOD
+    chases = False      # paths to the player (world.chase) instead of the base
+    path_interval = 0.4
+
     def __init__(self,grid_pos, tier=1):
         self.gx,self.gy = grid_pos
         self.x,self.y = self.gx*TILE+TILE/2, self.gy*TILE+TILE/2
@@ -277,7 +1492,7 @@ class Enemy:
         self.max_hp = self.hp
         self.damage = 4 + 2*tier
         self.tier=tier
-        self.path_timer=0
+        self.jobs = None        # path job, registered by World.update
         self.next_cell=(self.gx,self.gy)
         self.alive=True
         self.hit_timer=0
@@ -285,26 +1500,32 @@ class Enemy:
         self.slows=[]
         self.dot_immune=False
         self.slow_immune=False
+        self.lod_dt = 0.0; self.lod_slot = next(_lod_slots)
 
     def grid_cell(self): return int(self.x//TILE), int(self.y//TILE)
-    def apply_dot(self, dps, duration):
+    def apply_dot(self, dps, duration, stat=PLAYER_STAT):
         if self.dot_immune or dps<=0 or duration<=0: return
-        self.dots.append({"dps":dps, "t":duration})
-    def apply_slow(self, factor, duration):
+        self.dots.append({"dps":dps, "t":duration, "stat":stat})
+    def apply_slow(self, factor, duration, stat=PLAYER_STAT):
         if self.slow_immune or duration<=0 or factor>=1.0: return
-        self.slows.append({"factor":max(0.1, factor), "t":duration})
+        self.slows.append({"factor":max(0.1, factor), "t":duration, "stat":stat})
 
     def _tick_status(self, dt, world):
         total_dps=0.0
+        combat = world.combat.data
         for s in self.dots:
             total_dps+=s["dps"]; s["t"]-=dt
+            combat[s["stat"] + DOT] += s["dps"]*dt
         self.dots=[s for s in self.dots if s["t"]>0]
         if total_dps>0:
             dmg = total_dps*dt
             self.hp -= dmg
             self.hit_timer=0.05
+            world.telemetry.damage("dot", dmg)
             if SETTINGS.get("damage_numbers", True):
                 world.add_damage_text(self.x, self.y-18, dmg, color=ORANGE)
+        if self.slows:
+            combat[min(self.slows, key=lambda s: s["factor"])["stat"] + SLOW] += dt    # the slow in effect
         for s in self.slows: s["t"]-=dt
         self.slows=[s for s in self.slows if s["t"]>0]
 
@@ -318,11 +1539,6 @@ class Enemy:
         if not self.alive: return
         self._tick_status(dt, world)
         self.hit_timer=max(0, self.hit_timer-dt)
-        self.path_timer-=dt
-        target = world.base_cell
-        if self.path_timer<=0:
-            self.next_cell = bfs_next_step(world.grid, self.grid_cell(), target)
-            self.path_timer = 0.4
         nx,ny = self.next_cell
         tx,ty = nx*TILE+TILE/2, ny*TILE+TILE/2
         ang = math.atan2(ty-self.y, tx-self.x)
@@ -334,25 +1550,105 @@ class Enemy:
             self.gx,self.gy=int(self.x//TILE), int(self.y//TILE)
         if (self.gx,self.gy)==world.base_cell:
             world.base_hp = max(0, world.base_hp - self.damage*dt)
+            world.telemetry.base_damage(self.damage*dt)
+
+    # first re-path staggered by LOD slot so a spawn batch spreads over the period
+    def register_jobs(self, world):
+        self.next_cell = self.path_step(world)
+        self.jobs = world.jobs.every("path", self.path_interval, Enemy.repath, world.enemies, self,
+                                     first=self.path_interval * (1 + self.lod_slot % 8) / 8)
+
+    def repath(self, world):
+        self.catch_up(world)
+        self.next_cell = self.path_step(world)
+
+    def path_step(self, world):
+        return downhill_step(world.base_dist, self.grid_cell())
+
+    def distance_over(self, span):
+        t = 0.0; d = 0.0
+        for end in sorted({min(s["t"], span) for s in self.slows} | {span}):
+            if end <= t: continue
+            factors = [s["factor"] for s in self.slows if s["t"] > t]
+            d += self.base_speed * (min(factors) if factors else 1.0) * 60 * (end - t)
+            t = end
+        return d
+
+    # LOD step: movement, DoT and slows integrated in closed form over the banked dt
+    def update_far(self, dt, world):
+        self._coast(dt, world)
+        self.hit_timer = max(0, self.hit_timer-dt)
+        if world.is_solid(int(self.x//TILE), int(self.y//TILE)):
+            self.x=self.gx*TILE+TILE/2; self.y=self.gy*TILE+TILE/2
+        else:
+            self.gx,self.gy=int(self.x//TILE), int(self.y//TILE)
+        if (self.gx,self.gy)==world.base_cell:
+            world.base_hp = max(0, world.base_hp - self.damage*dt)
+            world.telemetry.base_damage(self.damage*dt)
 
-    def draw(self,surf,cam):
-        px, py = int(self.x - cam[0]), int(self.y - cam[1])
-        c = (200,60,60) if self.hit_timer<=0 else (255,200,200)
-        pygame.draw.circle(surf, c, (px, py), 10+self.tier)
+    def _coast(self, span, world):
+        if span <= 0: return
+        dmg = 0.0
+        combat = world.combat.data
+        for s in self.dots:
+            d = s["dps"] * min(s["t"], span)
+            combat[s["stat"] + DOT] += d
+            dmg += d
         if self.slows:
-            pygame.draw.circle(surf, CYAN, (px, py), 12+self.tier,1)
+            s = min(self.slows, key=lambda s: s["factor"])
+            combat[s["stat"] + SLOW] += min(s["t"], span)
+        step = self.distance_over(span)
+        for s in self.dots: s["t"] -= span
+        for s in self.slows: s["t"] -= span
+        self.dots = [s for s in self.dots if s["t"] > 0]
+        self.slows = [s for s in self.slows if s["t"] > 0]
+        if dmg > 0:
+            self.hp -= dmg
+            world.telemetry.damage("dot", dmg)
+        nx,ny = self.next_cell
+        tx,ty = nx*TILE+TILE/2, ny*TILE+TILE/2
+        d = math.hypot(tx-self.x, ty-self.y)
+        if d <= step:
+            self.x, self.y = tx, ty
+        else:
+            self.x += (tx-self.x) * step/d
+            self.y += (ty-self.y) * step/d
+
+    def catch_up(self, world):
+        if self.lod_dt:
+            self.update_far(self.lod_dt, world)
+            self.lod_dt = 0.0
+
+    def add_sprites(self,out,cam):
+        px, py = int(self.x - cam[0]), int(self.y - cam[1])
+        img, c = enemy_sprite(self.tier, self.hit_timer>0, bool(self.slows), self.chases)
+        out.append((img, (px-c, py-c)))
         if self.hp < self.max_hp or self.hit_timer > 0:
             w = 26 + self.tier*3
-            h = 4
             ratio = max(0.0, min(1.0, self.hp / self.max_hp))
-            x = px - w//2
-            y = py - (14 + self.tier*2)
-            pygame.draw.rect(surf, (30,30,30), pygame.Rect(x-1, y-1, w+2, h+2))
-            pygame.draw.rect(surf, (90,20,20),  pygame.Rect(x, y, w, h))
-            if ratio > 0:
-                pygame.draw.rect(surf, (80,210,120), pygame.Rect(x, y, int(w*ratio), h))
+            bar = health_bar(w, 4, int(w*ratio), (90,20,20), (80,210,120))
+            out.append((bar, (px - w//2 - 1, py - (14 + self.tier*2) - 1)))
+
+# hunts the player within CHASE_RADIUS steps, heads for the base otherwise
+class Chaser(Enemy):
+    chases = True
+    path_interval = 0.25
+
+    def __init__(self, grid_pos, tier=1):
+        super().__init__(grid_pos, tier)
+        self.base_speed = 1.5 + 0.2*tier
+        self.max_hp = self.hp = 1 + tier
+
+    def path_step(self, world):
+        world.chase.follow(world.player.grid_cell())
+        step = world.chase.step(self.grid_cell())
+        return super().path_step(world) if step is None else step
+
+MINION_RING = tuple((dx, dy) for dx in range(-4, 5) for dy in range(-4, 5) if abs(dx) + abs(dy) in (4, 5))
 
 class Boss(Enemy):
+    full_rate = True    # aura damage stays per tick
+
     def __init__(self, grid_pos, wave_index):
         super().__init__(grid_pos, tier=6 + wave_index // 10)
         self.is_boss = True
@@ -361,7 +1657,6 @@ class Boss(Enemy):
         self.damage = 16 + 4 * (wave_index // 10)
         self.aura_radius = 96
         self.aura_dps = 20.0
-        self.minion_timer = 3.5
         self.minion_cooldown = 3.5
         self.size = 18
 
@@ -373,21 +1668,18 @@ class Boss(Enemy):
             world.player.hp -= self.aura_dps * dt
             if world.player.hp <= 0:
                 world.player.respawn()
-        self.minion_timer -= dt
-        if self.minion_timer <= 0:
-            self.minion_timer = self.minion_cooldown
-            self.spawn_minions(world, count=2)
+
+    def register_jobs(self, world):
+        super().register_jobs(world)
+        world.jobs.every("minions", self.minion_cooldown, Boss.spawn_minions, world.enemies, self,
+                         priority="critical", first=self.minion_cooldown)
 
     def spawn_minions(self, world, count=2):
         w, h = len(world.grid), len(world.grid[0])
         gx, gy = int(self.x // TILE), int(self.y // TILE)
-        options = []
-        for dx in range(-4, 5):
-            for dy in range(-4, 5):
-                if abs(dx) + abs(dy) in (4, 5):
-                    x, y = gx + dx, gy + dy
-                    if 1 <= x < w-1 and 1 <= y < h-1 and world.grid[x][y] == 0:
-                        options.append((x, y))
+        grid = world.grid
+        options = [(gx + dx, gy + dy) for dx, dy in MINION_RING
+                   if 1 <= gx + dx < w-1 and 1 <= gy + dy < h-1 and grid[gx + dx][gy + dy] == 0]
         random.shuffle(options)
         for _ in range(count):
             if not options: break
@@ -396,21 +1688,14 @@ class Boss(Enemy):
             e.dot_immune = True     # boss minions: immune to DoT
             world.enemies.append(e)
 
-    def draw(self, surf, cam):
+    def add_sprites(self, out, cam):
         px = int(self.x - cam[0]); py = int(self.y - cam[1])
-        c = (190, 80, 220) if self.hit_timer <= 0 else (240, 200, 255)
-        pygame.draw.circle(surf, c, (px, py), self.size + self.tier)
-        pygame.draw.circle(surf, (255, 220, 90), (px, py), self.size + self.tier + 2, 2)
-        pygame.draw.circle(surf, (180, 80, 80), (px, py), self.aura_radius, 1)
+        img, c = boss_sprite(self.tier, self.hit_timer > 0, self.size, self.aura_radius)
+        out.append((img, (px - c, py - c)))
         w = 36 + self.tier * 3
-        h = 5
         ratio = max(0.0, min(1.0, self.hp / self.max_hp))
-        x = px - w // 2
-        y = py - (28 + self.tier * 2)
-        pygame.draw.rect(surf, (30,30,30), pygame.Rect(x-1, y-1, w+2, h+2))
-        pygame.draw.rect(surf, (110, 30, 110), pygame.Rect(x, y, w, h))
-        if ratio > 0:
-            pygame.draw.rect(surf, (210, 110, 240), pygame.Rect(x, y, int(w * ratio), h))
+        bar = health_bar(w, 5, int(w * ratio), (110, 30, 110), (210, 110, 240))
+        out.append((bar, (px - w // 2 - 1, py - (28 + self.tier * 2) - 1)))
 
 class Pickup:
     def __init__(self,pos,type="scrap",amount=1):
@@ -419,14 +1704,15 @@ class Pickup:
         self.amount=amount
         self.alive=True
         self.pulse=0
-    def update(self,dt,_):
-        self.pulse=(self.pulse+dt)%1.0
-    def draw(self,surf, cam):
+        self.lod_dt = 0.0; self.lod_slot = next(_lod_slots)
+    def update(self,dt,world):
+        if world.cosmetic:
+            self.pulse=(self.pulse+dt)%1.0
+    def add_sprites(self,out, cam):
         r=6+int(2*math.sin(self.pulse*math.tau))
-        color = BLUE if self.type=="core" else GREEN
+        img, c = pickup_sprite(self.type, r)
         px, py = int(self.x - cam[0]), int(self.y - cam[1])
-        pygame.draw.circle(surf, color, (px,py), r)
-        pygame.draw.circle(surf, WHITE, (px,py), r,1)
+        out.append((img, (px-c, py-c)))
 
 # ----------------------------
 # Turrets
@@ -447,6 +1733,7 @@ TURRET_KINDS = {
 }
 
 MAX_UPGRADE = 5
+TURRET_RETARGET_INTERVAL = 0.25     # seconds between nearest-enemy scans while a target is held or none is in sight
 
 class Turret:
     def __init__(self,cell,turret_type="basic"):
@@ -455,6 +1742,12 @@ class Turret:
         self.type = turret_type if turret_type in TURRET_KINDS else "basic"
         self.cooldown=0
         self.upgrades = {"dmg":0, "rng":0, "rate":0}
+        self.target = None      # handle into world.enemies
+        self.jobs = None        # retarget job, registered by World.update
+        self.stat = None        # CombatStats offset, assigned with the jobs
+        self.los = None         # bitset of visible cells for los_range (see World.cover)
+        self.los_range = 0
+        self.los_h = 0          # grid height the bitset was built for
 
     def upgrade_level(self, key): return self.upgrades.get(key,0)
     def can_upgrade(self, key): return self.upgrade_level(key) < MAX_UPGRADE
@@ -467,6 +1760,9 @@ class Turret:
         if self.can_upgrade(key):
             self.upgrades[key] += 1
     def base_cfg(self): return TURRET_KINDS[self.type]
+    def sees(self, e):
+        if self.los is None: return True
+        return bit_test(self.los, int(e.x//TILE)*self.los_h + int(e.y//TILE))
 
     def stats(self):
         cfg = self.base_cfg()
@@ -491,13 +1787,30 @@ class Turret:
             "color": cfg["color"], "bullet_color": cfg["bullet_color"]
         }
 
+    def register_jobs(self, world):
+        self.jobs = world.jobs.every("retarget", TURRET_RETARGET_INTERVAL, Turret.retarget, world.turrets, self,
+                                     cost=2)    # scans every enemy
+
+    def retarget(self, world):
+        target = world.enemies.get(self.target)
+        rng = self.stats()["range"]
+        if target is None or dist((self.x,self.y),(target.x,target.y))>=rng or not self.sees(target):
+            target=min((e for e in world.enemies if dist((self.x,self.y),(e.x,e.y))<rng and self.sees(e)),
+                       key=lambda e: dist((self.x,self.y),(e.x,e.y)), default=None)
+            self.target = world.enemies.handle(target) if target else None
+
     def update(self,dt,world):
         self.cooldown=max(0,self.cooldown-dt)
         if not world.enemies:
             return
         st = self.stats()
-        target=min(world.enemies, key=lambda e: dist((self.x,self.y),(e.x,e.y)))
-        if dist((self.x,self.y),(target.x,target.y))<st["range"]:
+        target = world.enemies.get(self.target)
+        if self.target is not None and (target is None or not self.sees(target)
+                                        or dist((self.x,self.y),(target.x,target.y))>=st["range"]):
+            self.target = None
+            world.jobs.wake(self.jobs)     # lost it: pick another on the next tick
+            return
+        if target:
             if self.cooldown==0:
                 ang=math.atan2(target.y-self.y, target.x-self.x)
                 vx,vy = math.cos(ang)*st["proj_speed"], math.sin(ang)*st["proj_speed"]
@@ -507,42 +1820,773 @@ class Turret:
                         damage=st["damage"], life=1.5,
                         dot_dps=st["dot_dps"], dot_dur=st["dot_dur"],
                         slow_factor=st["slow_factor"], slow_dur=st["slow_dur"],
-                        color=st["bullet_color"]
+                        color=st["bullet_color"], source="turret_"+self.type, stat=self.stat
                     )
                 )
+                world.combat.data[self.stat + SHOTS] += 1
                 self.cooldown=st["rate"]
 
-    def draw(self,surf, cam):
-        st = self.stats()
+    def add_sprites(self,out, cam):
+        pips = tuple(min(2, self.upgrade_level(key)) for key in ("dmg","rng","rate"))
+        img, c = turret_sprite(self.base_cfg()["color"], pips)
         px, py = int(self.x - cam[0]), int(self.y - cam[1])
-        pygame.draw.circle(surf, st["color"],(px,py), 10)
-        pygame.draw.circle(surf, WHITE,(px,py), 10,1)
-        for i,key in enumerate(("dmg","rng","rate")):
-            lvl = self.upgrade_level(key)
-            if lvl>0:
-                pygame.draw.rect(surf, WHITE, pygame.Rect(px-12+i*8, py+12, 6, 4))
-                if lvl>1:
-                    pygame.draw.rect(surf, WHITE, pygame.Rect(px-12+i*8, py+17, 6, 4))
+        out.append((img, (px-c, py-c)))
 
 # ----------------------------
-# World
+# Wave director (data-driven composition, streamed spawning)
 # ----------------------------
-class World:
+# Enemy count for wave w is clamp(count_base + count_per_wave*w, count_min, count_max); tier is
+# tier_base + w // tier_every. Every boss_every-th wave swaps the regular pack for a boss plus escorts.
+WAVE_RULES = {
+    "regular": {"count_base": 3, "count_per_wave": 1.0, "count_min": 1, "count_max": 18},
+    "boss_escort": {"count_base": 2, "count_per_wave": 0.5, "count_min": 2, "count_max": 10},
+    "tier_base": 1, "tier_every": 4,
+    "boss_every": 10,
+    "spawn_interval": 0.3,      # seconds between releases once the wave has started
+    "chasers": {"from_wave": 3, "share": 0.25},     # this share of a wave's regular enemies hunt the player
+}
+
+def is_boss_wave(wave): return wave % WAVE_RULES["boss_every"] == 0
+
+def wave_plan(wave):
+    rules = WAVE_RULES
+    tier = rules["tier_base"] + wave // rules["tier_every"]
+    pack = rules["boss_escort" if is_boss_wave(wave) else "regular"]
+    count = int(clamp(pack["count_base"] + int(pack["count_per_wave"] * wave), pack["count_min"], pack["count_max"]))
+    plan = [("boss", wave)] if is_boss_wave(wave) else []
+    ch = rules["chasers"]
+    chasers = int(count * ch["share"]) if wave >= ch["from_wave"] else 0
+    plan += [("chaser" if (i+1)*chasers // count > i*chasers // count else "enemy", tier) for i in range(count)]
+    return [(i * rules["spawn_interval"], kind, arg) for i, (kind, arg) in enumerate(plan)]
+
+# a streamed map passes its finished span and base field: its edge, reachable cells only
+def spawn_cells(grid, span=None, field=None):
+    w, h = len(grid), len(grid[0])
+    x0, x1 = max(1, span[0]) if span else 1, min(w-2, span[1]-1) if span else w-2
+    ring = {(x, y) for x in (x0, x1) for y in range(1, h-1)}
+    ring |= {(x, y) for y in (1, h-2) for x in range(x0, x1+1)}
+    return sorted(c for c in ring if grid[c[0]][c[1]] == 0 and (field is None or field[c[0]][c[1]] >= 0))
+
+class WaveDirector:
+    def __init__(self, grid):
+        self.cells = spawn_cells(grid)
+        self.queue = deque()
+        self.clock = 0.0
+
+    @property
+    def pending(self): return bool(self.queue)
+
+    def start(self, wave):
+        self.queue.extend(wave_plan(wave))
+        self.clock = 0.0
+        return len(self.queue)
+
+    def update(self, dt, world):
+        if not self.queue: return
+        self.clock += dt
+        while self.queue and self.queue[0][0] <= self.clock:
+            _, kind, arg = self.queue.popleft()
+            if not self.cells: continue
+            cell = random.choice(self.cells)
+            if kind == "boss":
+                world.enemies.append(Boss(cell, arg))
+                if TRACE: TRACE.mark("boss_spawn")
+            elif kind == "chaser":
+                world.enemies.append(Chaser(cell, tier=arg))
+            else:
+                world.enemies.append(Enemy(cell, tier=arg))
+
+# ----------------------------
+# HUD layer (retained widgets)
+# ----------------------------
+# re-rendered only when its key (exactly what is visible) changes
+class HudWidget:
+    def __init__(self, build):
+        self.build = build
+        self.key = None
+        self.surf = None
+
+    def get(self, key):
+        if self.surf is None or key != self.key:
+            self.key = key
+            self.surf = self.build(*key)
+        return self.surf
+
+BASE_RING_STEPS = 360   # base HP ring is quantized to one step per degree
+
+def render_text(text, size, color, bold=False):
+    return get_font(size, bold=bold).render(text, True, color)
+
+def render_status_line(hp, max_hp, scrap, cores, kits, backpack, capacity, wave, base_hp):
+    kits_text = f"B:{kits[0]} F:{kits[1]} I:{kits[2]}"
+    text=f"HP {hp}/{max_hp}  Scrap:{scrap}  Cores:{cores}  Kits[{kits_text}]  Backpack:{backpack}/{capacity}  Wave:{wave}  BaseHP:{base_hp}"
+    return get_font(18).render(text,True,WHITE)
+
+def render_shop_panel():
+    font=get_font(18)
+    panel=pygame.Surface((420,320))
+    panel.fill((16,22,30))
+    pygame.draw.rect(panel,(80,120,160),panel.get_rect(),2)
+    lines=[
+        "SHOP (on base) — [Esc/E] to close",
+        "1) +8% Speed ............ 5 scrap",
+        "2) +0.5 Damage .......... 7 scrap",
+        "3) +10 HP ............... 6 scrap",
+        "4) +3 Backpack Capacity . 8 scrap",
+        "5) Basic Turret ......... 3 cores",
+        "6) Repair Base +30 ...... 2 cores",
+        "7) Flame Turret (DoT) ... 4 cores",
+        "8) Ice Turret (Slow) .... 4 cores",
+        "9) Shot Speed +12% ...... 4 scrap",
+        "",
+        "Press [1-9] to buy."
+    ]
+    for i,l in enumerate(lines):
+        panel.blit(font.render(l,True,WHITE),(12,12+i*24))
+    return panel
+
+def render_upgrade_panel(ttype, levels, costs, scrap, record):
+    font=get_font(18)
+    small=get_font(16)
+    panel=pygame.Surface((420,210))
+    panel.fill((18,20,28))
+    pygame.draw.rect(panel,(140,180,240),panel.get_rect(),2)
+    title = f"UPGRADE TURRET [{ttype.upper()}] — scrap:{scrap}"
+    panel.blit(font.render(title, True, WHITE),(12,10))
+    labels = ("1) +Damage (boosts DoT/slow duration on special)", "2) +Range", "3) +Fire Rate (lower cooldown)")
+    for lbl, lvl, cost, y in zip(labels, levels, costs, (52, 84, 116)):
+        maxed = lvl >= MAX_UPGRADE
+        text = f"{lbl}  Lvl {lvl}/{MAX_UPGRADE}  —  Cost: {cost} scrap"
+        col = (200,200,200) if not maxed else (160,160,160)
+        panel.blit(font.render(text, True, col),(24,y))
+        if maxed:
+            panel.blit(small.render("MAXED", True, (240,210,90)), (panel.get_width()-90, y))
+    panel.blit(small.render(f"So far: {record}", True, (150,220,170)), (12, 140))
+    panel.blit(small.render("Press [1-3] to buy • [Esc/E] to close • Stand close to a turret & press E near it to open", True, (200,210,230)), (12, 160))
+    return panel
+
+def render_wave_summary(wave, rows):
+    head = get_font(18, bold=True).render(f"Wave {wave} — who did the work", True, WHITE)
+    lines = [get_font(16).render(f"{label}: {text}", True, (200,210,230)) for label, text in rows]
+    panel = pygame.Surface((max(s.get_width() for s in [head] + lines) + 24, 18 + head.get_height() + 20*len(lines)))
+    panel.fill((18,20,28))
+    pygame.draw.rect(panel, (140,180,240), panel.get_rect(), 2)
+    panel.blit(head, (12, 8))
+    for i, s in enumerate(lines):
+        panel.blit(s, (12, 12 + head.get_height() + 20*i))
+    return panel
+
+def render_base_ring(steps, radius, thickness):
+    c = radius + thickness
+    surf = pygame.Surface((2*c+1, 2*c+1), pygame.SRCALPHA)
+    pygame.draw.circle(surf, (30, 45, 60), (c, c), radius, thickness)
+    if steps > 0:
+        segs = 60
+        end_ang = -math.tau*steps/BASE_RING_STEPS
+        for i in range(segs):
+            a0 = -math.pi/2 + (i/segs)*end_ang
+            a1 = -math.pi/2 + ((i+1)/segs)*end_ang
+            x0, y0 = c + math.cos(a0)*radius, c + math.sin(a0)*radius
+            x1, y1 = c + math.cos(a1)*radius, c + math.sin(a1)*radius
+            pygame.draw.line(surf, (80,210,120), (x0,y0), (x1,y1), thickness)
+    return surf
+
+def render_boss_bar(bar_w, bar_h, filled):
+    bar = pygame.Surface((bar_w+4, bar_h+4))
+    bar.fill((30, 20, 40))
+    bar.fill((80, 30, 110), pygame.Rect(2, 2, bar_w, bar_h))
+    if filled > 0:
+        bar.fill((210, 110, 240), pygame.Rect(2, 2, filled, bar_h))
+    return bar
+
+# ----------------------------
+# Display presentation (dirty rectangles) + perf overlay
+# ----------------------------
+DIRTY_FULL_THRESHOLD = 0.5   # fall back to flip() once dirty rects cover this share of the window
+PERF = {}                    # name -> text line shown under the FPS counter
+
+# Changed screen regions per frame. Moving things are pushed again next frame to clear what they
+# vacate; retained widgets only count when their content or rect changes.
+class DirtyTracker:
+    def __init__(self):
+        self.enabled = False
+        self.rects = []
+        self.prev = []
+        self.marked = []                # retained/marked changes; these already carry their old rect
+        self.retained_prev = {}
+        self.retained_cur = {}
+        self.full = True
+        self.camera = None
+        self.pixels = 0
+        self.pushed_rects = 0
+
+    def begin(self, enabled, camera=None):
+        if not enabled or camera is None or camera != self.camera or not self.enabled:
+            self.full = True
+        self.enabled = enabled
+        self.camera = camera
+
+    def invalidate(self):
+        self.full = True
+
+    def add(self, rect):
+        if rect is not None:
+            self.rects.append(rect)
+
+    def extend(self, rects):
+        if rects:
+            self.rects.extend(rects)
+
+    def retained(self, screen, slot, surf, pos, area=None):
+        rect = screen.blit(surf, pos)
+        self.mark(slot, rect if area is None else area.move(pos).clip(rect), surf)
+        return rect
+
+    def mark(self, slot, rect, content=None):
+        if self.enabled:
+            old = self.retained_prev.get(slot)
+            if old is None or old[0] != content or old[1] != rect:
+                self.marked.append(rect)
+                if old is not None:
+                    self.marked.append(old[1])
+            self.retained_cur[slot] = (content, rect)
+
+    def present(self, screen):
+        w, h = screen.get_size()
+        area = w * h
+        if self.enabled and not self.full:
+            for slot, (_surf, rect) in self.retained_prev.items():
+                if slot not in self.retained_cur:
+                    self.marked.append(rect)   # widget disappeared
+            bounds = screen.get_rect()
+            rects = [r.clip(bounds) for r in self.prev + self.rects + self.marked]
+            pixels = sum(r.width * r.height for r in rects)
+            if pixels <= area * DIRTY_FULL_THRESHOLD:
+                pygame.display.update(rects)
+                self.pixels, self.pushed_rects = pixels, len(rects)
+            else:
+                self.full = True
+        if not self.enabled or self.full:
+            pygame.display.flip()
+            self.pixels, self.pushed_rects = area, 0
+        if self.enabled:
+            mode = "flip" if self.full else f"{self.pushed_rects} rects"
+            PERF["present"] = f"push {self.pixels/1000:.0f}k px ({100*self.pixels/area:.0f}%, {mode})"
+        else:
+            PERF.pop("present", None)
+        self.prev, self.rects, self.marked = self.rects, [], []
+        self.retained_prev, self.retained_cur = self.retained_cur, {}
+        self.full = False
+
+DIRTY = DirtyTracker()
+
+# ----------------------------
+# Render scale (world view buffer)
+# ----------------------------
+# World and lighting are drawn at VIEW_K view px per world px into VIEW_W x VIEW_H and upscaled
+# once; floaters and the HUD stay at native resolution.
+RENDER_SCALES = (1.0, 0.75, 0.5, 0.35)
+VIEW_W, VIEW_H = WIDTH, HEIGHT
+VIEW_K = 1.0
+_view_buffer = None
+_view_sprites = {}
+
+def update_view():
+    global VIEW_W, VIEW_H, VIEW_K
+    VIEW_K = clamp(SETTINGS.get("render_scale", 1.0), 0.1, 1.0)
+    VIEW_W, VIEW_H = max(1, round(WIDTH*VIEW_K)), max(1, round(HEIGHT*VIEW_K))
+    _view_sprites.clear()
+    if not view_scaled():
+        PERF.pop("render", None)
+
+def view_scaled(): return (VIEW_W, VIEW_H) != (WIDTH, HEIGHT)
+
+def view_sprite(img):
+    if VIEW_K == 1.0:
+        return img
+    out = _view_sprites.get(img)
+    if out is None:
+        w, h = img.get_size()
+        out = _view_sprites[img] = pygame.transform.smoothscale(img, (max(1, round(w*VIEW_K)), max(1, round(h*VIEW_K))))
+    return out
+
+def view_cells(surf):
+    if VIEW_K != 1.0:
+        w, h = surf.get_size()
+        surf = pygame.transform.smoothscale(surf, (max(1, round(w*VIEW_K)), max(1, round(h*VIEW_K))))
+    return surf, surf.get_bounding_rect()
+
+def view_buffer(screen):
+    global _view_buffer
+    if screen.get_size() == (VIEW_W, VIEW_H):
+        return screen
+    if _view_buffer is None or _view_buffer.get_size() != (VIEW_W, VIEW_H):
+        _view_buffer = pygame.Surface((VIEW_W, VIEW_H)).convert() if pygame.display.get_surface() \
+            else pygame.Surface((VIEW_W, VIEW_H))
+    return _view_buffer
+
+def present_view(view, screen):
+    t0 = time.perf_counter()
+    pygame.transform.scale(view, screen.get_size(), screen)
+    ms = (time.perf_counter() - t0) * 1000
+    w, h = view.get_size()
+    PERF["render"] = f"render {w}x{h} ({100*w*h/(screen.get_width()*screen.get_height()):.0f}% px), upscale {ms:.2f} ms"
+
+# ----------------------------
+# Fast-forward (time scale as substeps per frame)
+# ----------------------------
+TIME_SCALES = (1, 2, 4, 8)
+SIM_FRAME_BUDGET = 0.6 / FPS    # wall time per frame the substeps may use before the speed is capped
+
+# `requested` substeps of the normal dt per frame, capped to SIM_FRAME_BUDGET; only the last is cosmetic
+class TimeScale:
     def __init__(self):
-        self.grid = generate_maze(GRID_W, GRID_H)
-        self.base_cell=(GRID_W//2, GRID_H//2)
-        for x in range(self.base_cell[0]-2, self.base_cell[0]+3):
-            for y in range(self.base_cell[1]-2, self.base_cell[1]+3):
-                if 0<=x<GRID_W and 0<=y<GRID_H: self.grid[x][y]=0
+        self.requested = 1
+        self.effective = 1
+        self.step_cost = 0.0                # EMA of wall seconds per substep
+        self.window = [0.0, 0.0, 0]         # sim seconds, wall seconds, substeps since the last report
+        self.last = None
+
+    def cycle(self):
+        self.requested = TIME_SCALES[(TIME_SCALES.index(self.requested) + 1) % len(TIME_SCALES)]
+        return self.requested
+
+    def run(self, world, dt, inp=None):
+        steps = self.requested
+        if steps > 1 and self.step_cost > 0:
+            steps = max(1, min(steps, int(SIM_FRAME_BUDGET / self.step_cost)))
+        t0 = time.perf_counter()
+        ran = 0
+        for i in range(steps):
+            world.cosmetic = i == steps - 1
+            world.update(dt, inp)
+            ran += 1
+            if world.base_hp <= 0 or world.player.in_shop or world.upgrade_target is not None:
+                break
+        world.cosmetic = True
+        t1 = time.perf_counter()
+        cost = (t1 - t0) / ran
+        self.step_cost = cost if not self.step_cost else self.step_cost*0.9 + cost*0.1
+        self.effective = steps
+        self._account(ran * dt, t1)
+        return ran
+
+    def _account(self, sim_dt, now):
+        w = self.window
+        if self.last is not None:
+            w[1] += now - self.last
+        self.last = now
+        w[0] += sim_dt; w[2] += 1
+        if w[1] >= 0.5:
+            if self.requested > 1:
+                PERF["speed"] = self.describe(w[0] / w[1])
+            else:
+                PERF.pop("speed", None)
+            self.window = [0.0, 0.0, 0]
+
+    def describe(self, throughput):
+        capped = f" (capped {self.effective}x)" if self.effective < self.requested else ""
+        return f"speed {self.requested}x{capped}, sim {throughput:.1f}x realtime"
 
-        ensure_full_connectivity(self.grid, self.base_cell)
+    def idle(self):
+        self.last = None
+        self.window = [0.0, 0.0, 0]
+
+# ----------------------------
+# Memory instrumentation (tracemalloc + per-subsystem sizes)
+# ----------------------------
+# --memory; otherwise MEMORY stays None and tracemalloc is never started.
+MEMORY_DIR = "memory"
+MEMORY_SAMPLE_INTERVAL = 1.0    # wall seconds between overlay refreshes
+MEMORY_DUMP_INTERVAL = 30.0     # wall seconds between periodic dump records
+MEMORY_TOP_SITES = 10           # allocation sites listed per wave diff
+MEMORY_TYPES = ("Bullet", "Enemy", "Boss", "Pickup", "DamageText", "Turret", "World", "Registry")
+MEMORY_SUBSYSTEMS = ("bullets", "trails", "enemies", "status", "pickups", "floaters", "surfaces", "los")
+MEMORY = None                   # MemoryProfiler while enabled
+
+_TRAIL_POINT_BYTES = sys.getsizeof((0.0, 0.0, 0.0)) + 3*sys.getsizeof(0.0)
+
+def _obj_bytes(o): return sys.getsizeof(o) + sys.getsizeof(o.__dict__)
+
+def _status_bytes(effects):
+    return sys.getsizeof(effects) + sum(sys.getsizeof(s) + 2*sys.getsizeof(0.0) for s in effects)
+
+def _surface_bytes(s): return s.get_pitch() * s.get_height()
+
+def cached_surfaces(world):
+    out = [v[0] if isinstance(v, tuple) else v for v in _sprite_cache.values()]
+    if world is not None:
+        out.extend(w.surf for w in (world.hud_status, world.hud_message, world.hud_shop,
+                                    world.hud_upgrade, world.hud_ring, world.hud_boss) if w.surf is not None)
+        out.extend(world.hud_labels.values())
+        out.extend(c[1] for c in (world.coverage_surf, world.preview_surf) if c is not None)
+    return out
+
+def memory_breakdown(world):
+    out = {name: [0, 0] for name in MEMORY_SUBSYSTEMS}
+    surfaces = cached_surfaces(world)
+    out["surfaces"] = [len(surfaces), sum(map(_surface_bytes, surfaces))]
+    if world is None:
+        return out
+    for name, items in (("bullets", world.bullets), ("enemies", world.enemies),
+                        ("pickups", world.pickups), ("floaters", world.floaters)):
+        out[name] = [len(items), sum(map(_obj_bytes, items)) + sys.getsizeof(items.items)]
+    trails = out["trails"]; status = out["status"]
+    for b in world.bullets:
+        trails[0] += len(b.trail)
+        trails[1] += sys.getsizeof(b.trail) + len(b.trail)*_TRAIL_POINT_BYTES
+    for e in world.enemies:
+        status[0] += len(e.dots) + len(e.slows)
+        status[1] += _status_bytes(e.dots) + _status_bytes(e.slows)
+    out["los"] = [len(world.los_cache), sum(map(sys.getsizeof, world.los_cache.values())) + len(world.coverage)]
+    return out
+
+def live_counts():
+    counts = dict.fromkeys(MEMORY_TYPES, 0)
+    for o in gc.get_objects():
+        name = type(o).__name__
+        if name in counts:
+            counts[name] += 1
+    return counts
+
+def _kb(n): return f"{n/1024:.0f}k" if n < 1 << 20 else f"{n/(1 << 20):.1f}M"
+
+# perf overlay and JSONL dump; a tracemalloc diff at each wave start
+class MemoryProfiler:
+    def __init__(self, tag="main"):
+        os.makedirs(MEMORY_DIR, exist_ok=True)
+        self.path = os.path.join(MEMORY_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{tag}-{os.getpid()}.jsonl")
+        self.t0 = time.perf_counter()
+        self.next_sample = self.next_dump = 0.0
+        self.snapshot = None            # (wave, tracemalloc snapshot, live counts) at the last wave start
+        self.wave_delta = None
+
+    def _write(self, record):
+        record["t"] = round(time.perf_counter() - self.t0, 2)
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print("Memory dump failed:", e)
+
+    def sample(self, world):
+        now = time.perf_counter() - self.t0
+        if now < self.next_sample: return
+        self.next_sample = now + MEMORY_SAMPLE_INTERVAL
+        traced, peak = tracemalloc.get_traced_memory()
+        parts = memory_breakdown(world)
+        delta = "" if self.wave_delta is None else f", last wave {'+' if self.wave_delta >= 0 else '-'}{_kb(abs(self.wave_delta))}"
+        PERF["mem"] = f"mem {_kb(traced)} traced (peak {_kb(peak)}){delta}"
+        PERF["mem_world"] = " ".join(f"{name} {_kb(parts[name][1])}" for name in MEMORY_SUBSYSTEMS[:6])
+        PERF["mem_cache"] = f"surfaces {_kb(parts['surfaces'][1])} ({parts['surfaces'][0]}), los {_kb(parts['los'][1])}"
+        if now >= self.next_dump:
+            self.next_dump = now + MEMORY_DUMP_INTERVAL
+            self._write({"ev": "sample", "wave": world.wave - 1 if world else None,
+                         "traced": traced, "peak": peak, "subsystems": parts})
+
+    def wave_start(self, world):
+        snap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        counts = live_counts()
+        if self.snapshot is not None:
+            prev_wave, prev, prev_counts = self.snapshot
+            stats = snap.compare_to(prev, "lineno")
+            self.wave_delta = sum(s.size_diff for s in stats)
+            top = [[f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+                    s.size_diff, s.count_diff] for s in stats[:MEMORY_TOP_SITES]]
+            self._write({"ev": "wave_diff", "from": prev_wave, "to": world.wave, "size_diff": self.wave_delta,
+                         "live": {k: counts[k] - prev_counts[k] for k in counts}, "top": top,
+                         "subsystems": memory_breakdown(world)})
+        self.snapshot = (world.wave, snap, counts)
+
+    def close(self, world=None):
+        traced, peak = tracemalloc.get_traced_memory()
+        self._write({"ev": "end", "traced": traced, "peak": peak, "live": live_counts(),
+                     "subsystems": memory_breakdown(world)})
+        tracemalloc.stop()
+        for k in ("mem", "mem_world", "mem_cache"):
+            PERF.pop(k, None)
+
+def enable_memory_profile(tag="main"):
+    global MEMORY
+    tracemalloc.start()
+    MEMORY = MemoryProfiler(tag)
+    return MEMORY
+
+# ----------------------------
+# Frame trace recorder (binary ring file) + analysis
+# ----------------------------
+# --trace: each frame's time is charged to one span at a time and events set marker bits; the
+# ring file keeps the last TRACE_RING_FRAMES frames.
+TRACE_DIR = "traces"
+TRACE_RING_FRAMES = 60 * 60 * 10    # ten minutes at 60 FPS
+TRACE_SPANS = ("idle", "events", "world_build", "sim", "player", "director", "jobs", "enemies", "bullets",
+               "pickups", "turrets", "floaters", "draw", "present", "gc", "other")
+TRACE_MARKERS = ("wave_start", "boss_spawn", "wave_clear", "world_build", "restart", "run_end", "gc_full")
+TRACE_LIVE = 1                      # frame flag: gameplay was being simulated
+TRACE_MAGIC = b"MOTT"
+TRACE_VERSION = 1
+TRACE_HEAD = struct.Struct("<4sHIIH")   # magic, version, capacity, frames written, meta length
+TRACE_HEADER_EVERY = 60             # frames between header rewrites (a crash loses at most this many)
+TRACE = None                        # FrameTrace while enabled
+
+def trace_record(n_spans): return struct.Struct(f"<IdBH{n_spans}f")  # frame, t, flags, markers, span ms
+
+class FrameTrace:
+    def __init__(self, path=None, capacity=TRACE_RING_FRAMES):
+        if path is None:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            path = os.path.join(TRACE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.trace")
+        self.path = path
+        self.capacity = capacity
+        self.rec = trace_record(len(TRACE_SPANS))
+        self.index = {name: i for i, name in enumerate(TRACE_SPANS)}
+        self.meta = json.dumps({"spans": TRACE_SPANS, "markers": TRACE_MARKERS}).encode()
+        self.data_start = TRACE_HEAD.size + len(self.meta)
+        self.f = open(path, "w+b")
+        self.f.write(TRACE_HEAD.pack(TRACE_MAGIC, TRACE_VERSION, capacity, 0, len(self.meta)) + self.meta)
+        self.written = 0
+        self.t0 = self.last = time.perf_counter()
+        self.frame_t = None
+        self.spans = [0.0] * len(TRACE_SPANS)
+        self.stack = [self.index["other"]]
+        self.markers = 0
+        self.flags = 0
+
+    def _charge(self):
+        now = time.perf_counter()
+        self.spans[self.stack[-1]] += now - self.last
+        self.last = now
+
+    def push(self, name):
+        self._charge(); self.stack.append(self.index[name])
+
+    def pop(self):
+        self._charge(); self.stack.pop()
+
+    def switch(self, name):
+        self._charge(); self.stack[-1] = self.index[name]
+
+    def mark(self, name):
+        self.markers |= 1 << TRACE_MARKERS.index(name)
+
+    def live(self): self.flags |= TRACE_LIVE
+
+    def frame(self):
+        self._charge()
+        if self.frame_t is not None:
+            self.f.seek(self.data_start + (self.written % self.capacity) * self.rec.size)
+            self.f.write(self.rec.pack(self.written, self.frame_t - self.t0, self.flags, self.markers,
+                                       *(s * 1000 for s in self.spans)))
+            self.written += 1
+            if self.written % TRACE_HEADER_EVERY == 0:
+                self._write_header()
+        self.frame_t = self.last
+        self.spans = [0.0] * len(TRACE_SPANS)
+        self.stack = [self.index["other"]]
+        self.markers = 0; self.flags = 0
+
+    def _write_header(self):
+        self.f.seek(0)
+        self.f.write(TRACE_HEAD.pack(TRACE_MAGIC, TRACE_VERSION, self.capacity, self.written, len(self.meta)))
+
+    def close(self):
+        self.frame()
+        self._write_header()
+        self.f.close()
+        print("Trace written to", self.path)
+
+def enable_trace(path=None):
+    global TRACE
+    TRACE = FrameTrace(path)
+    return TRACE
+
+TraceFrame = namedtuple("TraceFrame", "n t live markers spans total")
+
+def read_trace(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, capacity, written, meta_len = TRACE_HEAD.unpack_from(data, 0)
+    if magic != TRACE_MAGIC or version != TRACE_VERSION:
+        raise ValueError(f"{path}: not a v{TRACE_VERSION} frame trace")
+    meta = json.loads(data[TRACE_HEAD.size:TRACE_HEAD.size + meta_len])
+    rec = trace_record(len(meta["spans"]))
+    start = TRACE_HEAD.size + meta_len
+    stored = min(capacity, (len(data) - start) // rec.size)
+    frames = []
+    for i in range(stored):
+        n, t, flags, markers, *spans = rec.unpack_from(data, start + i*rec.size)
+        frames.append(TraceFrame(n, t, bool(flags & TRACE_LIVE), markers, spans, sum(spans)))
+    frames.sort(key=lambda fr: fr.n)    # the ring wraps; frame numbers restore the order
+    return meta["spans"], meta["markers"], frames
+
+def percentile(sorted_values, p):
+    if not sorted_values: return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+def print_trace_report(path, spike_pct=99, window=2):
+    spans, markers, frames = read_trace(path)
+    live = [fr for fr in frames if fr.live]
+    print(f"{path}: {len(frames)} frames, {len(live)} live ({frames[-1].t - frames[0].t:.1f}s)" if frames
+          else f"{path}: no frames")
+    if not live: return
+    idle = spans.index("idle")
+    for label, key in (("frame", lambda fr: fr.total), ("work", lambda fr: fr.total - fr.spans[idle])):
+        v = sorted(map(key, live))
+        print(f"  {label:5s} ms  p50 {percentile(v, 50):6.2f}  p95 {percentile(v, 95):6.2f}  "
+              f"p99 {percentile(v, 99):6.2f}  max {v[-1]:6.2f}")
+    threshold = max(percentile(sorted(fr.total for fr in live), spike_pct), 1.25 * 1000 / FPS)
+    spikes = [fr for fr in live if fr.total > threshold]
+    print(f"  spikes (> {threshold:.2f} ms): {len(spikes)}")
+    if spikes:
+        typical = [percentile(sorted(fr.spans[i] for fr in live), 50) for i in range(len(spans))]
+        excess = [sum(max(0.0, fr.spans[i] - typical[i]) for fr in spikes) if i != idle else 0.0
+                  for i in range(len(spans))]
+        total = sum(excess) or 1.0
+        print("  spike attribution (time over each span's median):")
+        for i in sorted(range(len(spans)), key=lambda i: -excess[i])[:6]:
+            if excess[i] > 0:
+                print(f"    {spans[i]:12s} {100*excess[i]/total:5.1f}%  avg +{excess[i]/len(spikes):.2f} ms")
+    pos = {fr.n: k for k, fr in enumerate(frames)}
+    spike_ns = {fr.n for fr in spikes}
+    for b, name in enumerate(markers):
+        hits = [fr for fr in frames if fr.markers >> b & 1]
+        if not hits: continue
+        near = set()
+        for fr in hits:
+            k = pos[fr.n]
+            near.update(f.n for f in frames[k:k + window + 1])
+        worst = max(fr.total for fr in frames if fr.n in near)
+        print(f"  {name:12s} x{len(hits):<4d} spikes within {window} frames: {len(near & spike_ns):3d}  "
+              f"worst {worst:.2f} ms")
+
+# Chrome/Perfetto JSON: a frame's spans laid end to end (order nominal), markers as instant events
+def export_chrome_trace(path, out):
+    spans, markers, frames = read_trace(path)
+    events = []
+    for fr in frames:
+        ts = fr.t * 1e6
+        events.append({"name": "frame", "ph": "X", "ts": ts, "dur": fr.total * 1000, "pid": 1, "tid": 1,
+                       "args": {"n": fr.n, "live": fr.live}})
+        for name, ms in zip(spans, fr.spans):
+            if ms > 0:
+                events.append({"name": name, "ph": "X", "ts": ts, "dur": ms * 1000, "pid": 1, "tid": 1})
+                ts += ms * 1000
+        for b, name in enumerate(markers):
+            if fr.markers >> b & 1:
+                events.append({"name": name, "ph": "i", "s": "g", "ts": fr.t * 1e6, "pid": 1, "tid": 1})
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    print(f"Wrote {len(events)} events to {out}")
+
+# ----------------------------
+# GC policy (freeze after world build, no full collections mid-wave)
+# ----------------------------
+# Full GC passes are kept off wave frames: one (then gc.freeze) on the frame after a World is built,
+# young generations only during a wave, the owed full pass in the lull after. Pauses are timed.
+GC_WAVE_THRESHOLDS = (2000, 20, 1 << 30)    # gen0 allocations, gen0 runs per gen1, gen1 runs per gen2
+GC_REPORT_INTERVAL = 1.0                    # seconds between perf-overlay updates
+GC_POLICY = None                            # GcPolicy while enabled (settings "gc_policy")
+
+class GcPolicy:
+    def __init__(self):
+        self.defaults = gc.get_threshold()
+        self.in_wave = False
+        self.pending = False        # full collection owed from the last wave
+        self.reason = None          # why the running explicit collection was started
+        self.freeze = MEMORY is None    # frozen objects drop out of gc.get_objects(), i.e. live_counts()
+        self.t0 = 0.0
+        self.window = [0, 0.0, 0.0]     # pauses, total ms, worst ms since the last report
+        self.last_full = None           # (ms, where) of the latest generation-2 collection
+        self.report_at = time.perf_counter() + GC_REPORT_INTERVAL
+        gc.callbacks.append(self._callback)
+
+    def _callback(self, phase, info):
+        # Runs on whichever thread triggered the collection; the trace span stack belongs to the main one.
+        traced = TRACE and threading.current_thread() is threading.main_thread()
+        if phase == "start":
+            if traced: TRACE.push("gc")
+            self.t0 = time.perf_counter()
+            return
+        now = time.perf_counter()
+        ms = (now - self.t0) * 1000
+        if traced:
+            TRACE.pop()
+            if info["generation"] == 2: TRACE.mark("gc_full")
+        w = self.window
+        w[0] += 1; w[1] += ms; w[2] = max(w[2], ms)
+        if info["generation"] == 2:
+            self.last_full = (ms, self.reason or ("wave" if self.in_wave else "play"))
+        if now >= self.report_at:
+            self.report_at = now + GC_REPORT_INTERVAL
+            self.report()
+
+    def report(self):
+        n, total, worst = self.window
+        text = f"gc {n} pauses {total:.1f} ms (max {worst:.2f})"
+        if self.last_full:
+            text += f", last full {self.last_full[0]:.1f} ms in {self.last_full[1]}"
+        PERF["gc"] = text
+        self.window = [0, 0.0, 0.0]
+
+    # call once the new World is in place and nothing refers to the old one
+    def world_built(self):
+        gc.unfreeze()
+        gc.set_threshold(*self.defaults)
+        self.in_wave = self.pending = False
+        self._collect("build")
+        if self.freeze:
+            gc.freeze()
+
+    def tick(self, world):
+        in_wave = world.active_wave and world.base_hp > 0
+        if in_wave != self.in_wave:
+            self.in_wave = in_wave
+            if in_wave:
+                gc.set_threshold(*GC_WAVE_THRESHOLDS)
+            else:
+                self.pending = True     # not on the clearing tick itself, which already did the most work
+        elif self.pending:
+            self.pending = False
+            self._collect("lull")
+            gc.set_threshold(*self.defaults)
+
+    def _collect(self, reason):
+        self.reason = reason
+        gc.collect()
+        self.reason = None
+
+def enable_gc_policy():
+    global GC_POLICY
+    if GC_POLICY is None:
+        GC_POLICY = GcPolicy()
+    return GC_POLICY
+
+# ----------------------------
+# World
+# ----------------------------
+class World:
+    def __init__(self, map_data=None, seed=None, telemetry=None):
+        if TRACE: TRACE.push("world_build"); TRACE.mark("world_build")
+        if map_data is None:
+            map_data = build_map() if seed is None else load_or_build_map(seed)
+        self.stream = None
+        self.map_version = 0
+        if isinstance(map_data, MapStream):     # still generating: adopt_map() takes each newer version
+            self.stream = map_data
+            _, grid, base_cell, base_dist = map_data.latest[:4]
+            map_data = (list(grid), base_cell, base_dist)
+        self.grid, self.base_cell, self.base_dist = map_data
 
         self.player = Player(self, (self.base_cell[0]*TILE+TILE/2, self.base_cell[1]*TILE+TILE/2))
-        self.enemies=[]
-        self.pickups=[]
-        self.bullets=[]
-        self.turrets=[]
-        self.floaters=[]
+        self.enemies=Registry()
+        self.pickups=Registry()
+        self.bullets=Registry()
+        self.turrets=Registry()
+        self.floaters=Registry()
         self.active_wave = False
         self.waiting_next_wave = True
         self.say("Press [N] to start Wave 1", 3.0)
@@ -554,17 +2598,64 @@ class World:
         self.message=""
         self.message_timer=0
         self.upgrade_target = None
-
-        self.dm_font = pygame.font.SysFont("consolas", 16, bold=True)
+        self.cosmetic = True    # False on hidden fast-forward substeps: trails, floaters, pulses are skipped
+        self.director = WaveDirector(self.grid)
+        self.jobs = JobScheduler()
+        self.combat = CombatStats()
+        self.chase = ChaseField(self.grid)
+        self.chasing = False            # a chaser was alive last tick: keep the chase field on the player
+        self.lod = LodScheduler(SETTINGS.get("lod", True))
+        self.broadphase = Broadphase()
+        self.los_cache = {}             # (cell, range) -> bitset, shared by turrets and the placement preview
+        self.coverage = bytearray(len(self.grid)*len(self.grid[0]))    # turrets seeing each cell
+        self.coverage_version = 0
+        self.coverage_surf = None       # ((version, tile window, scale), surface, painted rect)
+        self.preview_surf = None        # ((cell, range, tile window, scale), surface, painted rect)
+        self.advice = None              # PlacementAdvice from [H] in placement mode
+        self.telemetry = Telemetry(SETTINGS.get("telemetry", True) if telemetry is None else telemetry)
+
+        self.hud_status = HudWidget(render_status_line)
+        self.hud_message = HudWidget(render_text)
+        self.hud_shop = HudWidget(render_shop_panel)
+        self.hud_upgrade = HudWidget(render_upgrade_panel)
+        self.hud_summary = HudWidget(render_wave_summary)
+        self.wave_summary = None        # (wave, rows) shown until the next wave starts
+        self.hud_ring = HudWidget(render_base_ring)
+        self.hud_boss = HudWidget(render_boss_bar)
+        self.hud_labels = {}
+        self.dark_pos = None
+        if self.stream: self.adopt_map()
+        if TRACE: TRACE.pop()
+
+    def adopt_map(self):
+        version, grid, _, base_dist, span, done = self.stream.latest
+        if version == self.map_version: return
+        self.grid[:] = grid
+        self.base_dist = base_dist
+        self.map_version = version
+        if done: self.stream = None
+        self.director.cells = spawn_cells(self.grid, span, base_dist)
+        self.chase.source = None        # rebuilt on the next follow()
+        self.los_cache.clear()
+        self.rebuild_coverage()
+        self.coverage_surf = self.preview_surf = None
+
+    @property
+    def upgrade_target(self):
+        return self.turrets.get(self.upgrade_handle)
+
+    @upgrade_target.setter
+    def upgrade_target(self, turret):
+        self.upgrade_handle = self.turrets.handle(turret) if turret else None
 
     def say(self,txt,dur=2.0):
         self.message=txt; self.message_timer=dur
 
     def add_damage_text(self, x, y, amount, color=YELLOW, is_crit=False):
-        if SETTINGS.get("damage_numbers", True):
+        if SETTINGS.get("damage_numbers", True) and self.cosmetic:
             self.floaters.append(DamageText(x, y, amount, color=color, crit=is_crit))
             if len(self.floaters) > 120:
-                self.floaters = self.floaters[-120:]
+                self.floaters.trim(120)
 
     def is_solid(self,gx,gy):
         if 0<=gx<GRID_W and 0<=gy<GRID_H:
@@ -577,6 +2668,30 @@ class World:
                 return e
         return None
 
+    def los(self, cell, radius):
+        key = (cell, radius)
+        bits = self.los_cache.get(key)
+        if bits is None:
+            bits = los_bitset(self.grid, cell, radius)
+            if len(self.los_cache) * len(bits) > LOS_CACHE_MAX_BYTES: self.los_cache.clear()
+            self.los_cache[key] = bits
+        return bits
+
+    def cover(self, turret):
+        rng = turret.stats()["range"]
+        if turret.los is not None:
+            if turret.los_range == rng: return
+            for i in bit_indices(turret.los): self.coverage[i] -= 1
+        turret.los, turret.los_range, turret.los_h = self.los(turret.cell, rng), rng, len(self.grid[0])
+        for i in bit_indices(turret.los): self.coverage[i] += 1
+        self.coverage_version += 1
+
+    def rebuild_coverage(self):
+        self.coverage = bytearray(len(self.coverage))
+        for t in self.turrets:
+            t.los = None
+            self.cover(t)
+
     def can_place_turret(self, cell):
         gx,gy = cell
         if not (0<=gx<GRID_W and 0<=gy<GRID_H): return False
@@ -585,6 +2700,14 @@ class World:
             if t.cell == cell: return False
         return True
 
+    def combat_summary(self):
+        sources = [("Player", self.combat.get(PLAYER_STAT, wave=True))]
+        sources += [(f"{t.type.capitalize()} turret {t.cell}", self.combat.get(t.stat, wave=True))
+                    for t in self.turrets if t.stat is not None]
+        active = [s for s in sources if s[1]["shots"] or s[1]["dot"] or s[1]["slow"]]
+        active.sort(key=lambda s: -(s[1]["damage"] + s[1]["dot"]))
+        return tuple((label, describe_combat(st)) for label, st in active[:COMBAT_SUMMARY_ROWS])
+
     def nearest_turret_to_world(self, wx, wy, radius=28):
         if not self.turrets: return None
         best=None; bestd=1e9
@@ -604,101 +2727,310 @@ class World:
             self.say(f"Need {cost} scrap"); return
         self.player.scrap -= cost
         t.apply_upgrade(key)
+        self.cover(t)
+        self.telemetry.purchase(f"upgrade_{t.type}_{key}", scrap=cost)
         self.say(f"Upgraded {key.upper()} to L{t.upgrade_level(key)}")
 
-    def update(self,dt):
-        self.message_timer=max(0,self.message_timer-dt)
-        self.player.update(dt)
+    def end_run(self, reason):
+        self.telemetry.end(reason)
+        if TRACE: TRACE.mark("restart" if reason == "restart" else "run_end")
+
+    # ---- input while playing (R and pausing stay with the main loop) ----
+    def blocks_pause(self, key):
+        if self.player.in_shop or self.upgrade_target:
+            return True
+        return key == pygame.K_ESCAPE and self.player.placing_turret
+
+    def handle_key(self, key, mouse_pos):
+        p = self.player
+        if key in (pygame.K_ESCAPE, pygame.K_p):
+            if p.in_shop:
+                p.in_shop = False
+            elif self.upgrade_target:
+                self.upgrade_target = None
+                self.say("Closed upgrade panel")
+            elif key == pygame.K_ESCAPE and p.placing_turret:
+                p.placing_turret = False
+                self.say("Turret placement cancelled")
+
+        elif key == pygame.K_n and (not p.in_shop) and (self.upgrade_target is None) and self.base_hp > 0:
+            if self.waiting_next_wave:
+                self.start_next_wave()
+            else:
+                self.say("Current wave still in progress")
+
+        elif key == pygame.K_c:
+            p.scrap+=15
+            p.cores+=10
+            for k in p.turret_kits:
+                p.turret_kits[k]+=2
+
+        elif key == pygame.K_x:
+            self.wave+=1
+
+        # --- UNIVERSAL USE: E ---
+        elif key == pygame.K_e:
+            # --- FIX: close upgrade panel with E ---
+            if self.upgrade_target:
+                self.upgrade_target = None
+                self.say("Closed upgrade panel")
+            # if shop open: close it
+            elif p.in_shop:
+                p.in_shop = False
+                self.say("Shop closed")
+            else:
+                on_base = dist(
+                    (p.x, p.y),
+                    (self.base_cell[0]*TILE+TILE/2, self.base_cell[1]*TILE+TILE/2)
+                ) < self.deposit_radius
+                if on_base:
+                    if p.backpack:
+                        self.deposit()
+                    else:
+                        self.open_shop()
+                else:
+                    mx,my = mouse_pos
+                    wx = mx + self.camera[0]
+                    wy = my + self.camera[1]
+                    t = self.nearest_turret_to_world(wx, wy, radius=24)
+                    if t and dist((p.x,p.y),(t.x,t.y))<=80:
+                        self.upgrade_target = t
+                        self.say("Upgrade: 1)Damage  2)Range  3)Rate  • Esc/E to close")
+                    else:
+                        self.say("Nothing to use here")
+
+        elif key == pygame.K_b:
+            if p.in_shop:
+                p.in_shop = False
+            else:
+                self.open_shop()
+
+        elif key == pygame.K_t:
+            avail = [t for t,c in p.turret_kits.items() if c>0]
+            if avail:
+                p.placing_turret = True
+                if p.placing_type not in avail:
+                    p.placing_type = avail[0]
+                self.say("Turret placement mode")
+            else:
+                self.say("No turret kits")
+
+        elif key == pygame.K_TAB and p.placing_turret:
+            p.cycle_turret_type()
+
+        elif key == pygame.K_h and p.placing_turret:
+            import multiprocessing
+            if multiprocessing.current_process().daemon:
+                self.say("Placement advice needs the in-process simulation")
+            else:
+                self.advice = get_advisor().advise(self, p.placing_type)
+                self.say(f"Simulating {len(self.advice.futures) - 1} placements...", 5.0)
+
+        elif key == pygame.K_u and (not p.in_shop):
+            mx,my = mouse_pos
+            wx = mx + self.camera[0]
+            wy = my + self.camera[1]
+            t = self.nearest_turret_to_world(wx, wy, radius=24)
+            if t and dist((p.x,p.y),(t.x,t.y))<=80:
+                self.upgrade_target = t
+                self.say("Upgrade: 1)Damage  2)Range  3)Rate  • Esc/E to close")
+            elif t:
+                self.say("Move closer to the turret to upgrade")
+            else:
+                self.say("No turret under cursor")
 
-        for e in list(self.enemies):
-            e.update(dt,self)
+        elif p.in_shop and key in (
+            pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4,
+            pygame.K_5, pygame.K_6, pygame.K_7, pygame.K_8, 
+            pygame.K_9
+        ):
+            idx = {
+                pygame.K_1:"speed", pygame.K_2:"damage", pygame.K_3:"hp",
+                pygame.K_4:"capacity", pygame.K_5:"turret_basic", pygame.K_6:"basehp",
+                pygame.K_7:"turret_flame", pygame.K_8:"turret_ice", pygame.K_9:"shotspeed"
+            }[key]
+            self.buy(idx)
+
+        elif self.upgrade_target and key in (pygame.K_1, pygame.K_2, pygame.K_3):
+            kmap = {pygame.K_1:"dmg", pygame.K_2:"rng", pygame.K_3:"rate"}
+            self.upgrade_buy(kmap[key])
+
+
+    def handle_click(self, button, mouse_pos):
+        mx, my = mouse_pos
+        p = self.player
+        if p.placing_turret:
+            if button == 1:
+                wx = mx + self.camera[0]
+                wy = my + self.camera[1]
+                gx, gy = int(wx//TILE), int(wy//TILE)
+                if self.can_place_turret((gx,gy)) and p.placing_type:
+                    self.turrets.append(Turret((gx,gy), p.placing_type))
+                    self.cover(self.turrets[-1])
+                    self.advice = None
+                    ttype = p.placing_type
+                    p.turret_kits[ttype] -= 1
+                    if p.turret_kits[ttype] <= 0:
+                        avail = [t for t,c in p.turret_kits.items() if c>0]
+                        if avail:
+                            p.placing_type = avail[0]
+                        else:
+                            p.placing_turret = False
+                    self.say(f"{ttype.capitalize()} turret placed")
+                else:
+                    self.say("Can't place there")
+            elif button == 3:
+                p.placing_turret = False
+                self.say("Turret placement cancelled")
+        elif self.upgrade_target and button==1:
+            wx = mx + self.camera[0]; wy = my + self.camera[1]
+            if dist((wx,wy),(self.upgrade_target.x, self.upgrade_target.y))>80:
+                self.upgrade_target=None
+
+    def update(self,dt,inp=None):
+        if TRACE: TRACE.push("player")
+        if self.stream and self.stream.latest[0] != self.map_version: self.adopt_map()
+        self.message_timer=max(0,self.message_timer-dt)
+        self.telemetry.tick(dt)
+        self.player.update(dt,inp)
+        if TRACE: TRACE.switch("director")
+        self.director.update(dt, self)
+
+        if TRACE: TRACE.switch("jobs")
+        lod = self.lod
+        lod.begin(self)
+        self.jobs.run(self, dt)
+
+        if TRACE: TRACE.switch("enemies")
+        if self.chasing:
+            self.chase.follow(self.player.grid_cell())
+            if lod.tick % FPS == 0: self.chase.report()
+        self.chasing = False
+        enemies = self.enemies.compact()
+        for i in range(len(enemies)):
+            e = enemies[i]
+            self.chasing |= e.chases
+            if e.jobs is None: e.register_jobs(self)
+            if e.full_rate or lod.near(e.x, e.y):
+                e.catch_up(self)
+                e.update(dt,self)
+            else:
+                e.lod_dt += dt
+                if e.alive:                 # killed by a bullet since its last tick: remove it now
+                    if not lod.due(e): continue
+                    e.catch_up(self)
             if e.hp<=0:
                 self.enemies.remove(e)
+                self.telemetry.kill(e.tier, boss=isinstance(e, Boss))
                 if random.random()<0.85:
                     self.pickups.append(Pickup((e.x,e.y),"scrap", amount=1))
                 if random.random()<0.18:
                     self.pickups.append(Pickup((e.x,e.y),"core", amount=1))
-        for b in list(self.bullets):
+        self.enemies.compact()
+        if TRACE: TRACE.switch("bullets")
+        self.broadphase.rebuild(self.enemies, hit_radius)
+        combat = self.combat.data
+        bullets = self.bullets.compact()
+        for i in range(len(bullets)):
+            b = bullets[i]
+            x0, y0 = b.x, b.y
             b.update(dt,self)
             if b.alive:
-                for e in self.enemies:
-                    if dist((b.x,b.y),(e.x,e.y))<12+e.tier and e.alive:
-                        e.hp -= b.damage
-                        if SETTINGS.get("damage_numbers", True):
-                            self.add_damage_text(e.x, e.y-16, b.damage, is_crit=b.is_crit)
-                        if b.dot_dps>0: e.apply_dot(b.dot_dps, b.dot_dur)
-                        if b.slow_factor<1.0: e.apply_slow(b.slow_factor, b.slow_dur)
-                        e.hit_timer=0.1
-                        b.alive=False
-                        break
+                # swept: first wall crossed or enemy touched along this tick's path
+                dx, dy = b.x-x0, b.y-y0
+                t_wall = first_solid_on_segment(self.is_solid, x0, y0, b.x, b.y)
+                hit, t_hit = None, 1.0 if t_wall is None else t_wall
+                for e in self.broadphase.query_segment(x0, y0, b.x, b.y):
+                    t = segment_circle_t(x0, y0, dx, dy, e.x, e.y, hit_radius(e))
+                    if t is not None and t <= t_hit and e.alive:
+                        hit, t_hit = e, t
+                b.x, b.y = x0 + dx*t_hit, y0 + dy*t_hit
+                if hit:
+                    e = hit
+                    e.hp -= b.damage
+                    if e.hp <= 0: e.alive = False     # no more hits, even if its LOD tick is far off
+                    self.telemetry.damage(b.source, b.damage)
+                    combat[b.stat + HITS] += 1; combat[b.stat + DAMAGE] += b.damage
+                    if b.is_crit: combat[b.stat + CRITS] += 1
+                    if SETTINGS.get("damage_numbers", True):
+                        self.add_damage_text(e.x, e.y-16, b.damage, is_crit=b.is_crit)
+                    if b.dot_dps>0: e.apply_dot(b.dot_dps, b.dot_dur, b.stat)
+                    if b.slow_factor<1.0: e.apply_slow(b.slow_factor, b.slow_dur, b.stat)
+                    e.hit_timer=0.1
+                    b.alive=False
+                elif t_wall is not None:
+                    b.alive=False
             if not b.alive:
                 self.bullets.remove(b)
-        for p in list(self.pickups):
-            p.update(dt,self)
+        if TRACE: TRACE.switch("pickups")
+        pickups = self.pickups.compact()
+        for i in range(len(pickups)):
+            p = pickups[i]
+            if not lod.near(p.x, p.y):
+                p.lod_dt += dt
+                if lod.due(p):
+                    p.update(p.lod_dt, self); p.lod_dt = 0.0
+                continue
+            p.update(dt + p.lod_dt, self); p.lod_dt = 0.0
             if dist((self.player.x,self.player.y),(p.x,p.y))<14 and self.player.backpack_space():
                 self.player.backpack.append(p); self.pickups.remove(p)
 
-        for t in self.turrets: t.update(dt,self)
+        self.pickups.compact()
 
-        for f in list(self.floaters):
-            f.update(dt)
+        if TRACE: TRACE.switch("turrets")
+        for t in self.turrets:
+            if t.jobs is None:
+                t.register_jobs(self)
+                t.stat = self.combat.add_source()
+            t.update(dt,self)
+
+        self.bullets.compact()
+        if TRACE: TRACE.switch("floaters")
+        floaters = self.floaters.compact()
+        for i in range(len(floaters)):
+            f = floaters[i]
+            if lod.near(f.x, f.y):
+                f.update(dt + f.lod_dt)
+            else:
+                f.lod_dt += dt
+                if not lod.due(f): continue
+                f.update(f.lod_dt)
+            f.lod_dt = 0.0
             if f.life <= 0:
                 self.floaters.remove(f)
+        self.floaters.compact()
 
-        if self.active_wave and not self.enemies:
+        if self.active_wave and not self.enemies and not self.director.pending:
             self.active_wave = False
             self.waiting_next_wave = True
+            self.telemetry.wave_clear(self.base_hp)
+            if TRACE: TRACE.mark("wave_clear")
             self.say(f"Wave {self.wave-1} cleared! Press [N] when ready.", 3.0)
+        if self.base_hp <= 0:
+            self.end_run("base_destroyed")
 
         self.camera = (int(self.player.x - WIDTH//2), int(self.player.y - HEIGHT//2))
         self.camera = (clamp(self.camera[0], 0, GRID_W*TILE - WIDTH), clamp(self.camera[1], 0, GRID_H*TILE - HEIGHT))
+        if GC_POLICY: GC_POLICY.tick(self)
+        if TRACE: TRACE.pop()
 
     def start_next_wave(self):
         if self.waiting_next_wave and self.base_hp > 0:
             self.spawn_wave()
 
     def spawn_wave(self):
-        if self.wave % 10 == 0:
-            for _tries in range(400):
-                x = random.choice([1, GRID_W - 2])
-                y = random.randrange(1, GRID_H - 1)
-                if random.random() < 0.5:
-                    x = random.randrange(1, GRID_W - 1)
-                    y = random.choice([1, GRID_H - 2])
-                if self.grid[x][y] == 0:
-                    self.enemies.append(Boss((x, y), self.wave))
-                    break
-            count = max(2, min(2 + self.wave // 2, 10))
-            for _ in range(count):
-                for _tries in range(100):
-                    x = random.choice([1, GRID_W-2])
-                    y = random.randrange(1, GRID_H-1)
-                    if random.random() < 0.5:
-                        x = random.randrange(1, GRID_W-1)
-                        y = random.choice([1, GRID_H-2])
-                    if self.grid[x][y] == 0:
-                        self.enemies.append(Enemy((x, y), tier=1 + self.wave // 4))
-                        break
-            self.active_wave = True
-            self.waiting_next_wave = False
-            self.say(f"Wave {self.wave} — BOSS!", 2.2)
-            self.wave += 1
-            return
-
-        count = min(3 + self.wave, 18)
-        for _ in range(count):
-            for _tries in range(100):
-                x = random.choice([1, GRID_W-2])
-                y = random.randrange(1, GRID_H-1)
-                if random.random() < 0.5:
-                    x = random.randrange(1, GRID_W-1)
-                    y = random.choice([1, GRID_H-2])
-                if self.grid[x][y] == 0:
-                    self.enemies.append(Enemy((x, y), tier=1 + self.wave // 4))
-                    break
+        count = self.director.start(self.wave)
+        boss = is_boss_wave(self.wave)
         self.active_wave = True
         self.waiting_next_wave = False
-        self.say(f"Wave {self.wave}!", 1.8)
+        self.telemetry.wave_start(self.wave, count, boss=boss)
+        self.combat.wave_start()
+        if MEMORY: MEMORY.wave_start(self)
+        if TRACE: TRACE.mark("wave_start")
+        if boss:
+            self.say(f"Wave {self.wave} — BOSS!", 2.2)
+        else:
+            self.say(f"Wave {self.wave}!", 1.8)
         self.wave += 1
 
     def deposit(self):
@@ -723,6 +3055,7 @@ class World:
 
     def buy(self, item):
         p=self.player
+        scrap0, cores0 = p.scrap, p.cores
         if item=="critical_chance" and p.scrap>=5:
             p.scrap-=5; p.critical_chance+=1; self.say("Critical Chance +1%")
         elif item=="damage" and p.scrap>=7:
@@ -745,33 +3078,62 @@ class World:
             self.say("Shot speed (fire rate) +12%")
         else:
             self.say("Not enough currency")
+        if (p.scrap, p.cores) != (scrap0, cores0):
+            self.telemetry.purchase(item, scrap=scrap0-p.scrap, cores=cores0-p.cores)
 
     def draw(self,screen):
+        view = view_buffer(screen)
+        self.draw_world(view)
+        if view is not screen:
+            present_view(view, screen)
+
+        # damage numbers (text stays at native resolution)
+        if SETTINGS.get("damage_numbers", True):
+            for f in self.floaters:
+                DIRTY.add(f.draw(screen, get_font(16, bold=True), self.camera))
+
+        # UI
+        self.draw_ui(screen)
+
+    def draw_world(self, screen):
         ox,oy = -self.camera[0], -self.camera[1]
+        k = VIEW_K
         screen.fill((10,10,15))
-        for x in range(GRID_W):
-            for y in range(GRID_H):
-                rect=pygame.Rect(x*TILE+ox, y*TILE+oy, TILE, TILE)
-                if self.grid[x][y]==1:
+        x0, y0, x1, y1 = self.visible_cells()
+        xs = [int((x*TILE+ox)*k) for x in range(x0, x1+1)]
+        ys = [int((y*TILE+oy)*k) for y in range(y0, y1+1)]
+        for x in range(x0, x1):
+            col = self.grid[x]; i = x - x0
+            for y in range(y0, y1):
+                j = y - y0
+                rect=pygame.Rect(xs[i], ys[j], xs[i+1]-xs[i], ys[j+1]-ys[j])
+                if col[y]==1:
                     pygame.draw.rect(screen, GREY, rect)
                 else:
                     pygame.draw.rect(screen, (20,20,26), rect,1)
 
         # base area
         bx,by=self.base_cell[0]*TILE+TILE/2+ox, self.base_cell[1]*TILE+TILE/2+oy
-        pygame.draw.circle(screen, (40,60,80), (int(bx),int(by)), self.deposit_radius)
-        pygame.draw.circle(screen, (120,140,200), (int(bx),int(by)), self.deposit_radius,2)
-
-        # entities
-        for p in self.pickups: p.draw(screen, self.camera)
-        for t in self.turrets:
-            t.draw(screen, self.camera)
-            if t is self.upgrade_target:
-                rng = t.stats()["range"]
-                pygame.draw.circle(screen, (220,220,240), (int(t.x- self.camera[0]), int(t.y- self.camera[1])), rng, 1)
-        for e in self.enemies: e.draw(screen, self.camera)
-        for b in self.bullets: b.draw(screen, self.camera)
-        self.player.draw(screen)
+        pygame.draw.circle(screen, (40,60,80), (int(bx*k),int(by*k)), int(self.deposit_radius*k))
+        pygame.draw.circle(screen, (120,140,200), (int(bx*k),int(by*k)), int(self.deposit_radius*k),2)
+
+        # entities (one blits() batch of cached sprites)
+        batch = []
+        for p in self.pickups: p.add_sprites(batch, self.camera)
+        for t in self.turrets: t.add_sprites(batch, self.camera)
+        for e in self.enemies: e.add_sprites(batch, self.camera)
+        for b in self.bullets: b.add_sprites(batch, self.camera)
+        self.player.add_sprites(batch, self.camera)
+        if k != 1.0:
+            batch = [(view_sprite(img), (int(x*k), int(y*k))) for img, (x, y) in batch]
+        if DIRTY.enabled:
+            DIRTY.extend(screen.blits(batch))
+        else:
+            screen.blits(batch, doreturn=False)
+        t = self.upgrade_target
+        if t:
+            rng = t.stats()["range"]
+            DIRTY.add(pygame.draw.circle(screen, (220,220,240), (int((t.x+ox)*k), int((t.y+oy)*k)), int(rng*k), 1))
 
         # --- FIX: show turret placement preview (was missing) ---
         self.draw_turret_preview(screen)
@@ -780,13 +3142,10 @@ class World:
         self.draw_darkness(screen)
         self.draw_base_ring(screen)
 
-        # damage numbers
-        if SETTINGS.get("damage_numbers", True):
-            for f in self.floaters:
-                f.draw(screen, self.dm_font, self.camera)
-
-        # UI
-        self.draw_ui(screen)
+    def visible_cells(self):
+        cx, cy = self.camera
+        return (max(0, cx//TILE), max(0, cy//TILE),
+                min(GRID_W, (cx + WIDTH)//TILE + 1), min(GRID_H, (cy + HEIGHT)//TILE + 1))
 
     def draw_base_ring(self, screen):
         cx = self.base_cell[0]*TILE + TILE//2 - self.camera[0]
@@ -794,17 +3153,16 @@ class World:
         radius = self.deposit_radius + 8
         thickness = 6
         ratio = clamp(self.base_hp / self.base_max_hp, 0.0, 1.0)
+        ring = self.hud_ring.get((int(ratio*BASE_RING_STEPS), radius, thickness))
+        pos = (int((cx - radius - thickness)*VIEW_K), int((cy - radius - thickness)*VIEW_K))
+        DIRTY.retained(screen, "base_ring", view_sprite(ring), pos)
 
-        pygame.draw.circle(screen, (30, 45, 60), (int(cx), int(cy)), radius, thickness)
-        if ratio > 0:
-            segs = 60
-            end_ang = -math.tau*ratio
-            for i in range(segs):
-                a0 = -math.pi/2 + (i/segs)*end_ang
-                a1 = -math.pi/2 + ((i+1)/segs)*end_ang
-                x0, y0 = cx + math.cos(a0)*radius, cy + math.sin(a0)*radius
-                x1, y1 = cx + math.cos(a1)*radius, cy + math.sin(a1)*radius
-                pygame.draw.line(screen, (80,210,120), (x0,y0), (x1,y1), thickness)
+    def hud_label(self, text, size, color, bold=False):
+        key = (text, size, color, bold)
+        img = self.hud_labels.get(key)
+        if img is None:
+            img = self.hud_labels[key] = render_text(text, size, color, bold)
+        return img
 
     def draw_turret_preview(self, screen):
         if not self.player.placing_turret: return
@@ -812,21 +3170,46 @@ class World:
         wx = mx + self.camera[0]
         wy = my + self.camera[1]
         gx, gy = int(wx//TILE), int(wy//TILE)
-        cx, cy = gx*TILE + TILE//2 - self.camera[0], gy*TILE + TILE//2 - self.camera[1]
+        k = VIEW_K
+        cx, cy = int((gx*TILE + TILE//2 - self.camera[0])*k), int((gy*TILE + TILE//2 - self.camera[1])*k)
         valid = self.can_place_turret((gx,gy))
         ttype = self.player.placing_type or "basic"
+        rng = TURRET_KINDS[ttype]["range"]
+        h = len(self.grid[0])
+        area = self.visible_cells()
+        # coverage heatmap of placed turrets, then what this spot would see
+        if self.coverage_surf is None or self.coverage_surf[0] != (self.coverage_version, area, k):
+            cov = self.coverage
+            surf = render_cells((i for i in cell_window(area, h) if cov[i]), h, area, (240, 200, 90, 28), cov)
+            self.coverage_surf = ((self.coverage_version, area, k), *view_cells(surf))
+        origin = (int((area[0]*TILE - self.camera[0])*k), int((area[1]*TILE - self.camera[1])*k))
+        DIRTY.retained(screen, "coverage", self.coverage_surf[1], origin, self.coverage_surf[2])
+        if valid:
+            key = ((gx, gy), rng, area, k)
+            if self.preview_surf is None or self.preview_surf[0] != key:
+                bits = self.los((gx, gy), rng)
+                surf = render_cells((i for i in cell_window(area, h) if bit_test(bits, i)), h, area, (120, 220, 255, 60))
+                self.preview_surf = (key, *view_cells(surf))
+            DIRTY.retained(screen, "los_preview", self.preview_surf[1], origin, self.preview_surf[2])
+        advice = self.advice
+        if advice and advice.kind == ttype and advice.done():
+            if advice.elapsed is None: self.say(advice.summary(), 5.0)
+            for i, (cell, *_) in enumerate(advice.ranking()[1][:ADVISOR_SHOWN]):
+                ax, ay = int((cell[0]*TILE + TILE//2 - self.camera[0])*k), int((cell[1]*TILE + TILE//2 - self.camera[1])*k)
+                DIRTY.add(pygame.draw.circle(screen, GREEN, (ax, ay), int(13*k), 2))
+                label = view_sprite(self.hud_label(str(i + 1), 16, GREEN, True))
+                DIRTY.add(screen.blit(label, (ax - label.get_width()//2, ay - label.get_height()//2)))
         col = TURRET_KINDS[ttype]["color"]
         if not valid:
             col = (max(0,col[0]-80), max(0,col[1]-80), max(0,col[2]-80))
-        pygame.draw.circle(screen, col, (int(cx),int(cy)), 12, 2)
-        pygame.draw.circle(screen, WHITE, (int(cx),int(cy)), 12, 1)
-        rng = TURRET_KINDS[ttype]["range"]
-        pygame.draw.circle(screen, (200,200,220), (int(cx),int(cy)), rng, 1)
+        pygame.draw.circle(screen, col, (cx,cy), int(12*k), 2)
+        pygame.draw.circle(screen, WHITE, (cx,cy), int(12*k), 1)
+        DIRTY.mark("range_ring", pygame.draw.circle(screen, (200,200,220), (cx,cy), int(rng*k), 1), col)
 
     def draw_darkness(self,screen):
-        dark = pygame.Surface((WIDTH,HEIGHT), pygame.SRCALPHA)
-        px,py = int(self.player.x-self.camera[0]), int(self.player.y-self.camera[1])
-        radius = 130 + int(20*self.player.flashlight_level)
+        dark = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
+        px,py = int((self.player.x-self.camera[0])*VIEW_K), int((self.player.y-self.camera[1])*VIEW_K)
+        radius = int((130 + 20*self.player.flashlight_level)*VIEW_K)
 
         scale = clamp(SETTINGS.get("darkness", 1.0), 0.5, 1.5)
         a_outer = int(180 * scale)
@@ -836,119 +3219,93 @@ class World:
             pygame.draw.circle(dark,(0,0,0,alpha),(px,py),r)
         pygame.draw.circle(dark,(0,0,0,0),(px,py), int(radius*0.6))
         screen.blit(dark,(0,0), special_flags=pygame.BLEND_RGBA_SUB)
+        if (px, py, radius) != self.dark_pos:
+            if self.dark_pos:           # uncover the old disc too, even if it was drawn frames ago
+                ox, oy, orad = self.dark_pos
+                DIRTY.add(pygame.Rect(ox-orad, oy-orad, 2*orad+1, 2*orad+1))
+            DIRTY.add(pygame.Rect(px-radius, py-radius, 2*radius+1, 2*radius+1))
+            self.dark_pos = (px, py, radius)
 
     def draw_ui(self,screen):
         boss = self.get_boss()
-        font=pygame.font.SysFont("consolas",18)
-        big=pygame.font.SysFont("consolas",24, bold=True)
-        kits = self.player.turret_kits
-        kits_text = f"B:{kits.get('basic',0)} F:{kits.get('flame',0)} I:{kits.get('ice',0)}"
-        text=f"HP {int(self.player.hp)}/{int(self.player.max_hp)}  Scrap:{self.player.scrap}  Cores:{self.player.cores}  Kits[{kits_text}]  Backpack:{len(self.player.backpack)}/{self.player.backpack_capacity}  Wave:{self.wave-1}  BaseHP:{int(self.base_hp)}"
-        screen.blit(font.render(text,True,WHITE),(10,10))
+        p = self.player
+        kits = p.turret_kits
+        status = self.hud_status.get((
+            int(p.hp), int(p.max_hp), p.scrap, p.cores,
+            (kits.get('basic',0), kits.get('flame',0), kits.get('ice',0)),
+            len(p.backpack), p.backpack_capacity, self.wave-1, int(self.base_hp)))
+        DIRTY.retained(screen, "status", status, (10,10))
         if self.message_timer>0:
-            msgsurf=big.render(self.message,True,YELLOW)
-            screen.blit(msgsurf,(WIDTH//2-msgsurf.get_width()//2,30))
+            msgsurf=self.hud_message.get((self.message, 24, YELLOW, True))
+            DIRTY.retained(screen, "message", msgsurf,(WIDTH//2-msgsurf.get_width()//2,30))
         if self.player.in_shop:
             self.draw_shop(screen)
         if self.base_hp<=0:
-            over=big.render("BASE DESTROYED! Press R to restart.",True,RED)
-            screen.blit(over,(WIDTH//2-over.get_width()//2, HEIGHT//2-20))
+            over=self.hud_label("BASE DESTROYED! Press R to restart.", 24, RED, True)
+            DIRTY.retained(screen, "game_over", over,(WIDTH//2-over.get_width()//2, HEIGHT//2-20))
         if self.player.placing_turret:
-            tip = font.render(
-                f"Placing [{self.player.placing_type}] on WALLS: Left-click place • Right-click/Esc cancel • [Tab] cycle",
-                True, (220,220,240)
+            tip = self.hud_label(
+                f"Placing [{self.player.placing_type}] on WALLS: Left-click place • Right-click/Esc cancel • [Tab] cycle • [H] advise",
+                18, (220,220,240)
             )
-            screen.blit(tip, (WIDTH//2 - tip.get_width()//2, HEIGHT-30))
+            DIRTY.retained(screen, "placing_tip", tip, (WIDTH//2 - tip.get_width()//2, HEIGHT-30))
         if self.upgrade_target:
             self.draw_upgrade_panel(screen)
+        if self.waiting_next_wave and self.wave > 1 and not self.player.in_shop and self.upgrade_target is None:
+            if self.wave_summary is None or self.wave_summary[0] != self.wave:
+                self.wave_summary = (self.wave, self.combat_summary())
+            if self.wave_summary[1]:
+                panel = self.hud_summary.get((self.wave - 1, self.wave_summary[1]))
+                DIRTY.retained(screen, "wave_summary", panel, (10, 40))
         if self.waiting_next_wave and self.base_hp > 0 and not self.player.in_shop and (self.upgrade_target is None):
-            hint_font = pygame.font.SysFont("consolas", 20, bold=True)
-            hint = hint_font.render("Press [N] to start the next wave", True, (220, 220, 240))
-            screen.blit(hint, (WIDTH//2 - hint.get_width()//2, HEIGHT - 48))
+            hint = self.hud_label("Press [N] to start the next wave", 20, (220, 220, 240), True)
+            DIRTY.retained(screen, "wave_hint", hint, (WIDTH//2 - hint.get_width()//2, HEIGHT - 48))
         if boss:
             bar_w = WIDTH - 240
             bar_h = 16
             x = (WIDTH - bar_w) // 2
             y = 46
             ratio = max(0.0, min(1.0, boss.hp / boss.max_hp))
-            pygame.draw.rect(screen, (30, 20, 40), pygame.Rect(x-2, y-2, bar_w+4, bar_h+4))
-            pygame.draw.rect(screen, (80, 30, 110), pygame.Rect(x, y, bar_w, bar_h))
-            if ratio > 0:
-                pygame.draw.rect(screen, (210, 110, 240), pygame.Rect(x, y, int(bar_w * ratio), bar_h))
-            name_font = pygame.font.SysFont("consolas", 18, bold=True)
-            name = name_font.render("BOSS", True, (240, 210, 255))
-            screen.blit(name, (x - name.get_width() - 12, y - 2))
+            DIRTY.retained(screen, "boss_bar", self.hud_boss.get((bar_w, bar_h, int(bar_w * ratio))), (x-2, y-2))
+            name = self.hud_label("BOSS", 18, (240, 210, 255), True)
+            DIRTY.retained(screen, "boss_name", name, (x - name.get_width() - 12, y - 2))
 
     def draw_shop(self,screen):
-        font=pygame.font.SysFont("consolas",18)
-        panel=pygame.Surface((420,320))
-        panel.fill((16,22,30))
-        pygame.draw.rect(panel,(80,120,160),panel.get_rect(),2)
-        lines=[
-            "SHOP (on base) — [Esc/E] to close",
-            "1) +8% Speed ............ 5 scrap",
-            "2) +0.5 Damage .......... 7 scrap",
-            "3) +10 HP ............... 6 scrap",
-            "4) +3 Backpack Capacity . 8 scrap",
-            "5) Basic Turret ......... 3 cores",
-            "6) Repair Base +30 ...... 2 cores",
-            "7) Flame Turret (DoT) ... 4 cores",
-            "8) Ice Turret (Slow) .... 4 cores",
-            "9) Shot Speed +12% ...... 4 scrap",
-            "",
-            "Press [1-9] to buy."
-        ]
-        for i,l in enumerate(lines):
-            panel.blit(font.render(l,True,WHITE),(12,12+i*24))
-        screen.blit(panel,(WIDTH-440, HEIGHT-340))
+        DIRTY.retained(screen, "shop", self.hud_shop.get(()),(WIDTH-440, HEIGHT-340))
 
     def draw_upgrade_panel(self, screen):
         t = self.upgrade_target
         if not t: return
-        font=pygame.font.SysFont("consolas",18)
-        small=pygame.font.SysFont("consolas",16)
-        panel=pygame.Surface((420,210))
-        panel.fill((18,20,28))
-        pygame.draw.rect(panel,(140,180,240),panel.get_rect(),2)
-        title = f"UPGRADE TURRET [{t.type.upper()}] — scrap:{self.player.scrap}"
-        panel.blit(font.render(title, True, WHITE),(12,10))
-        def line(lbl, key, y):
-            lvl = t.upgrade_level(key)
-            cost = t.upgrade_cost(key)
-            maxed = lvl >= MAX_UPGRADE
-            text = f"{lbl}  Lvl {lvl}/{MAX_UPGRADE}  —  Cost: {cost} scrap"
-            col = (200,200,200) if not maxed else (160,160,160)
-            panel.blit(font.render(text, True, col),(24,y))
-            if maxed:
-                panel.blit(small.render("MAXED", True, (240,210,90)), (panel.get_width()-90, y))
-        line("1) +Damage (boosts DoT/slow duration on special)", "dmg", 52)
-        line("2) +Range", "rng", 84)
-        line("3) +Fire Rate (lower cooldown)", "rate", 116)
-        panel.blit(small.render("Press [1-3] to buy • [Esc/E] to close • Stand close to a turret & press E near it to open", True, (200,210,230)), (12, 160))
-        screen.blit(panel,(20, HEIGHT-240))
+        keys = ("dmg", "rng", "rate")
+        record = describe_combat(self.combat.get(t.stat)) if t.stat is not None else "not fired yet"
+        panel = self.hud_upgrade.get((
+            t.type, tuple(t.upgrade_level(k) for k in keys), tuple(t.upgrade_cost(k) for k in keys), self.player.scrap,
+            record))
+        DIRTY.retained(screen, "upgrade_panel", panel,(20, HEIGHT-240))
 
     def draw_pause_menu(self,screen):
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 160))
-        screen.blit(overlay, (0, 0))
-        title_font = pygame.font.SysFont("consolas", 36, bold=True)
+        screen.fill((95, 95, 95), special_flags=pygame.BLEND_RGB_MULT)    # same as black at alpha 160, no buffer
+        title_font = get_font(36, bold=True)
         title = title_font.render("PAUSED", True, (255, 255, 255))
         screen.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//2 - 200))
-        labels = ["Resume", "Options", "Restart", "Main Menu", "Quit"]
-        btn_w, btn_h = 320, 56
-        spacing = 72
-        start_y = HEIGHT//2 - 80
         mx,my = pygame.mouse.get_pos()
-        rects = []
-        for i, label in enumerate(labels):
-            rect = pygame.Rect(WIDTH//2 - btn_w//2, start_y + i*spacing, btn_w, btn_h)
+        rects = list(zip(PAUSE_ITEMS, pause_menu_layout((WIDTH, HEIGHT))))
+        for label, rect in rects:
             hovered = rect.collidepoint(mx,my)
             draw_button(screen, rect, label, hovered)
-            rects.append((label, rect))
-        hint = pygame.font.SysFont("consolas", 16).render("Press P/Esc to resume", True, (200,210,230))
-        screen.blit(hint, (WIDTH//2 - hint.get_width()//2, start_y + len(labels)*spacing + 10))
+        hint = get_font(16).render("Press P/Esc to resume", True, (200,210,230))
+        screen.blit(hint, (WIDTH//2 - hint.get_width()//2, rects[-1][1].bottom + 26))
         return rects
 
+PlayerInput = namedtuple("PlayerInput", "dx dy fire mx my")
+
+def sample_player_input():
+    keys=pygame.key.get_pressed()
+    mx,my = pygame.mouse.get_pos()
+    dx=(keys[pygame.K_d] or keys[pygame.K_RIGHT]) - (keys[pygame.K_a] or keys[pygame.K_LEFT])
+    dy=(keys[pygame.K_s] or keys[pygame.K_DOWN]) - (keys[pygame.K_w] or keys[pygame.K_UP])
+    return PlayerInput(dx, dy, bool(pygame.mouse.get_pressed()[0]), mx, my)
+
 class Player:
     def __init__(self, world, pos):
         self.world=world
@@ -967,6 +3324,7 @@ class Player:
         self.placing_turret = False
         self.placing_type = None
 
+    def grid_cell(self): return int(self.x//TILE), int(self.y//TILE)
     def backpack_space(self): return len(self.backpack) < self.backpack_capacity
     def add_turret_kit(self, ttype):
         if ttype not in self.turret_kits: self.turret_kits[ttype]=0
@@ -981,16 +3339,14 @@ class Player:
         idx = types.index(self.placing_type)
         self.placing_type = types[(idx+1)%len(types)]
 
-    def update(self,dt):
-        keys=pygame.key.get_pressed()
-        mx,my = pygame.mouse.get_pos()
-        dx=(keys[pygame.K_d] or keys[pygame.K_RIGHT]) - (keys[pygame.K_a] or keys[pygame.K_LEFT])
-        dy=(keys[pygame.K_s] or keys[pygame.K_DOWN]) - (keys[pygame.K_w] or keys[pygame.K_UP])
+    def update(self,dt,inp=None):
+        if inp is None: inp = sample_player_input()
+        dx, dy, mx, my = inp.dx, inp.dy, inp.mx, inp.my
         length=math.hypot(dx,dy) or 1.0
         vx,vy = dx/length*self.speed*120*dt, dy/length*self.speed*120*dt
         self.move(vx,vy)
         self.shoot_cooldown=max(0,self.shoot_cooldown-dt)
-        if pygame.mouse.get_pressed()[0] and self.shoot_cooldown==0 and self.world.base_hp>0 and not self.in_shop and not self.placing_turret and not self.world.upgrade_target:
+        if inp.fire and self.shoot_cooldown==0 and self.world.base_hp>0 and not self.in_shop and not self.placing_turret and not self.world.upgrade_target:
             px,py=self.x,self.y
             wx = mx + self.world.camera[0]
             wy = my + self.world.camera[1]
@@ -1002,48 +3358,669 @@ class Player:
                 Bullet((px,py),(math.cos(ang)*speed, math.sin(ang)*speed),
                        damage=self.attack_damage*crit_mod, color=YELLOW, playerBullet=True, is_crit=is_crit)
             )
+            self.world.combat.data[PLAYER_STAT + SHOTS] += 1
             self.shoot_cooldown=self.fire_delay
-        for e in list(self.world.enemies):
+        for e in self.world.enemies:
             if dist((self.x,self.y),(e.x,e.y))<14+e.tier:
                 self.hp-=12*dt
                 if self.hp<=0: self.respawn()
         self.x=clamp(self.x, 0, GRID_W*TILE-1); self.y=clamp(self.y, 0, GRID_H*TILE-1)
 
     def move(self,vx,vy):
-        nx=self.x+vx; ny=self.y+vy
-        if not self.world.is_solid(int(nx//TILE), int(self.y//TILE)):
-            self.x=nx
-        if not self.world.is_solid(int(self.x//TILE), int(ny//TILE)):
-            self.y=ny
-
-    def draw(self,screen):
-        px,py=int(self.x-self.world.camera[0]), int(self.y-self.world.camera[1])
-        pygame.draw.circle(screen, (200,200,220), (px,py), 10)
+        # swept per axis: stops at the first wall crossed, however far one step goes
+        self.x = sweep_axis(self.world, self.x, vx, int(self.y//TILE), horizontal=True)
+        self.y = sweep_axis(self.world, self.y, vy, int(self.x//TILE), horizontal=False)
+
+    def add_sprites(self,out,cam):
+        px,py=int(self.x-cam[0]), int(self.y-cam[1])
+        img, c = dot_sprite((200,200,220), 10)
+        out.append((img, (px-c, py-c)))
         for i,p in enumerate(self.backpack[:8]):
-            color = BLUE if p.type=="core" else GREEN
-            pygame.draw.circle(screen, color, (px-14+i*6, py-18), 3)
+            img, c = dot_sprite(BLUE if p.type=="core" else GREEN, 3)
+            out.append((img, (px-14+i*6-c, py-18-c)))
 
     def respawn(self):
         self.x,self.y = self.world.base_cell[0]*TILE+TILE/2, self.world.base_cell[1]*TILE+TILE/2
         self.hp=self.max_hp
         lost=int(len(self.backpack)*0.7)
         self.backpack=self.backpack[lost:]
+        self.world.telemetry.death(lost)
         self.world.say("You were knocked out! Dropped some loot.", 2.5)
 
+# ----------------------------
+# Simulation worker process (shared-memory snapshots)
+# ----------------------------
+# Optional split mode: World.update runs in a worker process and publishes flat snapshots into shared
+# memory (control | map | snapshot 0 | snapshot 1); the main process mirrors the newest one.
+# Each region's sequence counter is odd while written, so readers retry torn copies.
+SIM_TICK_RATE = 60
+SIM_CTRL = struct.Struct("<q3Q")            # latest snapshot slot, seq slot 0, seq slot 1, seq map
+SIM_SEQ = struct.Struct("<Q")
+SIM_SEQ_MAP = 24
+SIM_MAP_HEAD = struct.Struct("<IHHHH")      # map version, w, h, base x, base y
+SnapHead = namedtuple("SnapHead", (
+    "tick map_version sim_ms cmds speed "
+    "n_enemies n_bullets n_trail n_pickups n_floaters n_turrets n_combat "
+    "base_hp base_max_hp px py hp max_hp message_timer cam_x cam_y "
+    "wave scrap cores capacity backpack_len backpack_cores flashlight kit_basic kit_flame kit_ice "
+    "active_wave waiting_next_wave in_shop placing_turret placing_type upgrade_target message"))
+SNAP_HEAD = struct.Struct("<IIfIB7I2f4df2i5iIi3i4Bbi128s")
+SNAP_ENEMY = struct.Struct("<ddddHB")       # x, y, hp, max_hp, tier, flags (1 hit, 2 slowed, 4 boss, 8 chaser)
+SNAP_BULLET = struct.Struct("<ddBBH")       # x, y, colour, crit, trail points
+SNAP_TRAIL = struct.Struct("<ddd")          # x, y, life
+SNAP_PICKUP = struct.Struct("<dddB")        # x, y, pulse, kind
+SNAP_FLOATER = struct.Struct("<ddddBB")     # x, y, amount, life, colour, crit
+SNAP_TURRET = struct.Struct("<hhBBBBi")     # cell x, cell y, type, dmg/rng/rate levels, CombatStats offset
+SNAP_COMBAT = struct.Struct("<d")           # CombatStats.data, then CombatStats.mark
+SNAP_REGIONS = (
+    ("enemies", SNAP_ENEMY, 4096), ("bullets", SNAP_BULLET, 2048), ("trail", SNAP_TRAIL, 16384),
+    ("pickups", SNAP_PICKUP, 2048), ("floaters", SNAP_FLOATER, 256), ("turrets", SNAP_TURRET, 512),
+    ("combat", SNAP_COMBAT, 2 * 513 * COMBAT_STRIDE),
+)
+SNAP_COLORS = (YELLOW, ORANGE, CYAN, PURPLE, WHITE, (255, 90, 220), RED, GREEN, BLUE)
+_SNAP_COLOR_INDEX = {c: i for i, c in enumerate(SNAP_COLORS)}
+TURRET_TYPES = tuple(TURRET_KINDS)
+PICKUP_KINDS = ("scrap", "core")
+UPGRADE_KEYS = ("dmg", "rng", "rate")
+
+# commands, main -> worker (one pipe message each; input only when it changes)
+OP_INPUT, OP_KEY, OP_CLICK, OP_PAUSE, OP_SETTINGS, OP_RESTART, OP_END, OP_QUIT, OP_SPEED = range(9)
+CMD_INPUT = struct.Struct("<Bbb?hh")
+CMD_KEY = struct.Struct("<Bihh")
+CMD_CLICK = struct.Struct("<BBhh")
+CMD_PAUSE = struct.Struct("<B?")
+CMD_SPEED = struct.Struct("<BB")
+CMD_OP = struct.Struct("<B")
+
+def _snap_layout():
+    offsets, off = {}, SNAP_HEAD.size
+    for name, st, cap in SNAP_REGIONS:
+        offsets[name] = off
+        off += st.size * cap
+    return offsets, off
+SNAP_OFFSETS, SNAP_BYTES = _snap_layout()
+
+def sim_shm_layout(cells):
+    map_off = SIM_CTRL.size
+    slot0 = (map_off + SIM_MAP_HEAD.size + cells + 63) & ~63
+    slot1 = (slot0 + SNAP_BYTES + 63) & ~63
+    return map_off, (slot0, slot1), slot1 + SNAP_BYTES
+
+class SnapshotWriter:
+    def __init__(self, buf, cells):
+        self.buf = buf
+        self.map_off, self.slots, _ = sim_shm_layout(cells)
+        self.latest = -1
+
+    def _begin(self, seq_off):
+        seq = SIM_SEQ.unpack_from(self.buf, seq_off)[0] + 1
+        SIM_SEQ.pack_into(self.buf, seq_off, seq)
+        return seq
+
+    def publish_map(self, world, version):
+        buf = self.buf
+        w, h = len(world.grid), len(world.grid[0])
+        seq = self._begin(SIM_SEQ_MAP)
+        SIM_MAP_HEAD.pack_into(buf, self.map_off, version, w, h, *world.base_cell)
+        start = self.map_off + SIM_MAP_HEAD.size
+        buf[start:start + w*h] = bytes(c for col in world.grid for c in col)
+        SIM_SEQ.pack_into(buf, SIM_SEQ_MAP, seq + 1)
+
+    def publish(self, world, tick, version, sim_ms, cmds, speed=1):
+        buf = self.buf
+        slot = 1 if self.latest == 0 else 0
+        base = self.slots[slot]
+        seq_off = 8 + 8*slot
+        seq = self._begin(seq_off)
+
+        o = base + SNAP_OFFSETS["enemies"]; n_enemies = 0
+        for e in world.enemies[:4096]:
+            flags = (e.hit_timer > 0) | (bool(e.slows) << 1) | (isinstance(e, Boss) << 2) | (e.chases << 3)
+            SNAP_ENEMY.pack_into(buf, o, e.x, e.y, e.hp, e.max_hp, e.tier, flags)
+            o += SNAP_ENEMY.size; n_enemies += 1
+
+        o = base + SNAP_OFFSETS["bullets"]; to = base + SNAP_OFFSETS["trail"]
+        n_bullets = n_trail = 0
+        for b in world.bullets[:2048]:
+            trail = b.trail[:16384 - n_trail]
+            SNAP_BULLET.pack_into(buf, o, b.x, b.y, _SNAP_COLOR_INDEX.get(b.color, 0), b.is_crit, len(trail))
+            o += SNAP_BULLET.size; n_bullets += 1
+            for tx, ty, tlife in trail:
+                SNAP_TRAIL.pack_into(buf, to, tx, ty, tlife)
+                to += SNAP_TRAIL.size
+            n_trail += len(trail)
+
+        o = base + SNAP_OFFSETS["pickups"]; n_pickups = 0
+        for p in world.pickups[:2048]:
+            SNAP_PICKUP.pack_into(buf, o, p.x, p.y, p.pulse, p.type == "core")
+            o += SNAP_PICKUP.size; n_pickups += 1
+
+        o = base + SNAP_OFFSETS["floaters"]; n_floaters = 0
+        for f in world.floaters[:256]:
+            SNAP_FLOATER.pack_into(buf, o, f.x, f.y, f.amount, f.life, _SNAP_COLOR_INDEX.get(f.color, 0), f.crit)
+            o += SNAP_FLOATER.size; n_floaters += 1
+
+        o = base + SNAP_OFFSETS["turrets"]; n_turrets = 0
+        for t in world.turrets[:512]:
+            SNAP_TURRET.pack_into(buf, o, t.cell[0], t.cell[1], TURRET_TYPES.index(t.type),
+                                  *(t.upgrade_level(k) for k in UPGRADE_KEYS), -1 if t.stat is None else t.stat)
+            o += SNAP_TURRET.size; n_turrets += 1
+
+        combat = world.combat
+        n = min(len(combat.data), 513 * COMBAT_STRIDE)
+        o = base + SNAP_OFFSETS["combat"]
+        buf[o:o + 16*n] = combat.data[:n].tobytes() + combat.mark[:n].tobytes()
+
+        p = world.player
+        kits = p.turret_kits
+        cores_mask = 0
+        for i, item in enumerate(p.backpack[:32]):
+            if item.type == "core": cores_mask |= 1 << i
+        target = world.upgrade_target
+        SNAP_HEAD.pack_into(
+            buf, base, tick, version, sim_ms, cmds, speed,
+            n_enemies, n_bullets, n_trail, n_pickups, n_floaters, n_turrets, 2*n,
+            world.base_hp, world.base_max_hp, p.x, p.y, p.hp, p.max_hp, world.message_timer,
+            world.camera[0], world.camera[1],
+            world.wave, p.scrap, p.cores, p.backpack_capacity, len(p.backpack), cores_mask, p.flashlight_level,
+            kits.get("basic", 0), kits.get("flame", 0), kits.get("ice", 0),
+            world.active_wave, world.waiting_next_wave, p.in_shop, p.placing_turret,
+            TURRET_TYPES.index(p.placing_type) if p.placing_type in TURRET_TYPES else -1,
+            world.turrets.index(target) if target in world.turrets else -1,
+            world.message.encode("utf-8")[:128])
+        SIM_SEQ.pack_into(buf, seq_off, seq + 1)
+        SIM_CTRL.pack_into(buf, 0, slot, *SIM_CTRL.unpack_from(buf, 0)[1:])
+        self.latest = slot
+
+class SnapshotReader:
+    def __init__(self, buf, cells):
+        self.buf = buf
+        self.map_off, self.slots, _ = sim_shm_layout(cells)
+        self.tick = None
+
+    def read_map(self):
+        buf = self.buf
+        for _ in range(8):
+            seq = SIM_SEQ.unpack_from(buf, SIM_SEQ_MAP)[0]
+            if seq & 1: continue
+            version, w, h, bx, by = SIM_MAP_HEAD.unpack_from(buf, self.map_off)
+            start = self.map_off + SIM_MAP_HEAD.size
+            raw = bytes(buf[start:start + w*h])
+            if SIM_SEQ.unpack_from(buf, SIM_SEQ_MAP)[0] == seq:
+                return version, [list(raw[x*h:(x+1)*h]) for x in range(w)], (bx, by)
+        return None
+
+    def read(self):
+        buf = self.buf
+        for _ in range(8):
+            slot = SIM_CTRL.unpack_from(buf, 0)[0]
+            if slot < 0: return None
+            seq_off = 8 + 8*slot
+            seq = SIM_SEQ.unpack_from(buf, seq_off)[0]
+            if seq & 1: continue
+            base = self.slots[slot]
+            head = SnapHead._make(SNAP_HEAD.unpack_from(buf, base))
+            if head.tick == self.tick: return None
+            data = {}
+            for name, st, cap in SNAP_REGIONS:
+                start = base + SNAP_OFFSETS[name]
+                data[name] = bytes(buf[start:start + st.size*min(cap, getattr(head, "n_" + name))])
+            if SIM_SEQ.unpack_from(buf, seq_off)[0] == seq:
+                self.tick = head.tick
+                return head, data
+        return None
+
+def _pooled(pool, i, make):
+    while len(pool) <= i:
+        pool.append(make())
+    return pool[i]
+
+def mirror_world(grid, base_cell):
+    view = World((grid, base_cell, None), telemetry=False)
+    view.snapshot_pools = {"enemies": [], "bosses": [], "bullets": [], "pickups": [], "floaters": [], "turrets": [],
+                           "backpack": (Pickup((0, 0), "scrap"), Pickup((0, 0), "core"))}
+    return view
+
+def apply_snapshot(view, head, data):
+    pools = view.snapshot_pools
+
+    enemies = []; n_boss = 0
+    for i, (x, y, hp, max_hp, tier, flags) in enumerate(SNAP_ENEMY.iter_unpack(data["enemies"])):
+        if flags & 4:
+            e = _pooled(pools["bosses"], n_boss, lambda: Boss((0, 0), 0)); n_boss += 1
+        else:
+            e = _pooled(pools["enemies"], i - n_boss, lambda: Enemy((0, 0)))
+        e.x, e.y, e.hp, e.max_hp, e.tier = x, y, hp, max_hp, tier
+        e.hit_timer = 1 if flags & 1 else 0
+        e.slows = (True,) if flags & 2 else ()
+        e.chases = bool(flags & 8)
+        enemies.append(e)
+    view.enemies.clear(); view.enemies.extend(enemies)
+
+    bullets = []; trail = data["trail"]; t0 = 0
+    for i, (x, y, col, crit, n) in enumerate(SNAP_BULLET.iter_unpack(data["bullets"])):
+        b = _pooled(pools["bullets"], i, lambda: Bullet((0, 0), (0, 0)))
+        b.x, b.y, b.color, b.is_crit = x, y, SNAP_COLORS[col], bool(crit)
+        b.trail = list(SNAP_TRAIL.iter_unpack(trail[t0*SNAP_TRAIL.size:(t0 + n)*SNAP_TRAIL.size]))
+        t0 += n
+        bullets.append(b)
+    view.bullets.clear(); view.bullets.extend(bullets)
+
+    pickups = []
+    for i, (x, y, pulse, kind) in enumerate(SNAP_PICKUP.iter_unpack(data["pickups"])):
+        p = _pooled(pools["pickups"], i, lambda: Pickup((0, 0)))
+        p.x, p.y, p.pulse, p.type = x, y, pulse, PICKUP_KINDS[kind]
+        pickups.append(p)
+    view.pickups.clear(); view.pickups.extend(pickups)
+
+    floaters = []
+    for i, (x, y, amount, life, col, crit) in enumerate(SNAP_FLOATER.iter_unpack(data["floaters"])):
+        f = _pooled(pools["floaters"], i, lambda: DamageText(0, 0, 0))
+        f.x, f.y, f.amount, f.life, f.color, f.crit = x, y, amount, life, SNAP_COLORS[col], bool(crit)
+        floaters.append(f)
+    view.floaters.clear(); view.floaters.extend(floaters)
+
+    turrets = []
+    for i, (gx, gy, ttype, *levels, stat) in enumerate(SNAP_TURRET.iter_unpack(data["turrets"])):
+        t = _pooled(pools["turrets"], i, lambda: Turret((0, 0)))
+        t.cell = (gx, gy)
+        t.stat = None if stat < 0 else stat
+        t.x, t.y = gx*TILE + TILE/2, gy*TILE + TILE/2
+        t.type = TURRET_TYPES[ttype]
+        t.upgrades.update(zip(UPGRADE_KEYS, levels))
+        turrets.append(t)
+    view.turrets.clear(); view.turrets.extend(turrets)
+    if data["turrets"] != pools.get("turret_bytes"):
+        pools["turret_bytes"] = data["turrets"]
+        view.rebuild_coverage()
+
+    half = len(data["combat"]) // 2
+    view.combat.data = array("d", data["combat"][:half])
+    view.combat.mark = array("d", data["combat"][half:])
+
+    p = view.player
+    p.x, p.y, p.hp, p.max_hp = head.px, head.py, head.hp, head.max_hp
+    p.scrap, p.cores, p.backpack_capacity, p.flashlight_level = head.scrap, head.cores, head.capacity, head.flashlight
+    p.turret_kits.update(basic=head.kit_basic, flame=head.kit_flame, ice=head.kit_ice)
+    scrap_item, core_item = pools["backpack"]
+    p.backpack = [core_item if head.backpack_cores >> i & 1 else scrap_item for i in range(head.backpack_len)]
+    p.in_shop, p.placing_turret = bool(head.in_shop), bool(head.placing_turret)
+    p.placing_type = TURRET_TYPES[head.placing_type] if head.placing_type >= 0 else None
+    view.upgrade_target = turrets[head.upgrade_target] if 0 <= head.upgrade_target < len(turrets) else None
+    view.base_hp, view.base_max_hp, view.wave = head.base_hp, head.base_max_hp, head.wave
+    view.active_wave, view.waiting_next_wave = bool(head.active_wave), bool(head.waiting_next_wave)
+    view.message = head.message.rstrip(b"\0").decode("utf-8", "replace")
+    view.message_timer = head.message_timer
+    view.camera = (head.cam_x, head.cam_y)
+
+def sim_worker(shm_name, conn, seed, tick_rate, window, grid_size, settings, memory=False):
+    global WIDTH, HEIGHT, GRID_W, GRID_H
+    from multiprocessing import shared_memory
+    WIDTH, HEIGHT = window
+    GRID_W, GRID_H = grid_size
+    SETTINGS.update(settings)
+    update_view()
+    if memory:
+        enable_memory_profile("sim")
+    if SETTINGS.get("gc_policy", True):
+        enable_gc_policy()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    writer = SnapshotWriter(shm.buf, GRID_W*GRID_H)
+    pregen = MapPregenerator(seed)
+    world = None; version = 0
+    inp = PlayerInput(0, 0, False, 0, 0)
+    paused = False; changed = False; running = True; cmds = 0
+    time_scale = TimeScale()
+    step = 1.0 / tick_rate; tick = 0; sim_ms = 0.0
+    next_t = time.perf_counter()
+    while running:
+        halted = (world is None or paused or world.player.in_shop
+                  or world.base_hp <= 0 or world.upgrade_target is not None)
+        try:
+            if halted and not changed:
+                conn.poll(None)             # nothing ticks: sleep until the next command
+                next_t = time.perf_counter()
+            while conn.poll():
+                msg = conn.recv_bytes()
+                op = msg[0]; changed = True; cmds += 1
+                if op == OP_INPUT:
+                    inp = PlayerInput(*CMD_INPUT.unpack(msg)[1:])
+                elif op == OP_KEY and world:
+                    _, key, mx, my = CMD_KEY.unpack(msg)
+                    world.handle_key(key, (mx, my))
+                elif op == OP_CLICK and world:
+                    _, button, mx, my = CMD_CLICK.unpack(msg)
+                    world.handle_click(button, (mx, my))
+                elif op == OP_PAUSE:
+                    paused = CMD_PAUSE.unpack(msg)[1]
+                elif op == OP_SPEED:
+                    time_scale.requested = CMD_SPEED.unpack(msg)[1]
+                    if world: world.say(f"Speed {time_scale.requested}x", 1.2)
+                elif op == OP_SETTINGS:
+                    SETTINGS.update(json.loads(msg[1:]))
+                    update_view()
+                elif op == OP_RESTART:
+                    if world: world.end_run("restart")
+                    world = None                    # unreachable before the build, so world_built() can free it
+                    data = pregen.take()
+                    if isinstance(data, MapStream):
+                        data = data.result()        # the mirror only gets the map once, so wait for all of it
+                    world = World(data); version += 1
+                    if GC_POLICY: GC_POLICY.world_built()
+                    writer.publish_map(world, version)
+                elif op == OP_END:
+                    if world: world.end_run(msg[1:].decode())
+                    world = None; version += 1
+                elif op == OP_QUIT:
+                    running = False
+        except (EOFError, OSError):
+            running = False                 # main process went away
+        if not running or world is None:
+            changed = False
+            continue
+
+        if not (paused or world.player.in_shop or world.base_hp <= 0 or world.upgrade_target is not None):
+            t0 = time.perf_counter()
+            time_scale.run(world, step, inp)
+            sim_ms = (time.perf_counter() - t0) * 1000
+            changed = True
+            if MEMORY: MEMORY.sample(world)
+        if changed:
+            tick += 1
+            writer.publish(world, tick, version, sim_ms, cmds, time_scale.effective)
+            changed = False
+        next_t += step
+        delay = next_t - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -0.25:
+            next_t = time.perf_counter()    # far behind: drop ticks rather than spiral
+    if world:
+        world.end_run("quit")
+    if MEMORY:
+        MEMORY.close(world)
+    pregen.shutdown()
+    shutdown_telemetry()
+    del writer
+    shm.close()
+
+class SimProcess:
+    def __init__(self, seed=None, tick_rate=SIM_TICK_RATE):
+        import multiprocessing
+        from multiprocessing import shared_memory
+        cells = GRID_W * GRID_H
+        self.shm = shared_memory.SharedMemory(create=True, size=sim_shm_layout(cells)[2])
+        SIM_CTRL.pack_into(self.shm.buf, 0, -1, 0, 0, 0)
+        self.reader = SnapshotReader(self.shm.buf, cells)
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child_conn = ctx.Pipe()
+        self.proc = ctx.Process(target=sim_worker, name="sim", daemon=True, args=(
+            self.shm.name, child_conn, seed, tick_rate, (WIDTH, HEIGHT), (GRID_W, GRID_H), dict(SETTINGS),
+            MEMORY is not None))
+        self.proc.start()
+        child_conn.close()
+        self.view = None
+        self.version = 0        # newest map asked for; older snapshots are ignored
+        self.input = None
+        self.paused = None
+        self.sent = 0           # commands sent vs. applied by the worker (from the last snapshot)
+        self.acked = 0
+
+    @property
+    def pending(self):
+        return self.view is not None and self.sent > self.acked
+
+    def _send(self, data):
+        try:
+            self.conn.send_bytes(data)
+        except (BrokenPipeError, OSError):
+            return
+        self.sent += 1
+
+    def send_input(self, inp):
+        if inp != self.input:
+            self.input = inp
+            self._send(CMD_INPUT.pack(OP_INPUT, *inp))
+
+    def key(self, key, mouse_pos): self._send(CMD_KEY.pack(OP_KEY, key, *mouse_pos))
+    def click(self, button, mouse_pos): self._send(CMD_CLICK.pack(OP_CLICK, button, *mouse_pos))
+
+    def set_paused(self, paused):
+        if paused != self.paused:
+            if not paused:      # options may have changed while paused
+                self._send(CMD_OP.pack(OP_SETTINGS) + json.dumps(SETTINGS).encode())
+            self.paused = paused
+            self._send(CMD_PAUSE.pack(OP_PAUSE, paused))
+
+    def set_speed(self, speed): self._send(CMD_SPEED.pack(OP_SPEED, speed))
+
+    def restart(self):
+        self.version += 1
+        self.view = None
+        self._send(CMD_OP.pack(OP_RESTART))
+
+    def end_run(self, reason):
+        self.version += 1
+        self.view = None
+        self._send(CMD_OP.pack(OP_END) + reason.encode())
+
+    def refresh(self):
+        snap = self.reader.read()
+        if snap is None: return False
+        head, data = snap
+        self.acked = head.cmds
+        if head.map_version != self.version: return False
+        if self.view is None:
+            m = self.reader.read_map()
+            if m is None or m[0] != self.version:
+                self.reader.tick = None     # map still being written: retry next frame
+                return False
+            self.view = mirror_world(m[1], m[2])
+        apply_snapshot(self.view, head, data)
+        PERF["sim"] = f"sim {head.sim_ms:.2f} ms/tick" + (f", {head.speed} substeps" if head.speed > 1 else "")
+        return True
+
+    def close(self):
+        self._send(CMD_OP.pack(OP_QUIT))
+        self.proc.join(2.0)
+        if self.proc.is_alive():
+            self.proc.terminate()
+        self.conn.close()
+        self.reader = None
+        self.shm.close()
+        self.shm.unlink()
+        PERF.pop("sim", None)
+
+# ----------------------------
+# Turret placement advisor (what-if waves in a process pool)
+# ----------------------------
+# The World is packed into a few KiB (pack_map plus fixed records); pool workers rebuild it per
+# candidate turret and play the upcoming wave with the same seed.
+ADVISOR_CANDIDATES = 50         # default candidates: placeable walls that see the most open cells
+ADVISOR_DT = 1.0 / 30           # what-if tick; coarser than play, swept collision keeps hits exact
+ADVISOR_MAX_TIME = 240.0        # game seconds before a what-if wave counts as not cleared
+ADVISOR_SHOWN = 3               # best placements marked in the turret preview
+WHATIF_HEAD = struct.Struct("<IIfffff?HHH")     # map bytes, wave, base hp/max, player x/y, director clock,
+                                                # active wave, turrets, enemies, queued releases
+WHATIF_TURRET = struct.Struct("<hhBBBBf")       # cell x, cell y, type, dmg/rng/rate levels, cooldown
+WHATIF_ENEMY = struct.Struct("<fffBBBB")        # x, y, hp, tier, flags (4 boss, 8 chaser, 16 DoT immune),
+                                                # DoTs, slows
+WHATIF_STATUS = struct.Struct("<ff")            # dps or slow factor, seconds left
+WHATIF_QUEUE = struct.Struct("<fBH")            # release time, kind, arg
+WHATIF_KINDS = ("enemy", "chaser", "boss")
+ADVISOR = None
+
+def pack_whatif(world):
+    m = pack_map(world.grid, world.base_cell, world.base_dist)
+    enemies = [e for e in world.enemies if e.alive and e.hp > 0]
+    queue = world.director.queue
+    out = [WHATIF_HEAD.pack(len(m), world.wave, world.base_hp, world.base_max_hp, world.player.x,
+                            world.player.y, world.director.clock, world.active_wave,
+                            len(world.turrets), len(enemies), len(queue)), m]
+    for t in world.turrets:
+        out.append(WHATIF_TURRET.pack(*t.cell, TURRET_TYPES.index(t.type),
+                                      *(t.upgrade_level(k) for k in UPGRADE_KEYS), t.cooldown))
+    for e in enemies:
+        flags = (isinstance(e, Boss) << 2) | (e.chases << 3) | (e.dot_immune << 4)
+        out.append(WHATIF_ENEMY.pack(e.x, e.y, e.hp, e.tier, flags, len(e.dots), len(e.slows)))
+        out.extend(WHATIF_STATUS.pack(s["dps"], s["t"]) for s in e.dots)
+        out.extend(WHATIF_STATUS.pack(s["factor"], s["t"]) for s in e.slows)
+    for at, kind, arg in queue:
+        out.append(WHATIF_QUEUE.pack(at, WHATIF_KINDS.index(kind), arg))
+    return b"".join(out)
+
+_whatif_map = (None, None)      # worker side: (packed map, unpacked map) of the latest snapshot
+
+def unpack_whatif(data):
+    global _whatif_map, _lod_slots, GRID_W, GRID_H
+    (map_len, wave, base_hp, base_max_hp, px, py, clock, active,
+     n_turrets, n_enemies, n_queue) = WHATIF_HEAD.unpack_from(data, 0)
+    off = WHATIF_HEAD.size
+    packed = data[off:off + map_len]; off += map_len
+    if _whatif_map[0] != packed:
+        _whatif_map = (packed, unpack_map(packed))
+    map_data = _whatif_map[1]
+    GRID_W, GRID_H = len(map_data[0]), len(map_data[0][0])
+    _lod_slots = itertools.count()      # same LOD and path stagger for every candidate
+    world = World(map_data, telemetry=False)
+    world.cosmetic = False
+    world.jobs.budget = float("inf")    # never defer: candidates differ only in the turret
+    world.wave, world.base_hp, world.base_max_hp = wave, base_hp, base_max_hp
+    world.player.x, world.player.y = px, py
+    for _ in range(n_turrets):
+        x, y, kind, *levels, cooldown = WHATIF_TURRET.unpack_from(data, off); off += WHATIF_TURRET.size
+        t = Turret((x, y), TURRET_TYPES[kind])
+        t.upgrades.update(zip(UPGRADE_KEYS, levels))
+        t.cooldown = cooldown
+        world.turrets.append(t)
+        world.cover(t)
+    for _ in range(n_enemies):
+        x, y, hp, tier, flags, n_dots, n_slows = WHATIF_ENEMY.unpack_from(data, off); off += WHATIF_ENEMY.size
+        cell = (int(x // TILE), int(y // TILE))
+        e = Boss(cell, (tier - 6) * 10) if flags & 4 else Chaser(cell, tier) if flags & 8 else Enemy(cell, tier)
+        e.x, e.y, e.hp = x, y, hp
+        e.dot_immune = bool(flags & 16)
+        for status, key, count in ((e.dots, "dps", n_dots), (e.slows, "factor", n_slows)):
+            for _ in range(count):      # credited to the player slot: what-if runs report no combat stats
+                v, left = WHATIF_STATUS.unpack_from(data, off); off += WHATIF_STATUS.size
+                status.append({key: v, "t": left, "stat": PLAYER_STAT})
+        world.enemies.append(e)
+    for _ in range(n_queue):
+        at, kind, arg = WHATIF_QUEUE.unpack_from(data, off); off += WHATIF_QUEUE.size
+        world.director.queue.append((at, WHATIF_KINDS[kind], arg))
+    world.director.clock = clock
+    world.active_wave = active
+    world.waiting_next_wave = not active
+    return world
+
+# -> (cell, base HP lost, seconds played, cleared); cell None plays the wave as is
+def whatif_wave(snapshot, cell, kind, seed):
+    world = unpack_whatif(snapshot)
+    if cell is not None:
+        world.turrets.append(Turret(cell, kind))
+        world.cover(world.turrets[-1])
+    random.seed(seed)
+    if not world.active_wave:
+        world.spawn_wave()
+    idle = PlayerInput(0, 0, False, 0, 0)
+    hp0, t = world.base_hp, 0.0
+    while world.active_wave and world.base_hp > 0 and t < ADVISOR_MAX_TIME:
+        world.update(ADVISOR_DT, idle)
+        t += ADVISOR_DT
+    return cell, hp0 - world.base_hp, t, not world.active_wave and world.base_hp > 0
+
+def placement_candidates(world, kind, limit=ADVISOR_CANDIDATES):
+    rng = TURRET_KINDS[kind]["range"]
+    walls = [(x, y) for x in range(1, GRID_W - 1) for y in range(1, GRID_H - 1) if world.can_place_turret((x, y))]
+    seen = {c: bin(int.from_bytes(world.los(c, rng), "little")).count("1") for c in walls}
+    return sorted(walls, key=lambda c: -seen[c])[:limit]
+
+def _advisor_init(settings):
+    SETTINGS.update(settings)
+
+class PlacementAdvice:
+    def __init__(self, kind, futures, t0):
+        self.kind = kind
+        self.futures = futures
+        self.t0 = t0
+        self.elapsed = None
+        self._ranking = None
+
+    def done(self): return all(f.done() for f in self.futures)
+
+    # least base HP lost first, then the fastest clear (or the longest stand)
+    def ranking(self):
+        if self._ranking is None:
+            results = [f.result() for f in self.futures]
+            self.elapsed = time.perf_counter() - self.t0
+            baseline = next(r for r in results if r[0] is None)
+            ranked = sorted((r for r in results if r[0] is not None),
+                            key=lambda r: (round(r[1], 1), not r[3], r[2] if r[3] else -r[2]))
+            self._ranking = (baseline, ranked)
+        return self._ranking
+
+    def summary(self):
+        (_, lost0, _, _), ranked = self.ranking()
+        if not ranked: return "No placement to advise"
+        cell, lost, t, cleared = ranked[0]
+        saved = f"saves {lost0 - lost:.0f} base HP" if lost0 - lost >= 0.5 else "no base HP saved"
+        when = f"clears in {t:.0f}s" if cleared else f"base holds {t:.0f}s"
+        return f"Best {self.kind} spot {cell}: {saved}, {when} ({len(ranked)} tried in {self.elapsed:.1f}s)"
+
+class PlacementAdvisor:
+    def __init__(self, workers=None):
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+        self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_advisor_init, initargs=(dict(SETTINGS),))
+
+    def advise(self, world, kind, cells=None, seed=None):
+        t0 = time.perf_counter()
+        cells = placement_candidates(world, kind) if cells is None else cells
+        snapshot = pack_whatif(world)
+        seed = random.randrange(1 << 30) if seed is None else seed
+        futures = [self.executor.submit(whatif_wave, snapshot, c, kind, seed) for c in [None] + list(cells)]
+        return PlacementAdvice(kind, futures, t0)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def get_advisor():
+    global ADVISOR
+    if ADVISOR is None:
+        ADVISOR = PlacementAdvisor()
+    return ADVISOR
+
 # ----------------------------
 # Menu/helpers
 # ----------------------------
 def draw_button(surface, rect, text, hovered=False):
     pygame.draw.rect(surface, (20,28,36), rect)
     pygame.draw.rect(surface, (80,120,160) if hovered else (60,90,120), rect, 2)
-    font = pygame.font.SysFont("consolas", 26, bold=True)
+    font = get_font(26, bold=True)
     label = font.render(text, True, WHITE)
     surface.blit(label, (rect.centerx - label.get_width()//2, rect.centery - label.get_height()//2))
 
+PAUSE_ITEMS = ("Resume", "Options", "Restart", "Main Menu", "Quit")
+_layout_cache = {}
+
+def button_column(size, count, start_y, spacing, btn_w, btn_h):
+    key = (tuple(size), count, start_y, spacing, btn_w, btn_h)
+    rects = _layout_cache.get(key)
+    if rects is None:
+        rects = _layout_cache[key] = tuple(
+            pygame.Rect(size[0]//2 - btn_w//2, start_y + i*spacing, btn_w, btn_h) for i in range(count))
+    return rects
+
+def main_menu_layout(size, count): return button_column(size, count, 240, 72, 360, 56)
+def pause_menu_layout(size): return button_column(size, len(PAUSE_ITEMS), size[1]//2 - 80, 72, 320, 56)
+def back_button_rect(size): return button_column(size, 1, size[1] - 100, 0, 280, 52)[0]
+
 def draw_title(surface, title, subtitle=None):
     surface.fill((10,10,15))
-    big = pygame.font.SysFont("consolas", 40, bold=True)
-    sub = pygame.font.SysFont("consolas", 20)
+    big = get_font(40, bold=True)
+    sub = get_font(20)
     t = big.render(title, True, (200,220,255))
     surface.blit(t, (surface.get_width()//2 - t.get_width()//2, 120))
     if subtitle:
@@ -1052,17 +4029,12 @@ def draw_title(surface, title, subtitle=None):
 
 def draw_main_menu(surface, items, hovered_index):
     draw_title(surface, "MONSTERS OF THE DEEP", "tiny roguelite prototype")
-    start_y = 240
-    spacing = 72
-    btn_w, btn_h = 360, 56
     mx,my = pygame.mouse.get_pos()
-    rects=[]
-    for i, label in enumerate(items):
-        rect = pygame.Rect(surface.get_width()//2 - btn_w//2, start_y + i*spacing, btn_w, btn_h)
-        rects.append(rect)
+    rects = main_menu_layout(surface.get_size(), len(items))
+    for i, (label, rect) in enumerate(zip(items, rects)):
         hovered = rect.collidepoint(mx,my) or (hovered_index == i)
         draw_button(surface, rect, label, hovered)
-    tiny = pygame.font.SysFont("consolas", 16)
+    tiny = get_font(16)
     hint = tiny.render("W/S or ↑/↓ to navigate • Enter/Space to select • Mouse supported", True, (160,170,190))
     surface.blit(hint, (surface.get_width()//2 - hint.get_width()//2, surface.get_height()-60))
     return rects
@@ -1072,19 +4044,20 @@ def draw_help(surface):
     panel = pygame.Surface((680, 392))
     panel.fill((16,22,30))
     pygame.draw.rect(panel, (80,120,160), panel.get_rect(), 2)
-    font=pygame.font.SysFont("consolas",20)
+    font=get_font(20)
     lines = [
         "WASD / Arrow Keys: move",
         "Mouse + Left Click: shoot",
         "[E]: Use (deposit / open shop / close shop / upgrade near turret)",
         "[N]: Start next wave     [R]: Restart",
         "[T]: Place turret   [Tab]: Cycle type   [U]: (legacy) upgrade",
-        "[P]/[Esc]: Pause",
+        "[P]/[Esc]: Pause     [F]: Fast-forward (1x/2x/4x/8x)",
+        "[H] while placing: simulate the next wave to find the best spots",
     ]
     for i,l in enumerate(lines):
         panel.blit(font.render(l, True, WHITE), (16, 16 + i*32))
     surface.blit(panel, (surface.get_width()//2 - panel.get_width()//2, 230))
-    rect = pygame.Rect(surface.get_width()//2 - 140, surface.get_height() - 100, 280, 52)
+    rect = back_button_rect(surface.get_size())
     mx,my = pygame.mouse.get_pos()
     draw_button(surface, rect, "Back", rect.collidepoint(mx,my))
     return rect
@@ -1096,13 +4069,15 @@ def draw_options(surface, selected_idx):
     panel = pygame.Surface((680, 420))
     panel.fill((16,22,30))
     pygame.draw.rect(panel, (80,120,160), panel.get_rect(), 2)
-    font  = pygame.font.SysFont("consolas", 20)
+    font  = get_font(20)
 
     show_fps = SETTINGS.get("show_fps", True)
     bullet_trails = SETTINGS.get("bullet_trails", True)
     dmg_numbers = SETTINGS.get("damage_numbers", True)
     darkness = SETTINGS.get("darkness", 1.0)
     fullscreen = SETTINGS.get("fullscreen", False)
+    dirty_rects = SETTINGS.get("dirty_rects", False)
+    render_scale = SETTINGS.get("render_scale", 1.0)
 
     opt_lines = [
         f"Show FPS ............. {format_bool(show_fps)}",
@@ -1110,6 +4085,8 @@ def draw_options(surface, selected_idx):
         f"Damage Numbers ....... {format_bool(dmg_numbers)}",
         f"Darkness Intensity ... {darkness:.1f}",
         f"Fullscreen ........... {format_bool(fullscreen)}",
+        f"Dirty-Rect Updates ... {format_bool(dirty_rects)}",
+        f"Render Scale ......... {render_scale:.0%}",
         "Controls Page ........ [Enter]",
         "",
         "Use ↑/↓ to move, ←/→ to change value",
@@ -1120,11 +4097,11 @@ def draw_options(surface, selected_idx):
     UNSELECTED_COLOR = (210, 220, 235)
     for i, line in enumerate(opt_lines):
         color = SELECTED_COLOR if i == selected_idx else UNSELECTED_COLOR
-        panel.blit(font.render(line, True, color), (16, 16 + i*34))
+        panel.blit(font.render(line, True, color), (16, 16 + i*30))
 
     surface.blit(panel, (surface.get_width()//2 - panel.get_width()//2, 220))
 
-    rect = pygame.Rect(surface.get_width()//2 - 140, surface.get_height() - 100, 280, 52)
+    rect = back_button_rect(surface.get_size())
     mx,my = pygame.mouse.get_pos()
     draw_button(surface, rect, "Back", rect.collidepoint(mx,my))
     return rect
@@ -1134,76 +4111,261 @@ def draw_controls_page(surface):
     panel = pygame.Surface((720, 420))
     panel.fill((16,22,30))
     pygame.draw.rect(panel, (80,120,160), panel.get_rect(), 2)
-    font = pygame.font.SysFont("consolas", 22)
+    font = get_font(22)
     rows = [
         ("Move", "WASD / Arrow Keys"),
         ("Shoot", "Left Mouse"),
         ("Use / Interact", "E (deposit, shop, upgrade)"),
         ("Start Wave", "N"),
-        ("Place Turret", "T"),
+        ("Place Turret", "T (H: advise spots)"),
         ("Cycle Turret Type", "Tab"),
         ("Pause", "P / Esc"),
         ("Restart", "R"),
+        ("Fast-forward", "F (1x / 2x / 4x / 8x)"),
         ("(Legacy) Upgrade", "U (E also works near turret)"),
     ]
     y = 22
     for a,b in rows:
         panel.blit(font.render(f"{a:20s}  :  {b}", True, WHITE), (18, y))
-        y += 36
-    hint = pygame.font.SysFont("consolas", 18).render("Press [Esc] to return to Options", True, (200,210,230))
+        y += 34
+    hint = get_font(18).render("Press [Esc] to return to Options", True, (200,210,230))
     panel.blit(hint, (18, panel.get_height() - 40))
     surface.blit(panel, (surface.get_width()//2 - panel.get_width()//2, 220))
 
-    rect = pygame.Rect(surface.get_width()//2 - 140, surface.get_height() - 100, 280, 52)
+    rect = back_button_rect(surface.get_size())
     mx,my = pygame.mouse.get_pos()
     draw_button(surface, rect, "Back", rect.collidepoint(mx,my))
     return rect
 
+# ----------------------------
+# Scenario benchmarks (--bench)
+# ----------------------------
+# --bench: seeded World scenarios timed off-screen, compared with a per-machine baseline; a gated
+# percentile above baseline * (1 + tolerance) fails.
+BENCH_BASELINE_FILE = "bench_baseline.json"
+BENCH_TOLERANCE = 0.15
+BENCH_WARMUP = 30               # untimed ticks first (sprite/HUD caches, font lookup)
+BENCH_GATED = ("frame_p50", "frame_p95", "frame_p99")
+_IDLE_INPUT = PlayerInput(0, 0, False, 0, 0)
+
+def _bench_world(seed):
+    random.seed(seed)
+    world = World(build_map(random.Random(seed)), telemetry=False)
+    world.base_hp = world.base_max_hp = 1e9
+    world.player.hp = world.player.max_hp = 1e9
+    if GC_POLICY: GC_POLICY.world_built()
+    return world
+
+def _aim_at_nearest(world):
+    p = world.player
+    e = min(world.enemies, key=lambda e: dist((p.x, p.y), (e.x, e.y)), default=None)
+    if e is None: return _IDLE_INPUT
+    return PlayerInput(0, 0, True, int(e.x - world.camera[0]), int(e.y - world.camera[1]))
+
+def _next_wave(world, speedup=1.0):
+    world.waiting_next_wave = True
+    world.start_next_wave()
+    if speedup != 1.0:
+        q = world.director.queue
+        q.extend([(t / speedup, kind, arg) for t, kind, arg in [q.popleft() for _ in range(len(q))]])
+
+def bench_boss_wave(world):
+    world.wave = 10
+    _next_wave(world)
+    return lambda world, tick: _IDLE_INPUT
+
+def bench_flame_dot(world, turrets=20, wave=8):
+    w, h = len(world.grid), len(world.grid[0])
+    bx, by = world.base_cell
+    walls = [(x, y) for x in range(1, w-1) for y in range(1, h-1) if world.grid[x][y] == 1
+             and any(world.grid[x+dx][y+dy] == 0 for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)))]
+    walls.sort(key=lambda c: (c[0]-bx)**2 + (c[1]-by)**2)
+    for cell in walls[:turrets]:
+        t = Turret(cell, "flame")
+        t.upgrades = dict.fromkeys(t.upgrades, MAX_UPGRADE)
+        world.turrets.append(t)
+        world.cover(t)
+    def drive(world, tick):
+        if not world.director.pending:
+            world.wave = wave
+            _next_wave(world)
+        return _IDLE_INPUT
+    return drive
+
+def bench_player_fire(world, waves=50, speedup=4.0):
+    world.player.fire_delay = 0.06
+    def drive(world, tick):
+        if not world.director.pending and world.wave <= waves:
+            _next_wave(world, speedup)
+        return _aim_at_nearest(world)
+    return drive
+
+def bench_pickup_floor(world, count=1200):
+    open_cells = [(x, y) for x in range(len(world.grid)) for y in range(len(world.grid[0])) if world.grid[x][y] == 0]
+    rng = random.Random(count)
+    world.pickups.extend(Pickup((cx*TILE + rng.uniform(4, TILE-4), cy*TILE + rng.uniform(4, TILE-4)),
+                                "core" if rng.random() < 0.2 else "scrap")
+                         for cx, cy in (rng.choice(open_cells) for _ in range(count)))
+    world.player.backpack_capacity = 0
+    world.wave = 5
+    _next_wave(world)
+    def drive(world, tick):
+        a = tick / 90.0
+        return PlayerInput(round(math.cos(a)), round(math.sin(a)), False, 0, 0)
+    return drive
+
+def bench_chasers(world, count=60):
+    rng = random.Random(count)
+    world.enemies.extend(Chaser(rng.choice(world.director.cells), tier=1 + i % 4) for i in range(count))
+    def drive(world, tick):
+        a = tick / 120.0
+        return PlayerInput(round(math.cos(a)), round(math.sin(a)), False, 0, 0)
+    return drive
+
+BENCH_SCENARIOS = {             # name -> (fixture, timed ticks)
+    "boss_wave10": (bench_boss_wave, 1800),
+    "flame_dot": (bench_flame_dot, 1800),
+    "player_fire": (bench_player_fire, 3600),
+    "pickup_floor": (bench_pickup_floor, 900),
+    "chasers": (bench_chasers, 1200),
+}
+
+def run_scenario(name, seed=1):
+    fixture, ticks = BENCH_SCENARIOS[name]
+    world = _bench_world(seed)
+    drive = fixture(world)
+    surface = pygame.Surface((WIDTH, HEIGHT))
+    dt = 1.0 / FPS
+    upd, drw = [], []
+    peak = {"enemies": 0, "bullets": 0, "pickups": 0}
+    clock = time.perf_counter
+    for tick in range(BENCH_WARMUP + ticks):
+        inp = drive(world, tick)
+        t0 = clock()
+        world.update(dt, inp)
+        t1 = clock()
+        world.draw(surface)
+        t2 = clock()
+        if tick >= BENCH_WARMUP:
+            upd.append((t1 - t0) * 1000); drw.append((t2 - t1) * 1000)
+            for k in peak:
+                peak[k] = max(peak[k], len(getattr(world, k)))
+    frame = sorted(u + d for u, d in zip(upd, drw))
+    upd.sort(); drw.sort()
+    result = {"ticks": ticks, "wave": world.wave - 1,
+              "update_p50": percentile(upd, 50), "update_p95": percentile(upd, 95),
+              "draw_p50": percentile(drw, 50), "draw_p95": percentile(drw, 95),
+              "frame_p50": percentile(frame, 50), "frame_p95": percentile(frame, 95),
+              "frame_p99": percentile(frame, 99), "frame_max": frame[-1]}
+    result.update({f"peak_{k}": v for k, v in peak.items()})
+    return result
+
+def run_benchmarks(names=None, baseline_path=BENCH_BASELINE_FILE, tolerance=BENCH_TOLERANCE, save=False, seed=1):
+    pygame.font.init()
+    if SETTINGS.get("gc_policy", True):
+        enable_gc_policy()      # measure the collector as the game runs it
+    names = names or list(BENCH_SCENARIOS)
+    unknown = [n for n in names if n not in BENCH_SCENARIOS]
+    if unknown:
+        print("Unknown scenario(s):", ", ".join(unknown), "- choose from", ", ".join(BENCH_SCENARIOS))
+        return False
+    try:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+    ok = True
+    for name in names:
+        r = run_scenario(name, seed)
+        print(f"{name}: {r['ticks']} ticks, wave {r['wave']}, peak {r['peak_enemies']} enemies / "
+              f"{r['peak_bullets']} bullets / {r['peak_pickups']} pickups")
+        print(f"  update p50 {r['update_p50']:.2f} p95 {r['update_p95']:.2f}  draw p50 {r['draw_p50']:.2f} "
+              f"p95 {r['draw_p95']:.2f}  frame p50 {r['frame_p50']:.2f} p95 {r['frame_p95']:.2f} "
+              f"p99 {r['frame_p99']:.2f} max {r['frame_max']:.2f} ms")
+        base = baseline.get(name)
+        if base and not save:
+            for key in BENCH_GATED:
+                limit = base[key] * (1 + tolerance)
+                change = 100 * (r[key] / base[key] - 1) if base[key] else 0.0
+                verdict = "REGRESSED" if r[key] > limit else "ok"
+                ok &= r[key] <= limit
+                print(f"  {key:10s} {r[key]:7.2f} vs baseline {base[key]:7.2f} ({change:+5.1f}%, limit {limit:.2f})  {verdict}")
+        elif not save:
+            print("  no baseline (run with --bench-save to record one)")
+        baseline[name] = r
+    if save:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        print("Baseline written to", baseline_path)
+    print("OK" if ok else "FAILED: frame time regressed beyond tolerance")
+    return ok
+
 # ----------------------------
 # Game loop
 # ----------------------------
-def main():
+def main(startup_report=False, seed=None, sim_process=None, map_size=None):
     global WIDTH, HEIGHT, GRID_W, GRID_H
 
     load_settings()
+    if sim_process is None:
+        sim_process = SETTINGS.get("sim_process", False)
+    if SETTINGS.get("gc_policy", True):
+        enable_gc_policy()
 
     WIDTH, HEIGHT = SETTINGS.get("window_size", [1024, 640])
     flags = pygame.FULLSCREEN if SETTINGS.get("fullscreen", False) else 0
 
-    pygame.init()
-    fps_font = pygame.font.SysFont("consolas", 16)
+    t_init = time.perf_counter()
+    # only the modules the game uses; pygame.init() would also spin up audio, joystick, etc.
+    pygame.display.init()
+    pygame.font.init()
     screen=pygame.display.set_mode((WIDTH,HEIGHT), flags)
+    update_view()
     pygame.display.set_caption("Monsters of the Deep — roguelite prototype")
     clock=pygame.time.Clock()
+    t_ready = time.perf_counter()
+    first_frame = True
 
-    GRID_W, GRID_H = 1024 // TILE, 640 // TILE  # fixed world size
+    GRID_W, GRID_H = map_size or (1024 // TILE, 640 // TILE)
+    sim = SimProcess(seed) if sim_process else None
+    pregen = None if sim else MapPregenerator(seed)
 
-    game_state = "menu"  # "menu", "help", "options", "controls", "playing", "paused"
+    game_state = "menu"  # "menu", "help", "options", "controls", "loading", "playing", "paused"
     selected_index = 0
     menu_items = ["Start Game", "How to Play", "Options", "Quit"]
     options_index = 0
     world=None
     paused=False
 
-    font=pygame.font.SysFont("consolas",18)
-    help_lines=[
-        "WASD to move, Mouse to aim/shoot",
-        "[E] deposit/open shop/upgrade, [N] next wave",
-        "[R] restart, [Esc]/[P] pause",
-        "T place turret (Tab cycle)"
-    ]
-    helpsurf=pygame.Surface((620,120))
-    helpsurf.fill((16,22,30))
-    pygame.draw.rect(helpsurf,(80,120,160),helpsurf.get_rect(),2)
-    for i,l in enumerate(help_lines):
-        helpsurf.blit(font.render(l,True,WHITE),(10,8+i*22))
-    help_timer=5.0
+    needs_redraw = True
+    time_scale = TimeScale()
 
     running=True
     while running:
+        if TRACE: TRACE.frame(); TRACE.switch("idle")
+        # Outside live gameplay nothing animates: sleep until input arrives and only redraw then.
+        simulating = (
+            game_state == "playing"
+            and (not paused)
+            and world
+            and (not world.player.in_shop)
+            and world.base_hp > 0
+            and (world.upgrade_target is None)
+        )
+        idle = not simulating and game_state != "loading" and not (sim and sim.pending)
+        if idle and not needs_redraw:
+            first = pygame.event.wait(IDLE_WAIT_MS)
+            events = ([first] if first.type != pygame.NOEVENT else []) + pygame.event.get()
+        else:
+            events = pygame.event.get()
         dt = clock.tick(FPS) / 1000.0
+        if idle:
+            dt = min(dt, 1.0 / FPS)   # don't feed the time spent asleep into the next update
+        if TRACE: TRACE.switch("events")
+        if events:
+            needs_redraw = True
 
-        for ev in pygame.event.get():
+        for ev in events:
             if ev.type == pygame.QUIT:
                 running = False
 
@@ -1216,10 +4378,8 @@ def main():
                     elif ev.key in (pygame.K_RETURN, pygame.K_SPACE):
                         choice = menu_items[selected_index]
                         if choice == "Start Game":
-                            world = World()
-                            game_state = "playing"
+                            world, game_state = start_world(sim)
                             paused = False
-                            help_timer = 5.0
                         elif choice == "How to Play":
                             game_state = "help"
                         elif choice == "Options":
@@ -1234,12 +4394,12 @@ def main():
                         game_state = "menu"
 
                 elif game_state == "options":
-                    total_opts = 6  # 0..5 (controls at index 5)
+                    total_opts = 8  # 0..7 (controls at index 7)
                     if ev.key in (pygame.K_ESCAPE,):
                         save_settings()
                         game_state = "paused" if paused else "menu"
                     elif ev.key in (pygame.K_RETURN, pygame.K_SPACE):
-                        if options_index == 5:
+                        if options_index == 7:
                             game_state = "controls"
                         else:
                             save_settings()
@@ -1265,6 +4425,12 @@ def main():
                             SETTINGS["fullscreen"] = not SETTINGS.get("fullscreen", False)
                             flags = pygame.FULLSCREEN if SETTINGS["fullscreen"] else 0
                             screen = pygame.display.set_mode((WIDTH, HEIGHT), flags)
+                        elif options_index == 5:
+                            SETTINGS["dirty_rects"] = not SETTINGS.get("dirty_rects", False)
+                        elif options_index == 6:
+                            i = RENDER_SCALES.index(SETTINGS.get("render_scale", 1.0)) if SETTINGS.get("render_scale") in RENDER_SCALES else 0
+                            SETTINGS["render_scale"] = RENDER_SCALES[(i + (1 if left else -1)) % len(RENDER_SCALES)]
+                            update_view()
                         save_settings()
 
                 elif game_state == "controls":
@@ -1272,141 +4438,45 @@ def main():
                         game_state = "options"
 
                 elif game_state == "playing":
-                    if ev.key in (pygame.K_ESCAPE, pygame.K_p):
-                        if world.player.in_shop:
-                            world.player.in_shop = False
-                        elif world.upgrade_target:
-                            world.upgrade_target = None
-                            world.say("Closed upgrade panel")
-                        elif ev.key == pygame.K_ESCAPE and world.player.placing_turret:
-                            world.player.placing_turret = False
-                            world.say("Turret placement cancelled")
-                        else:
-                            paused = not paused
-                            game_state = "paused" if paused else "playing"
-
-                    elif ev.key == pygame.K_n and (not world.player.in_shop) and (world.upgrade_target is None) and world.base_hp > 0:
-                        if world.waiting_next_wave:
-                            world.start_next_wave()
+                    if ev.key in (pygame.K_ESCAPE, pygame.K_p) and not world.blocks_pause(ev.key):
+                        paused = True
+                        game_state = "paused"
+                    elif ev.key == pygame.K_r:
+                        world.end_run("restart")
+                        world, game_state = start_world(sim)
+                    elif ev.key == pygame.K_f:
+                        speed = time_scale.cycle()
+                        if sim:
+                            sim.set_speed(speed)
                         else:
-                            world.say("Current wave still in progress")
-
-                    elif not paused:
-                        if ev.key == pygame.K_r:
-                            world = World()
-
-                        elif ev.key == pygame.K_c:
-                            world.player.scrap+=15
-                            world.player.cores+=10
-                            for k in world.player.turret_kits:
-                                world.player.turret_kits[k]+=2
-
-                        elif ev.key == pygame.K_x:
-                            world.wave+=1
-
-                        # --- UNIVERSAL USE: E ---
-                        elif ev.key == pygame.K_e:
-                            # --- FIX: close upgrade panel with E ---
-                            if world.upgrade_target:
-                                world.upgrade_target = None
-                                world.say("Closed upgrade panel")
-                            # if shop open: close it
-                            elif world.player.in_shop:
-                                world.player.in_shop = False
-                                world.say("Shop closed")
-                            else:
-                                on_base = dist(
-                                    (world.player.x, world.player.y),
-                                    (world.base_cell[0]*TILE+TILE/2, world.base_cell[1]*TILE+TILE/2)
-                                ) < world.deposit_radius
-                                if on_base:
-                                    if world.player.backpack:
-                                        world.deposit()
-                                    else:
-                                        world.open_shop()
-                                else:
-                                    mx,my = pygame.mouse.get_pos()
-                                    wx = mx + world.camera[0]
-                                    wy = my + world.camera[1]
-                                    t = world.nearest_turret_to_world(wx, wy, radius=24)
-                                    if t and dist((world.player.x,world.player.y),(t.x,t.y))<=80:
-                                        world.upgrade_target = t
-                                        world.say("Upgrade: 1)Damage  2)Range  3)Rate  • Esc/E to close")
-                                    else:
-                                        world.say("Nothing to use here")
-
-                        elif ev.key == pygame.K_b:
-                            if world.player.in_shop:
-                                world.player.in_shop = False
-                            else:
-                                world.open_shop()
-
-                        elif ev.key == pygame.K_t:
-                            avail = [t for t,c in world.player.turret_kits.items() if c>0]
-                            if avail:
-                                world.player.placing_turret = True
-                                if world.player.placing_type not in avail:
-                                    world.player.placing_type = avail[0]
-                                world.say("Turret placement mode")
-                            else:
-                                world.say("No turret kits")
-
-                        elif ev.key == pygame.K_TAB and world.player.placing_turret:
-                            world.player.cycle_turret_type()
-
-                        elif ev.key == pygame.K_u and (not world.player.in_shop):
-                            mx,my = pygame.mouse.get_pos()
-                            wx = mx + world.camera[0]
-                            wy = my + world.camera[1]
-                            t = world.nearest_turret_to_world(wx, wy, radius=24)
-                            if t and dist((world.player.x,world.player.y),(t.x,t.y))<=80:
-                                world.upgrade_target = t
-                                world.say("Upgrade: 1)Damage  2)Range  3)Rate  • Esc/E to close")
-                            elif t:
-                                world.say("Move closer to the turret to upgrade")
-                            else:
-                                world.say("No turret under cursor")
-
-                        elif world.player.in_shop and ev.key in (
-                            pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4,
-                            pygame.K_5, pygame.K_6, pygame.K_7, pygame.K_8, 
-                            pygame.K_9
-                        ):
-                            idx = {
-                                pygame.K_1:"speed", pygame.K_2:"damage", pygame.K_3:"hp",
-                                pygame.K_4:"capacity", pygame.K_5:"turret_basic", pygame.K_6:"basehp",
-                                pygame.K_7:"turret_flame", pygame.K_8:"turret_ice", pygame.K_9:"shotspeed"
-                            }[ev.key]
-                            world.buy(idx)
-
-                        elif world.upgrade_target and ev.key in (pygame.K_1, pygame.K_2, pygame.K_3):
-                            kmap = {pygame.K_1:"dmg", pygame.K_2:"rng", pygame.K_3:"rate"}
-                            world.upgrade_buy(kmap[ev.key])
+                            world.say(f"Speed {speed}x", 1.2)
+                    elif sim:
+                        sim.key(ev.key, pygame.mouse.get_pos())
+                    else:
+                        world.handle_key(ev.key, pygame.mouse.get_pos())
 
                 elif game_state == "paused":
                     if ev.key in (pygame.K_p, pygame.K_ESCAPE):
                         paused = False
                         game_state = "playing"
                     elif ev.key == pygame.K_r:
-                        world = World()
+                        world.end_run("restart")
+                        world, game_state = start_world(sim)
                         paused = False
-                        game_state = "playing"
                     elif ev.key == pygame.K_q:
                         running = False
 
             elif ev.type == pygame.MOUSEBUTTONDOWN:
                 mx,my = ev.pos
                 if game_state == "menu" and ev.button==1:
-                    rects = draw_main_menu(screen, menu_items, selected_index)
+                    rects = main_menu_layout(screen.get_size(), len(menu_items))
                     for i, r in enumerate(rects):
                         if r.collidepoint(mx,my):
                             selected_index = i
                             choice = menu_items[i]
                             if choice == "Start Game":
-                                world = World()
-                                game_state = "playing"
+                                world, game_state = start_world(sim)
                                 paused = False
-                                help_timer = 5.0
                             elif choice == "How to Play":
                                 game_state = "help"
                             elif choice == "Options":
@@ -1415,20 +4485,17 @@ def main():
                                 running = False
                             break
                 elif game_state == "help" and ev.button==1:
-                    back_rect = draw_help(screen)
-                    if back_rect.collidepoint(mx,my):
+                    if back_button_rect(screen.get_size()).collidepoint(mx,my):
                         game_state = "menu"
                 elif game_state == "options" and ev.button==1:
-                    back_rect = draw_options(screen, options_index)
-                    if back_rect.collidepoint(mx,my):
+                    if back_button_rect(screen.get_size()).collidepoint(mx,my):
                         save_settings()
                         game_state = "paused" if paused else "menu"
                 elif game_state == "controls" and ev.button==1:
-                    back_rect = draw_controls_page(screen)
-                    if back_rect.collidepoint(mx,my):
+                    if back_button_rect(screen.get_size()).collidepoint(mx,my):
                         game_state = "options"
                 elif game_state == "paused" and world and ev.button==1:
-                    buttons = world.draw_pause_menu(screen)
+                    buttons = zip(PAUSE_ITEMS, pause_menu_layout((WIDTH, HEIGHT)))
                     for label, rect in buttons:
                         if rect.collidepoint(mx,my):
                             if label == "Resume":
@@ -1436,38 +4503,35 @@ def main():
                             elif label == "Options":
                                 game_state = "options"; options_index = 0
                             elif label == "Restart":
-                                world = World(); paused = False; game_state = "playing"
+                                world.end_run("restart")
+                                world, game_state = start_world(sim); paused = False
                             elif label == "Main Menu":
+                                world.end_run("menu")
+                                if sim: sim.end_run("menu")
                                 game_state = "menu"; paused = False; world = None
                             elif label == "Quit":
                                 running = False
                             break
                 elif game_state == "playing" and world:
-                    if world.player.placing_turret:
-                        if ev.button == 1:
-                            wx = mx + world.camera[0]
-                            wy = my + world.camera[1]
-                            gx, gy = int(wx//TILE), int(wy//TILE)
-                            if world.can_place_turret((gx,gy)) and world.player.placing_type:
-                                world.turrets.append(Turret((gx,gy), world.player.placing_type))
-                                ttype = world.player.placing_type
-                                world.player.turret_kits[ttype] -= 1
-                                if world.player.turret_kits[ttype] <= 0:
-                                    avail = [t for t,c in world.player.turret_kits.items() if c>0]
-                                    if avail:
-                                        world.player.placing_type = avail[0]
-                                    else:
-                                        world.player.placing_turret = False
-                                world.say(f"{ttype.capitalize()} turret placed")
-                            else:
-                                world.say("Can't place there")
-                        elif ev.button == 3:
-                            world.player.placing_turret = False
-                            world.say("Turret placement cancelled")
-                    elif world.upgrade_target and ev.button==1:
-                        wx = mx + world.camera[0]; wy = my + world.camera[1]
-                        if dist((wx,wy),(world.upgrade_target.x, world.upgrade_target.y))>80:
-                            world.upgrade_target=None
+                    if sim:
+                        sim.click(ev.button, (mx, my))
+                    else:
+                        world.handle_click(ev.button, (mx, my))
+
+        if TRACE: TRACE.switch("other")
+        if sim:
+            sim.set_paused(game_state != "playing" or paused)
+            if sim.refresh():
+                world = sim.view
+                needs_redraw = True
+                if game_state == "loading":
+                    game_state = "playing"
+        elif game_state == "loading" and pregen.ready():
+            world = World(pregen.take())
+            if GC_POLICY: GC_POLICY.world_built()
+            game_state = "playing"
+            needs_redraw = True
+            continue                # build and collection stay on this non-live frame; play starts next frame
 
         # Update (paused freezes gameplay but doesn't reset state)
         if (
@@ -1478,9 +4542,25 @@ def main():
             and world.base_hp > 0
             and (world.upgrade_target is None)
         ):
-            world.update(dt)
+            if TRACE: TRACE.live(); TRACE.switch("sim")
+            if sim:
+                sim.send_input(sample_player_input())   # redraws when the worker's next snapshot lands
+            else:
+                time_scale.run(world, dt)
+                needs_redraw = True
+            if TRACE: TRACE.switch("other")
+        else:
+            time_scale.idle()
+        if MEMORY: MEMORY.sample(world)
 
         # Draw
+        if not needs_redraw and game_state != "loading":
+            continue
+        needs_redraw = False
+        if TRACE: TRACE.switch("draw")
+        live_view = game_state == "playing" and not paused and world is not None
+        DIRTY.begin(SETTINGS.get("dirty_rects", False) and live_view and not view_scaled(),
+                    world.camera if live_view else None)
         if game_state in ("menu", "help", "options", "controls"):
             if game_state == "menu":
                 rects = draw_main_menu(screen, ["Start Game", "How to Play", "Options", "Quit"], -1)
@@ -1492,20 +4572,111 @@ def main():
                 draw_options(screen, options_index)
             elif game_state == "controls":
                 draw_controls_page(screen)
+        elif game_state == "loading":
+            draw_title(screen, "GENERATING MAP...")
         else:
             if world:
                 world.draw(screen)
+                if time_scale.requested > 1:
+                    fast = world.hud_label(f">> {time_scale.requested}x", 20, YELLOW, True)
+                    DIRTY.retained(screen, "speed", fast, (10, HEIGHT - 30))
             if paused and world:
                 world.draw_pause_menu(screen)
 
         if SETTINGS.get("show_fps", True):
-            fps_text = fps_font.render(f"{int(clock.get_fps())} FPS", True, (255, 255, 255))
-            screen.blit(fps_text, (WIDTH - fps_text.get_width() - 10, 10))
-
-        pygame.display.flip()
-
+            y = 10
+            for line in [f"{int(clock.get_fps())} FPS"] + list(PERF.values()):
+                text = get_font(16).render(line, True, (255, 255, 255))
+                DIRTY.add(screen.blit(text, (WIDTH - text.get_width() - 10, y)))
+                y += text.get_height() + 2
+
+        if TRACE: TRACE.switch("present")
+        DIRTY.present(screen)
+        if TRACE: TRACE.switch("other")
+        if first_frame:
+            first_frame = False
+            if startup_report:
+                t_frame = time.perf_counter()
+                print(f"startup: import {(t_init-_STARTUP_T0)*1000:.1f} ms, "
+                      f"init {(t_ready-t_init)*1000:.1f} ms, "
+                      f"first frame {(t_frame-t_ready)*1000:.1f} ms, "
+                      f"total {(t_frame-_STARTUP_T0)*1000:.1f} ms")
+
+    if sim:
+        sim.close()
+    elif world:
+        world.end_run("quit")
+    if MEMORY:
+        MEMORY.close(world)
+    if TRACE:
+        TRACE.close()
+    if pregen:
+        pregen.shutdown()
+    if ADVISOR:
+        ADVISOR.shutdown()
+    shutdown_telemetry()
     save_settings()
     pygame.quit()
 
+def parse_map_size(text):
+    import argparse
+    try:
+        w, h = map(int, text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WxH, got {text!r}")
+    if not (8 <= w <= 0xFFFF and 8 <= h <= 0xFFFF):
+        raise argparse.ArgumentTypeError("width and height must be 8..65535 tiles")
+    return w, h
+
+def parse_args(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Monsters of the Deep — roguelite prototype")
+    ap.add_argument("--telemetry-report", nargs="+", metavar="PATH",
+                    help="aggregate run telemetry logs (files, globs or directories) into per-wave summaries and exit")
+    ap.add_argument("--seed", type=int, help="play (and cache) the map generated from this seed")
+    ap.add_argument("--daily", action="store_true", help="daily challenge: seed the map from today's date")
+    ap.add_argument("--map-size", type=parse_map_size, metavar="WxH",
+                    help=f"map size in tiles (default {1024 // TILE}x{640 // TILE}); maps of {MAZE_STREAM_MIN_CELLS} "
+                         f"tiles or more are streamed: the run starts once the area around the base is done")
+    ap.add_argument("--sim-process", action="store_true", default=None,
+                    help="run the simulation in a worker process at a fixed tick (overrides settings.json)")
+    ap.add_argument("--memory", action="store_true",
+                    help=f"track allocations: per-subsystem sizes in the perf overlay, periodic dumps and "
+                         f"per-wave tracemalloc diffs in {MEMORY_DIR}/")
+    ap.add_argument("--trace", nargs="?", const="", metavar="PATH",
+                    help=f"record per-frame span timings and event markers to a ring file (default in {TRACE_DIR}/)")
+    ap.add_argument("--trace-report", metavar="PATH",
+                    help="print frame-time percentiles, spike attribution and event correlation for a trace and exit")
+    ap.add_argument("--chrome-trace", metavar="OUT",
+                    help="with --trace-report: also export the trace as Chrome trace-event JSON")
+    ap.add_argument("--bench", nargs="*", metavar="SCENARIO",
+                    help=f"run scenario benchmarks headless ({', '.join(BENCH_SCENARIOS)}; default all), "
+                         f"compare with the baseline and exit non-zero on a frame-time regression")
+    ap.add_argument("--bench-baseline", default=BENCH_BASELINE_FILE, metavar="PATH",
+                    help="baseline file for --bench (default %(default)s)")
+    ap.add_argument("--bench-tolerance", type=float, default=BENCH_TOLERANCE, metavar="FRACTION",
+                    help="allowed slowdown over the baseline before --bench fails (default %(default)s)")
+    ap.add_argument("--bench-save", action="store_true",
+                    help="with --bench: record the results as the new baseline instead of comparing")
+    ap.add_argument("--startup-report", action="store_true",
+                    help="print import/init/first-frame timings once the menu is on screen")
+    return ap.parse_args(argv)
+
 if __name__=="__main__":
-    main()
+    args = parse_args()
+    if args.telemetry_report:
+        print_telemetry_report(args.telemetry_report)
+    elif args.trace_report:
+        print_trace_report(args.trace_report)
+        if args.chrome_trace:
+            export_chrome_trace(args.trace_report, args.chrome_trace)
+    elif args.bench is not None:
+        sys.exit(0 if run_benchmarks(args.bench, args.bench_baseline, args.bench_tolerance,
+                                     save=args.bench_save, seed=args.seed or 1) else 1)
+    else:
+        if args.memory:
+            enable_memory_profile()
+        if args.trace is not None:
+            enable_trace(args.trace or None)
+        seed = int(time.strftime("%Y%m%d")) if args.daily else args.seed
+        main(startup_report=args.startup_report, seed=seed, sim_process=args.sim_process, map_size=args.map_size)
@@ -0,0 +1,31 @@
+import importlib.util
+import os
+import pathlib
+
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+GAME_PATH = pathlib.Path(__file__).resolve().parent.parent / "monsters-of-the-deep.py"
+
+
+@pytest.fixture(scope="session")
+def game(tmp_path_factory):
+    """The game script loaded as a module, run from a scratch directory (font cache, map cache)."""
+    os.chdir(tmp_path_factory.mktemp("run"))
+    spec = importlib.util.spec_from_file_location("monsters_of_the_deep", GAME_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.pygame.display.init()
+    module.pygame.font.init()
+    return module
+
+
+@pytest.fixture
+def grid_size(game, monkeypatch):
+    """Set the GRID_W/GRID_H globals for one test; restored afterwards."""
+    def set_size(w, h):
+        monkeypatch.setattr(game, "GRID_W", w)
+        monkeypatch.setattr(game, "GRID_H", h)
+    return set_size
@@ -0,0 +1,21 @@
+import random
+
+
+def test_out_of_range_target_does_not_rewake_retarget(game, monkeypatch):
+    calls = []
+    retarget = game.Turret.retarget
+    monkeypatch.setattr(game.Turret, "retarget", lambda t, world: (calls.append(1), retarget(t, world)))
+    random.seed(1)
+    world = game.World(game.build_map(random.Random(1)), telemetry=False)
+    turret = game.Turret(game.placement_candidates(world, "basic", 1)[0], "basic")
+    world.turrets.append(turret)
+    turret.register_jobs(world)         # no cover(): without a bitset sees() accepts every enemy
+    far = max(world.director.cells, key=lambda c: game.dist(c, turret.cell))
+    world.enemies.append(game.Enemy(far))
+    assert game.dist((turret.x, turret.y), (world.enemies[0].x, world.enemies[0].y)) > turret.stats()["range"]
+    ticks, dt = 60, 1 / 60
+    for _ in range(ticks):
+        world.jobs.run(world, dt)
+        turret.update(dt, world)
+    assert turret.target is None
+    assert len(calls) <= ticks * dt / game.TURRET_RETARGET_INTERVAL + 1
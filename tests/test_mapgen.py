@@ -0,0 +1,64 @@
+"""Streamed generation of huge maps: playing one while it grows, and caching it."""
+import random
+
+# Smallest streamed size in the MAZE_STREAM_MIN_CELLS ballpark that keeps the suite quick.
+W, H = 600, 440
+
+
+def streamed_world(game, stream):
+    """Run `stream` to the end on this thread, building a World from its first (partial) version."""
+    worlds = []
+    publish = stream.publish
+
+    def publish_and_play(*args):
+        publish(*args)
+        if not worlds:
+            worlds.append(game.World(stream, telemetry=False))
+    stream.publish = publish_and_play
+    stream.run()
+    return worlds[0]
+
+
+def test_streamed_map_is_playable_before_it_is_finished(game, grid_size):
+    grid_size(W, H)
+    assert W * H >= game.MAZE_STREAM_MIN_CELLS
+    stream = game.MapStream(W, H, random.Random(1))
+    world = streamed_world(game, stream)
+    lo, hi = stream.latest[4]
+    assert (lo, hi) == (0, W) and stream.latest[5]
+
+    # the World started on version 1: a span around the base, walls elsewhere, spawns connected to the base
+    assert world.map_version == 1 and world.stream is stream
+    bx = world.base_cell[0]
+    first = [x for x in range(W) if any(c == 0 for c in world.grid[x])]
+    assert first[0] <= bx <= first[-1] and first[-1] - first[0] < W // 2
+    assert world.director.cells
+    assert all(world.base_dist[x][y] >= 0 for x, y in world.director.cells)
+
+    world.start_next_wave()
+    inp = game.PlayerInput(0, 0, False, 0, 0)
+    world.update(1 / 60, inp)
+    assert world.map_version == stream.latest[0] and world.stream is None
+    for _ in range(60):
+        world.update(1 / 60, inp)
+
+    # the finished map: every open tile reachable from the base, with the BFS distance
+    ref = game.distance_field([list(col) for col in world.grid], world.base_cell)
+    assert all(list(a) == b for a, b in zip(world.base_dist, ref))
+    assert all(d >= 0 for col, dcol in zip(world.grid, world.base_dist) for c, d in zip(col, dcol) if c == 0)
+
+
+def test_seeded_streamed_map_is_cached(game, grid_size, tmp_path):
+    grid_size(W, H)
+    store = game.MapStore(directory=str(tmp_path))
+    built = game.MapStream(W, H, seed=7, store=store)
+    built.run()
+    assert built.latest[0] > 1                  # generated in several versions
+
+    loaded = game.MapStream(W, H, seed=7, store=store)
+    loaded.run()
+    assert loaded.latest[0] == 1 and loaded.latest[5]
+    (g1, b1, d1), (g2, b2, d2) = built.result(), loaded.result()
+    assert b1 == b2
+    assert all(bytes(a) == bytes(b) for a, b in zip(g1, g2))
+    assert all(list(a) == list(b) for a, b in zip(d1, d2))
@@ -0,0 +1,148 @@
+"""Equivalence checks for the simulation's shortcuts: LOD updates, the incremental chase field and
+the what-if worlds behind the placement advisor."""
+import itertools
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+def lod_outcomes(game, monkeypatch, seed, count, lod):
+    """Scripted run: `count` enemies (some burning, some slowed) walk from the spawn ring to the base.
+    Returns [(outcome, time)] per enemy: ("base", arrival time) or ("dead", time of death)."""
+    monkeypatch.setattr(game, "_lod_slots", itertools.count())  # same LOD and path stagger in both runs
+    random.seed(seed)
+    world = game.World(game.build_map(random.Random(seed)), telemetry=False)
+    world.lod.enabled = lod
+    world.base_hp = world.base_max_hp = 1e9
+    rng = random.Random(seed)
+    tracked = []
+    for i in range(count):
+        e = game.Enemy(rng.choice(world.director.cells), tier=1 + i % 4)
+        if i % 3 == 1: e.apply_dot(1.0, 1.5 + 3.0 * rng.random())
+        if i % 3 == 2: e.apply_slow(0.5, 6.0 * rng.random())
+        tracked.append(e)
+    world.enemies.extend(tracked)
+    outcomes = [None] * count
+    idle = game.PlayerInput(0, 0, False, 0, 0)
+    t, dt = 0.0, 1.0 / game.FPS
+    while world.enemies and t < 600:
+        world.update(dt, idle)
+        t += dt
+        alive = set(map(id, world.enemies))
+        for i, e in enumerate(tracked):
+            if outcomes[i] is not None: continue
+            if id(e) not in alive:
+                outcomes[i] = ("dead", t)
+            elif e.grid_cell() == world.base_cell:
+                outcomes[i] = ("base", t)
+                world.enemies.remove(e)
+    return outcomes
+
+
+def test_lod_matches_full_rate(game, grid_size, monkeypatch):
+    # A map larger than the screen, so most enemies are far from everything and take the LOD path.
+    grid_size(96, 60)
+    full = lod_outcomes(game, monkeypatch, 1, 60, lod=False)
+    fast = lod_outcomes(game, monkeypatch, 1, 60, lod=True)
+    assert None not in full and None not in fast
+    assert [o[0] for o in fast] == [o[0] for o in full]
+    assert {o[0] for o in full} == {"base", "dead"}
+    assert max(abs(a[1] - b[1]) for a, b in zip(full, fast)) <= 0.5
+
+
+def test_chase_field_matches_bfs(game):
+    # Random-walk a target through a large maze; after every move the incremental field must equal
+    # a truncated BFS from the target.
+    w, h = 96, 60
+    rng = random.Random(1)
+    grid = game.generate_maze(w, h, rng=rng)
+    game.ensure_full_connectivity(grid, (1, 1))
+    field = game.ChaseField(grid)
+    r = field.radius
+    cell = (1, 1)
+    field.follow(cell)
+    for i in range(2000):
+        if i % 500 == 499:      # the occasional jump (respawn)
+            cell = divmod(rng.choice([j for j, a in enumerate(field.adj) if a]), h)
+        else:
+            cell = divmod(rng.choice(field.adj[cell[0]*h + cell[1]]), h)
+        field.follow(cell)
+        ref = game.distance_field(grid, cell)
+        assert field.d == [d if 0 <= d <= r else game.UNREACHABLE for col in ref for d in col], i
+
+
+@pytest.fixture
+def whatif_globals(game, grid_size, monkeypatch):
+    """unpack_whatif() resets module globals the way a pool worker would; undo that afterwards."""
+    grid_size(game.GRID_W, game.GRID_H)
+    monkeypatch.setattr(game, "_lod_slots", game._lod_slots)
+    monkeypatch.setattr(game, "_whatif_map", (None, None))
+
+
+def advisor_world(game, wave=4, seed=1):
+    random.seed(seed)
+    world = game.World(game.build_map(random.Random(seed)), telemetry=False)
+    world.wave = wave
+    world.base_hp = world.base_max_hp
+    world.turrets.append(game.Turret(game.placement_candidates(world, "basic", 1)[0], "basic"))
+    world.cover(world.turrets[-1])
+    return world
+
+
+def test_whatif_runs_are_reproducible(game, whatif_globals):
+    snapshot = game.pack_whatif(advisor_world(game))
+    cell = game.placement_candidates(advisor_world(game), "basic", 2)[1]
+    for c in (None, cell):
+        assert game.whatif_wave(snapshot, c, "basic", 1) == game.whatif_wave(snapshot, c, "basic", 1)
+
+
+def test_whatif_keeps_mid_wave_state(game, whatif_globals):
+    random.seed(1)
+    world = game.World(game.build_map(random.Random(1)), telemetry=False)
+    world.wave = 5
+    for kind, cell in zip(("flame", "ice"), game.placement_candidates(world, "basic", 2)):
+        world.turrets.append(game.Turret(cell, kind))
+        world.cover(world.turrets[-1])
+    world.spawn_wave()
+    idle = game.PlayerInput(0, 0, False, 0, 0)
+    for _ in range(900):
+        world.update(1 / 60, idle)
+    copy = game.unpack_whatif(game.pack_whatif(world))
+    def status(w):
+        return [([round(s["dps"], 4) for s in e.dots], [round(s["factor"], 4) for s in e.slows])
+                for e in w.enemies]
+    assert any(dots or slows for dots, slows in status(world))
+    assert status(copy) == status(world)
+    assert [round(t.cooldown, 4) for t in copy.turrets] == [round(t.cooldown, 4) for t in world.turrets]
+
+
+def test_best_placement_beats_none(game, whatif_globals):
+    # The pool only transports calls; one thread keeps unpack_whatif's globals to a single caller.
+    world = advisor_world(game)
+    snapshot = game.pack_whatif(world)
+    cells = game.placement_candidates(world, "basic", 12)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        futures = [pool.submit(game.whatif_wave, snapshot, c, "basic", 1) for c in [None] + cells]
+        baseline, ranked = game.PlacementAdvice("basic", futures, 0.0).ranking()
+    assert baseline[0] is None and len(ranked) == len(cells)
+    assert ranked[0][1] <= baseline[1]
+
+
+def test_far_enemy_killed_by_a_bullet_absorbs_no_more(game, grid_size):
+    grid_size(96, 60)
+    random.seed(1)
+    world = game.World(game.build_map(random.Random(1)), telemetry=False)
+    idle = game.PlayerInput(0, 0, False, 0, 0)
+    world.update(1 / 60, idle)          # settle the camera
+    world.lod.begin(world)
+    tile = game.TILE
+    cell = next(c for c in world.director.cells if not world.lod.near((c[0] + 0.5) * tile, (c[1] + 0.5) * tile))
+    e = game.Enemy(cell)
+    e.hp = 1
+    world.enemies.append(e)
+    for _ in range(2):
+        world.bullets.append(game.Bullet((e.x, e.y), (1, 0), damage=5, playerBullet=True))
+    world.update(1 / 60, idle)
+    assert not world.lod.near(e.x, e.y)
+    assert world.combat.data[game.PLAYER_STAT + game.HITS] == 1